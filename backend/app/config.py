@@ -2,17 +2,129 @@
 Configuration settings for the Dating Conversation Assistant API
 """
 
+import logging
 import os
 from typing import List
 from pydantic_settings import BaseSettings
 
+logger = logging.getLogger(__name__)
+
 class Settings(BaseSettings):
     # OpenAI Configuration
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
+    
+    # LLM Gateway Configuration
+    llm_max_connections: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    llm_max_keepalive_connections: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    llm_timeout_seconds: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+    llm_connect_timeout_seconds: float = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "1"))
+    circuit_failure_threshold: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    circuit_reset_seconds: float = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    circuit_half_open_max_calls: int = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))
+    llm_hedging_enabled: bool = os.getenv("LLM_HEDGING_ENABLED", "False").lower() == "true"
+    llm_hedge_quantile: float = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+    llm_hedge_min_delay_seconds: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+    llm_hedge_min_samples: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    
+    structured_max_retries: int = int(os.getenv("STRUCTURED_MAX_RETRIES", "1"))
+    prompt_max_input_tokens: int = int(os.getenv("PROMPT_MAX_INPUT_TOKENS", "3000"))
+    
+    # Model Routing Configuration (tiers weakest to strongest: escalation climbs them in order)
+    model_tier_fast: str = os.getenv("MODEL_TIER_FAST", "gpt-4o-mini")
+    model_tier_standard: str = os.getenv("MODEL_TIER_STANDARD", "gpt-4o")
+    model_tier_large: str = os.getenv("MODEL_TIER_LARGE", "gpt-4o")
+    model_routes: str = os.getenv(
+        "MODEL_ROUTES",
+        "suggestions=fast,conversation_summary=fast,conversation_analysis=standard,"
+        "profile_optimization=standard,bio_narrative=fast,trend_analysis=standard"
+    )
+    model_large_context_tokens: int = int(os.getenv("MODEL_LARGE_CONTEXT_TOKENS", "3000"))
+    large_prompt_max_input_tokens: int = int(os.getenv("LARGE_PROMPT_MAX_INPUT_TOKENS", "12000"))
+    model_escalation_enabled: bool = os.getenv("MODEL_ESCALATION_ENABLED", "True").lower() == "true"
+    
+    # Response Cache Configuration
+    response_cache_enabled: bool = os.getenv("RESPONSE_CACHE_ENABLED", "True").lower() == "true"
+    response_cache_max_entries: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+    response_cache_ttl_seconds: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+    response_cache_shared: bool = os.getenv("RESPONSE_CACHE_SHARED", "False").lower() == "true"
+    response_cache_shared_path: str = os.getenv("RESPONSE_CACHE_SHARED_PATH", "")  # SQLite file instead of Redis
+    
+    # Semantic Cache Configuration (near-duplicate suggestion contexts)
+    semantic_cache_enabled: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+    semantic_cache_max_entries: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "4096"))
+    semantic_cache_threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+    semantic_cache_ttl_seconds: float = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+    semantic_cache_dimensions: int = int(os.getenv("SEMANTIC_CACHE_DIMENSIONS", "512"))
+    
+    # Rate Limiting and Token Budgets
+    rate_limit_enabled: bool = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    user_requests_per_minute: float = float(os.getenv("USER_REQUESTS_PER_MINUTE", "60"))
+    user_request_burst: float = float(os.getenv("USER_REQUEST_BURST", "20"))
+    endpoint_requests_per_second: float = float(os.getenv("ENDPOINT_REQUESTS_PER_SECOND", "50"))
+    endpoint_request_burst: float = float(os.getenv("ENDPOINT_REQUEST_BURST", "100"))
+    user_tokens_per_minute: float = float(os.getenv("USER_TOKENS_PER_MINUTE", "20000"))
+    # SQLite file holding the buckets of all workers; app.serve sets it when running several
+    rate_limit_store_path: str = os.getenv("RATE_LIMIT_STORE_PATH", "")
+    upstream_min_remaining_fraction: float = float(os.getenv("UPSTREAM_MIN_REMAINING_FRACTION", "0.05"))
+    
+    # Incremental Conversation Analysis
+    conversation_state_max_entries: int = int(os.getenv("CONVERSATION_STATE_MAX_ENTRIES", "10000"))
+    conversation_state_spill_dir: str = os.getenv("CONVERSATION_STATE_SPILL_DIR", "")
+    conversation_state_spill_max_entries: int = int(os.getenv("CONVERSATION_STATE_SPILL_MAX_ENTRIES", "100000"))
+    conversation_token_budget: int = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+    
+    # Batch Analysis
+    batch_max_items: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    batch_max_concurrency: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+    
+    # Trend Store
+    trend_data_path: str = os.getenv(
+        "TREND_DATA_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "trends.json")
+    )
+    trend_reload_interval_seconds: float = float(os.getenv("TREND_RELOAD_INTERVAL_SECONDS", "5"))
+    
+    # Photo Analysis (needs Pillow)
+    photo_analysis_enabled: bool = os.getenv("PHOTO_ANALYSIS_ENABLED", "True").lower() == "true"
+    photo_analysis_workers: int = int(os.getenv("PHOTO_ANALYSIS_WORKERS", "2"))
+    photo_max_bytes: int = int(os.getenv("PHOTO_MAX_BYTES", str(10 * 1024 * 1024)))
+    photo_fetch_timeout_seconds: float = float(os.getenv("PHOTO_FETCH_TIMEOUT_SECONDS", "5"))
+    photo_fetch_concurrency: int = int(os.getenv("PHOTO_FETCH_CONCURRENCY", "4"))
+    photo_allowed_hosts: str = os.getenv("PHOTO_ALLOWED_HOSTS", "")  # comma-separated, ".cdn.example" for subdomains; empty: any public host
+    photo_max_count: int = int(os.getenv("PHOTO_MAX_COUNT", "12"))
+    photo_max_pixels: int = int(os.getenv("PHOTO_MAX_PIXELS", str(40_000_000)))
+    photo_local_root: str = os.getenv("PHOTO_LOCAL_ROOT", "")
+    photo_feature_cache_max_entries: int = int(os.getenv("PHOTO_FEATURE_CACHE_MAX_ENTRIES", "4096"))
+    photo_feature_cache_ttl_seconds: float = float(os.getenv("PHOTO_FEATURE_CACHE_TTL_SECONDS", "86400"))
+    # A photo URL seen this recently reuses its features without downloading again
+    photo_url_cache_ttl_seconds: float = float(os.getenv("PHOTO_URL_CACHE_TTL_SECONDS", "600"))
+    photo_duplicate_distance: int = int(os.getenv("PHOTO_DUPLICATE_DISTANCE", "10"))
+    
+    # Bio Scoring
+    bio_score_max_bios: int = int(os.getenv("BIO_SCORE_MAX_BIOS", "200"))
+    bio_max_chars: int = int(os.getenv("BIO_MAX_CHARS", "2000"))
+    
+    # Quick Suggestions
+    quick_suggestions_path: str = os.getenv(
+        "QUICK_SUGGESTIONS_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "quick_suggestions.json")
+    )
     
     # Database Configuration
     database_url: str = os.getenv("DATABASE_URL", "postgresql://localhost:5432/dating_assistant")
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout_seconds: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    
+    # Analysis History
+    history_enabled: bool = os.getenv("HISTORY_ENABLED", "True").lower() == "true"
+    history_batch_size: int = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+    history_flush_interval_seconds: float = float(os.getenv("HISTORY_FLUSH_INTERVAL_SECONDS", "0.5"))
+    history_queue_size: int = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
     
     # Application Configuration
     secret_key: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
@@ -23,12 +135,35 @@ class Settings(BaseSettings):
     api_host: str = os.getenv("API_HOST", "0.0.0.0")
     api_port: int = int(os.getenv("API_PORT", "8000"))
     
+    # Background Jobs (POST /jobs/optimize-profile)
+    job_workers: int = int(os.getenv("JOB_WORKERS", "4"))
+    job_queue_size: int = int(os.getenv("JOB_QUEUE_SIZE", "1000"))
+    job_ttl_seconds: float = float(os.getenv("JOB_TTL_SECONDS", "3600"))  # how long job state and results are kept
+    job_store: str = os.getenv("JOB_STORE", "memory")  # memory, sqlite (JOB_STORE_PATH) or redis (REDIS_URL)
+    job_store_path: str = os.getenv("JOB_STORE_PATH", "")
+    job_poll_seconds: int = int(os.getenv("JOB_POLL_SECONDS", "2"))  # Retry-After sent while a job is pending
+    job_callback_timeout_seconds: float = float(os.getenv("JOB_CALLBACK_TIMEOUT_SECONDS", "5"))
+    job_callback_allowed_hosts: str = os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "")  # comma-separated; empty: no callbacks
+    
+    # HTTP caching for read endpoints (ETag + Cache-Control)
+    http_cache_max_age_seconds: int = int(os.getenv("HTTP_CACHE_MAX_AGE_SECONDS", "300"))
+    http_cache_max_entries: int = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "4096"))
+    health_cache_seconds: float = float(os.getenv("HEALTH_CACHE_SECONDS", "1"))
+    
+    # Multi-worker launch (python -m app.serve)
+    web_workers: int = int(os.getenv("WEB_WORKERS", "0"))  # 0: one per CPU
+    shared_data_dir: str = os.getenv("SHARED_DATA_DIR", "")  # mmap-shared trend and template files
+    
     # CORS Configuration
     allowed_origins: List[str] = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:3001").split(",")
     
     # Logging
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
     
+    # Metrics and Tracing
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    loop_monitor_interval_seconds: float = float(os.getenv("LOOP_MONITOR_INTERVAL_SECONDS", "0.5"))
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -36,10 +171,12 @@ class Settings(BaseSettings):
 # Global settings instance
 settings = Settings()
 
-# Validate OpenAI API key
-if not settings.openai_api_key:
-    print("⚠️  WARNING: OPENAI_API_KEY not found in environment variables")
-    print("Please set your OpenAI API key in the .env file")
-    print("Get your API key from: https://platform.openai.com/api-keys")
-else:
-    print("✅ OpenAI API key configured")
\ No newline at end of file
+def log_configuration():
+    """Report missing required configuration; called once at startup rather than on import"""
+    if not settings.openai_api_key:
+        logger.warning(
+            "OPENAI_API_KEY not found in environment variables. Set it in the .env file "
+            "(get a key from https://platform.openai.com/api-keys)"
+        )
+    else:
+        logger.info("OpenAI API key configured")
\ No newline at end of file
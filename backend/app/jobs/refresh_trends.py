@@ -0,0 +1,243 @@
+"""
+Offline job that regenerates regional trend data in bulk
+
+Iterates over every known region x age bucket, generates a trend record per
+pair with bounded parallelism, checkpoints after each pair so an interrupted
+run resumes where it stopped, and finally writes the trend store file
+atomically so the API picks it up on its next reload.
+
+Usage:
+    python -m app.jobs.refresh_trends --concurrency 4
+    python -m app.jobs.refresh_trends --stub --regions "new york" austin
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.config import settings
+from app.services.llm_gateway import LLMGateway, StubLLMGateway, get_llm_gateway
+from app.services.trend_analyzer import TrendAnalyzer
+from app.services.trend_store import TrendStore, AGE_BUCKETS, ALL_AGES, dump_trend_file, load_trend_file, normalize_region
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write(path: str, payload: bytes):
+    """Write to a temp file in the same directory, then rename over the target"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def atomic_write_json(path: str, data: Dict[str, Any]):
+    atomic_write(path, json.dumps(data, indent=2).encode("utf-8"))
+
+
+def bucket_age_range(bucket: str) -> Optional[Tuple[int, int]]:
+    for low, high, name in AGE_BUCKETS:
+        if name == bucket:
+            return low, min(high, 99)
+    return None
+
+
+class TrendRefreshJob:
+    def __init__(
+        self,
+        gateway: LLMGateway,
+        output_path: str,
+        checkpoint_path: str,
+        regions: List[str],
+        buckets: List[str] = None,
+        concurrency: int = 4,
+        model: str = None
+    ):
+        self.gateway = gateway
+        self.analyzer = TrendAnalyzer(gateway, store=TrendStore(output_path))
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.regions = [normalize_region(region) for region in regions]
+        self.buckets = buckets or [ALL_AGES] + [name for _, _, name in AGE_BUCKETS]
+        self.concurrency = concurrency
+        self.model = model
+        self.checkpoint = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            logger.info(f"Resuming from checkpoint with {len(checkpoint['completed'])} completed entries")
+            return checkpoint
+        return {"started_at": datetime.utcnow().isoformat(), "completed": {}, "failed": {}}
+
+    async def generate(self, region: str, bucket: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        start = time.perf_counter()
+        trend_record, completion = await self.analyzer.generate_trend_record(
+            region,
+            bucket_age_range(bucket),
+            model=self.model,
+            cache=False
+        )
+        record = trend_record.model_dump()
+        stats = {
+            "seconds": round(time.perf_counter() - start, 3),
+            "tokens": completion.usage.get("total_tokens", 0)
+        }
+        return record, stats
+
+    async def run(self) -> Dict[str, Any]:
+        pending = [
+            (region, bucket)
+            for region in self.regions
+            for bucket in self.buckets
+            if f"{region}|{bucket}" not in self.checkpoint["completed"]
+        ]
+        logger.info(f"{len(pending)} region/age pairs to generate, concurrency {self.concurrency}")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        lock = asyncio.Lock()
+
+        async def work(region: str, bucket: str):
+            key = f"{region}|{bucket}"
+            async with semaphore:
+                try:
+                    record, stats = await self.generate(region, bucket)
+                except Exception as e:
+                    logger.error(f"Failed to generate {key}: {str(e)}")
+                    self.checkpoint["failed"][key] = str(e)
+                    return
+            async with lock:
+                self.checkpoint["completed"][key] = {"record": record, **stats}
+                self.checkpoint["failed"].pop(key, None)
+                atomic_write_json(self.checkpoint_path, self.checkpoint)
+
+        await asyncio.gather(*(work(region, bucket) for region, bucket in pending))
+
+        if not self.checkpoint["failed"]:
+            self.publish()
+            os.unlink(self.checkpoint_path)
+        else:
+            atomic_write_json(self.checkpoint_path, self.checkpoint)
+            logger.warning(f"{len(self.checkpoint['failed'])} entries failed; rerun to resume before publishing")
+        return self.report()
+
+    def publish(self):
+        """Merge generated records into the trend store file atomically, keeping its format (JSON or msgpack)"""
+        if os.path.exists(self.output_path):
+            data = load_trend_file(self.output_path)
+        else:
+            data = {"version": 0, "default": None, "regions": {}}
+
+        for key, entry in self.checkpoint["completed"].items():
+            region, bucket = key.split("|", 1)
+            data["regions"].setdefault(region, {})[bucket] = entry["record"]
+
+        data["version"] = int(data.get("version") or 0) + 1
+        data["generated_at"] = datetime.utcnow().isoformat() + "Z"
+        atomic_write(self.output_path, dump_trend_file(self.output_path, data))
+        logger.info(f"Published trend data version {data['version']} to {self.output_path}")
+
+    def report(self) -> Dict[str, Any]:
+        regions: Dict[str, Dict[str, Any]] = {}
+        for key, entry in self.checkpoint["completed"].items():
+            region = key.split("|", 1)[0]
+            summary = regions.setdefault(region, {"entries": 0, "seconds": 0.0, "tokens": 0})
+            summary["entries"] += 1
+            summary["seconds"] = round(summary["seconds"] + entry["seconds"], 3)
+            summary["tokens"] += entry["tokens"]
+        return {
+            "regions": regions,
+            "completed": len(self.checkpoint["completed"]),
+            "failed": dict(self.checkpoint["failed"]),
+            "total_tokens": sum(summary["tokens"] for summary in regions.values())
+        }
+
+
+def stub_responder(messages: List[Dict[str, Any]]) -> str:
+    """Deterministic trend record for offline runs"""
+    request = messages[-1]["content"]
+    return json.dumps({
+        "popular_topics": ["Local events", "Food and dining", "Travel", "Career and goals"],
+        "trending_topics": ["Run clubs", "New restaurants", "Live music", "Weekend trips", "Art walks"],
+        "popular_photo_types": ["Outdoor photos", "Food photos", "Travel photos", "Hobby photos", "Group photos"],
+        "communication_style": {
+            "tone": "Friendly and approachable",
+            "length": "Medium length messages",
+            "emoji_usage": "Moderate",
+            "formality": "Casual but respectful"
+        },
+        "profile_preferences": {
+            "bio_length": "2-3 sentences",
+            "photo_style": "Clear and recent",
+            "interests": "Varied and specific"
+        },
+        "success_factors": ["Be specific", "Ask good questions", "Suggest a concrete plan"],
+        "detailed_analysis": f"Stub trends for {request}"
+    })
+
+
+def known_regions(path: str) -> List[str]:
+    if not os.path.exists(path):
+        return []
+    return sorted(load_trend_file(path).get("regions", {}).keys())
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Regenerate regional trend data")
+    parser.add_argument("--regions", nargs="*", help="regions to refresh (default: all regions in the store)")
+    parser.add_argument("--output", default=settings.trend_data_path, help="trend store file to write")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model", default=None, help="model to use (default: the trend_analysis route)")
+    parser.add_argument("--stub", action="store_true", help="use the offline stub LLM")
+    parser.add_argument("--report", default=None, help="write the timing/token report to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=settings.log_level)
+    regions = args.regions or known_regions(args.output)
+    if not regions:
+        parser.error("no regions given and none found in the trend store")
+
+    gateway = StubLLMGateway(stub_responder) if args.stub else get_llm_gateway()
+    job = TrendRefreshJob(
+        gateway=gateway,
+        output_path=args.output,
+        checkpoint_path=args.checkpoint or args.output + ".checkpoint",
+        regions=regions,
+        concurrency=args.concurrency,
+        model=args.model
+    )
+
+    async def run():
+        try:
+            return await job.run()
+        finally:
+            await gateway.aclose()
+
+    report = asyncio.run(run())
+    for region, summary in sorted(report["regions"].items()):
+        print(f"{region:<24} {summary['entries']:>3} entries {summary['seconds']:>8.2f}s {summary['tokens']:>8} tokens")
+    print(f"total tokens: {report['total_tokens']}, failed: {len(report['failed'])}")
+    if args.report:
+        atomic_write_json(args.report, report)
+    return 0 if not report["failed"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
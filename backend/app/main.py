@@ -3,30 +3,55 @@ Dating Conversation Assistant API
 Main FastAPI application with core endpoints
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+import time
+
+# Startup timing starts here, before the heavy imports below
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import uvicorn
 from datetime import datetime
+import asyncio
+import json
 import logging
 
 from app.services.conversation_analyzer import ConversationAnalyzer
 from app.services.suggestion_engine import SuggestionEngine
 from app.services.profile_optimizer import ProfileOptimizer
 from app.services.trend_analyzer import TrendAnalyzer
-from app.models.database import get_db
+from app.services.bio_scorer import BioScorer
+from app.services.llm_gateway import LLMGateway, get_llm_gateway
+from app.services.model_router import ModelRouter, get_model_router
+from app.models.database import get_db, init_db, close_db
+from app.models.history import AnalysisRecord, SuggestionRecord
+from app.services.history_writer import HistoryWriter
+from app.services.rate_limiter import get_rate_limiter
+from app.services import metrics
+from app.services.tracing import TracedRoute, TracingMiddleware, EventLoopMonitor
+from sqlalchemy import select
 from app.models.schemas import (
     ConversationAnalysisRequest,
     ConversationAnalysisResponse,
+    BatchConversationAnalysisRequest,
     SuggestionRequest,
     SuggestionResponse,
     ProfileOptimizationRequest,
     ProfileOptimizationResponse,
+    ProfileOptimizationJobRequest,
+    JobResponse,
+    BioScoreRequest,
+    BioScoreResponse,
     TrendAnalysisRequest,
     TrendAnalysisResponse
 )
-from app.config import settings
+from app.config import settings, log_configuration
+from app.services.process_stats import memory_stats
+from app.services.http_cache import JSON_MEDIA_TYPE, PayloadCache, cache_window, dumps
+from app.services.job_queue import JobQueue, JobQueueFull, build_job_queue
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -37,6 +62,7 @@ app = FastAPI(
     description="AI-powered dating conversation and profile optimization",
     version="1.0.0"
 )
+app.router.route_class = TracedRoute
 
 # CORS middleware
 app.add_middleware(
@@ -47,11 +73,99 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-conversation_analyzer = ConversationAnalyzer()
-suggestion_engine = SuggestionEngine()
-profile_optimizer = ProfileOptimizer()
-trend_analyzer = TrendAnalyzer()
+if settings.metrics_enabled:
+    app.add_middleware(TracingMiddleware)
+
+history_writer = HistoryWriter()
+rate_limiter = get_rate_limiter()
+loop_monitor = EventLoopMonitor(settings.loop_monitor_interval_seconds)
+
+# Serialized payloads for the read endpoints, keyed by data version (see http_cache)
+read_cache = PayloadCache(settings.http_cache_max_entries)
+health_cache = PayloadCache(1, ttl=settings.health_cache_seconds)
+READ_CACHE_CONTROL = f"public, max-age={settings.http_cache_max_age_seconds}"
+
+# Services are built by init_services() on startup, so under app.serve each
+# worker builds its own after the fork and the parent stays small
+llm_gateway: Optional[LLMGateway] = None
+model_router: Optional[ModelRouter] = None
+conversation_analyzer: Optional[ConversationAnalyzer] = None
+suggestion_engine: Optional[SuggestionEngine] = None
+trend_analyzer: Optional[TrendAnalyzer] = None
+profile_optimizer: Optional[ProfileOptimizer] = None
+job_queue: Optional[JobQueue] = None
+
+startup_timing: Dict[str, Any] = {}
+
+def init_services():
+    """Build the services (all model calls share one pooled async gateway); safe to call twice"""
+    global llm_gateway, model_router, conversation_analyzer, suggestion_engine, trend_analyzer, profile_optimizer, job_queue
+    if llm_gateway is not None:
+        return
+    llm_gateway = get_llm_gateway()
+    model_router = get_model_router()
+    conversation_analyzer = ConversationAnalyzer(llm_gateway)
+    suggestion_engine = SuggestionEngine(llm_gateway)
+    trend_analyzer = TrendAnalyzer(llm_gateway)
+    profile_optimizer = ProfileOptimizer(llm_gateway, bio_scorer=BioScorer(trend_analyzer.store))
+    job_queue = build_job_queue()
+    job_queue.register("optimize-profile", _run_profile_optimization_job)
+
+    # Gauges read from existing stats when /metrics is scraped
+    metrics.LLM_IN_FLIGHT.set_function(lambda: llm_gateway.in_flight)
+    if llm_gateway.cache is not None:
+        metrics.CACHE_LOOKUPS.set_function(lambda: llm_gateway.cache.stats.hits, result="hit")
+        metrics.CACHE_LOOKUPS.set_function(lambda: llm_gateway.cache.stats.misses, result="miss")
+        metrics.CACHE_HIT_RATIO.set_function(lambda: llm_gateway.cache.stats.as_dict()["hit_ratio"])
+    if suggestion_engine.semantic_cache is not None:
+        metrics.SEMANTIC_CACHE_LOOKUPS.set_function(lambda: suggestion_engine.semantic_cache.stats.hits, result="hit")
+        metrics.SEMANTIC_CACHE_LOOKUPS.set_function(lambda: suggestion_engine.semantic_cache.stats.misses, result="miss")
+    metrics.JOBS_QUEUED.set_function(lambda: job_queue.stats()["queued"])
+
+def _user_key(http_request: Request, user_id: str = None) -> str:
+    """Identify the caller for rate limiting: explicit user id, X-User-Id header, then client address"""
+    if user_id:
+        return user_id
+    if http_request.headers.get("x-user-id"):
+        return http_request.headers["x-user-id"]
+    return http_request.client.host if http_request.client else "anonymous"
+
+@app.on_event("startup")
+async def startup():
+    """Build the services, create history tables and start the background history writer and job workers"""
+    started = time.perf_counter()
+    log_configuration()
+    init_services()
+    init_done = time.perf_counter()
+    if settings.metrics_enabled:
+        loop_monitor.start()
+    job_queue.start()
+    if settings.history_enabled:
+        try:
+            await init_db()
+            history_writer.start()
+        except Exception as e:
+            logger.error(f"History disabled, database unavailable: {str(e)}")
+
+    ready = time.perf_counter()
+    startup_timing.update({
+        "import_seconds": round(_imported - _import_started, 3),
+        "init_services_seconds": round(init_done - started, 3),
+        "startup_seconds": round(ready - started, 3),
+        # From the start of this module's import; under app.serve that includes the fork
+        "ready_seconds": round(ready - _import_started, 3)
+    })
+    logger.info(f"Ready in {startup_timing['ready_seconds']}s {startup_timing} {memory_stats()}")
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Finish running jobs, flush pending history and close pooled connections"""
+    await loop_monitor.stop()
+    await job_queue.stop()
+    await history_writer.stop()
+    await close_db()
+    await llm_gateway.aclose()
+    await profile_optimizer.photo_analyzer.aclose()
 
 @app.get("/")
 async def root():
@@ -66,17 +180,23 @@ async def root():
 @app.post("/analyze-conversation", response_model=ConversationAnalysisResponse)
 async def analyze_conversation(
     request: ConversationAnalysisRequest,
-    db = Depends(get_db)
+    http_request: Request
 ):
     """
     Analyze a dating conversation and provide insights
     """
     try:
+        # Over the limit: answer from the local analyzer instead of failing
+        admitted = rate_limiter.admit("analyze-conversation", _user_key(http_request))
         analysis = await conversation_analyzer.analyze_conversation(
             messages=request.messages,
             user_context=request.user_context,
-            partner_context=request.partner_context
+            partner_context=request.partner_context,
+            conversation_id=request.conversation_id,
+            incremental=request.incremental,
+            mode=request.mode if admitted else "local"
         )
+        history_writer.record_analysis(request.conversation_id, analysis)
         
         return ConversationAnalysisResponse(
             conversation_id=request.conversation_id,
@@ -87,20 +207,97 @@ async def analyze_conversation(
         logger.error(f"Error analyzing conversation: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _analyze_batch_item(index: int, item: ConversationAnalysisRequest, user_key: str, admitted: bool) -> Dict[str, Any]:
+    """Analyze one batch item, reporting failures on the item instead of the batch"""
+    try:
+        # Each item spends from the caller's token budget; once it is gone, items are analyzed locally
+        item_admitted = admitted and rate_limiter.admit_budget(user_key)
+        analysis = await conversation_analyzer.analyze_conversation(
+            messages=item.messages,
+            user_context=item.user_context,
+            partner_context=item.partner_context,
+            conversation_id=item.conversation_id,
+            incremental=item.incremental,
+            mode=item.mode if item_admitted else "local"
+        )
+        history_writer.record_analysis(item.conversation_id, analysis)
+        return {
+            "index": index,
+            "conversation_id": item.conversation_id,
+            "analysis": analysis,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error analyzing batch item {index}: {str(e)}")
+        return {
+            "index": index,
+            "conversation_id": item.conversation_id,
+            "error": str(e),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+async def _stream_batch(items: List[ConversationAnalysisRequest], concurrency: int, user_key: str, admitted: bool):
+    """
+    Fan items out to a fixed pool of workers and yield NDJSON lines in
+    completion order. Workers are cancelled if the client disconnects.
+    """
+    pending: asyncio.Queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        pending.put_nowait((index, item))
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                index, item = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await done.put(await _analyze_batch_item(index, item, user_key, admitted))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(items)))]
+    try:
+        for _ in range(len(items)):
+            result = await done.get()
+            yield json.dumps(result, default=str) + "\n"
+    finally:
+        for task in workers:
+            task.cancel()
+
+@app.post("/analyze-conversations/batch")
+async def analyze_conversations_batch(request: BatchConversationAnalysisRequest, http_request: Request):
+    """
+    Analyze many conversations in one request, streaming one NDJSON result
+    per item as soon as it completes. Items fall back to local analysis once
+    the caller's token budget runs out.
+    """
+    user_key = _user_key(http_request)
+    # Not admitted: every item is analyzed locally
+    admitted = rate_limiter.admit("analyze-conversations/batch", user_key)
+    # The schema bounds max_concurrency to 1..BATCH_MAX_CONCURRENCY
+    concurrency = request.max_concurrency or settings.batch_max_concurrency
+    return StreamingResponse(
+        _stream_batch(request.items, concurrency, user_key, admitted),
+        media_type="application/x-ndjson"
+    )
+
 @app.post("/get-suggestions", response_model=SuggestionResponse)
 async def get_suggestions(
     request: SuggestionRequest,
-    db = Depends(get_db)
+    http_request: Request
 ):
     """
     Get smart suggestions for improving the conversation
     """
     try:
+        # Over the limit: cached or fallback suggestions, no model call
+        admitted = rate_limiter.admit("get-suggestions", _user_key(http_request))
         suggestions = await suggestion_engine.generate_suggestions(
             conversation_context=request.conversation_context,
             user_preferences=request.user_preferences,
-            suggestion_type=request.suggestion_type
+            suggestion_type=request.suggestion_type,
+            use_model=admitted
         )
+        history_writer.record_suggestions(request.conversation_id, request.suggestion_type, suggestions)
         
         return SuggestionResponse(
             conversation_id=request.conversation_id,
@@ -111,44 +308,206 @@ async def get_suggestions(
         logger.error(f"Error generating suggestions: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.post("/analyze-conversation/stream")
+async def analyze_conversation_stream(request: ConversationAnalysisRequest, http_request: Request):
+    """
+    Stream analysis tokens as server-sent events, ending with a `result`
+    event shaped like ConversationAnalysisResponse
+    """
+    admitted = rate_limiter.admit("analyze-conversation", _user_key(http_request))
+    async def events():
+        # Local mode, or over the limit: no tokens, just the local result
+        async for kind, payload in conversation_analyzer.stream_analysis(
+            messages=request.messages,
+            user_context=request.user_context,
+            partner_context=request.partner_context,
+            conversation_id=request.conversation_id,
+            incremental=request.incremental,
+            mode=request.mode if admitted else "local"
+        ):
+            if kind == "token":
+                yield _sse_event("token", {"text": payload})
+            else:
+                history_writer.record_analysis(request.conversation_id, payload)
+                response = ConversationAnalysisResponse(
+                    conversation_id=request.conversation_id,
+                    analysis=payload,
+                    timestamp=datetime.utcnow()
+                )
+                yield _sse_event("result", response.model_dump(mode="json"))
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/get-suggestions/stream")
+async def get_suggestions_stream(request: SuggestionRequest, http_request: Request):
+    """
+    Stream suggestion tokens as server-sent events, ending with a `result`
+    event shaped like SuggestionResponse
+    """
+    admitted = rate_limiter.admit("get-suggestions", _user_key(http_request))
+    async def local_suggestions():
+        yield "result", await suggestion_engine.generate_suggestions(
+            conversation_context=request.conversation_context,
+            user_preferences=request.user_preferences,
+            suggestion_type=request.suggestion_type,
+            use_model=False
+        )
+    async def events():
+        # Over the limit: no tokens, just cached or fallback suggestions
+        source = suggestion_engine.stream_suggestions(
+            conversation_context=request.conversation_context,
+            user_preferences=request.user_preferences,
+            suggestion_type=request.suggestion_type
+        ) if admitted else local_suggestions()
+        async for kind, payload in source:
+            if kind == "token":
+                yield _sse_event("token", {"text": payload})
+            else:
+                history_writer.record_suggestions(request.conversation_id, request.suggestion_type, payload)
+                response = SuggestionResponse(
+                    conversation_id=request.conversation_id,
+                    suggestions=payload,
+                    timestamp=datetime.utcnow()
+                )
+                yield _sse_event("result", response.model_dump(mode="json"))
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def _optimize_profile(request: ProfileOptimizationRequest, admitted: bool) -> ProfileOptimizationResponse:
+    # Over the limit: local photo and bio analysis only
+    optimization = await profile_optimizer.optimize_profile(
+        photos=request.photos,
+        bio=request.bio,
+        preferences=request.preferences,
+        region=request.region,
+        use_model=admitted
+    )
+    history_writer.record_profile_optimization(request.user_id, request.region, optimization)
+    
+    return ProfileOptimizationResponse(
+        user_id=request.user_id,
+        optimization=optimization,
+        timestamp=datetime.utcnow()
+    )
+
+async def _run_profile_optimization_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    request = ProfileOptimizationRequest(**payload)
+    # Admitted when the job runs, not when it was submitted, so queued jobs see current limits
+    admitted = rate_limiter.admit("optimize-profile", request.user_id)
+    response = await _optimize_profile(request, admitted)
+    return response.model_dump(mode="json")
+
 @app.post("/optimize-profile", response_model=ProfileOptimizationResponse)
 async def optimize_profile(
     request: ProfileOptimizationRequest,
-    db = Depends(get_db)
+    http_request: Request
 ):
     """
     Analyze and optimize user's dating profile
     """
     try:
-        optimization = await profile_optimizer.optimize_profile(
-            photos=request.photos,
-            bio=request.bio,
+        admitted = rate_limiter.admit("optimize-profile", _user_key(http_request, request.user_id))
+        return await _optimize_profile(request, admitted)
+    except Exception as e:
+        logger.error(f"Error optimizing profile: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/jobs/optimize-profile", response_model=JobResponse, status_code=202)
+async def submit_profile_optimization(
+    request: ProfileOptimizationJobRequest,
+    response: Response
+):
+    """
+    Queue a profile optimization and return its job at once. Poll
+    GET /jobs/{job_id} or pass callback_url to receive the finished job.
+    Resubmitting while the user's job is pending returns the same job.
+    """
+    try:
+        job, deduplicated = await job_queue.submit(
+            "optimize-profile",
+            request.model_dump(exclude={"priority", "callback_url"}),
+            user_id=request.user_id,
+            priority=request.priority,
+            callback_url=request.callback_url
+        )
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Job queue is full: {str(e)}",
+            headers={"Retry-After": str(settings.job_poll_seconds)}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error submitting profile optimization: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    response.headers["Location"] = f"/jobs/{job['job_id']}"
+    response.headers["Retry-After"] = str(settings.job_poll_seconds)
+    return JobResponse(**JobQueue.public(job), deduplicated=deduplicated)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, response: Response):
+    """Status of a background job, with its result once it has succeeded"""
+    try:
+        job = await job_queue.get(job_id)
+    except Exception as e:
+        logger.error(f"Error reading job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] in ("queued", "running"):
+        response.headers["Retry-After"] = str(settings.job_poll_seconds)
+    return JobResponse(**JobQueue.public(job))
+
+@app.post("/score-bios", response_model=BioScoreResponse)
+async def score_bios(
+    request: BioScoreRequest,
+    http_request: Request
+):
+    """
+    Rank bio variants with the local scorer; the model only narrates the winner
+    """
+    try:
+        # Over the limit: still rank locally, just skip the narrative
+        admitted = request.narrate and rate_limiter.admit("score-bios", _user_key(http_request, request.user_id))
+        result = await profile_optimizer.score_bios(
+            bios=request.bios,
+            region=request.region,
             preferences=request.preferences,
-            region=request.region
+            narrate=admitted
         )
         
-        return ProfileOptimizationResponse(
-            user_id=request.user_id,
-            optimization=optimization,
+        return BioScoreResponse(
+            **result,
             timestamp=datetime.utcnow()
         )
     except Exception as e:
-        logger.error(f"Error optimizing profile: {str(e)}")
+        logger.error(f"Error scoring bios: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/analyze-trends", response_model=TrendAnalysisResponse)
 async def analyze_trends(
     request: TrendAnalysisRequest,
-    db = Depends(get_db)
+    http_request: Request
 ):
     """
     Analyze regional dating trends and preferences
     """
     try:
+        # Over the limit: stored trends or generic ones, no model call
+        admitted = rate_limiter.admit("analyze-trends", _user_key(http_request))
         trends = await trend_analyzer.analyze_trends(
             region=request.region,
             age_range=request.age_range,
-            preferences=request.preferences
+            preferences=request.preferences,
+            use_model=admitted
         )
         
         return TrendAnalysisResponse(
@@ -160,9 +519,38 @@ async def analyze_trends(
         logger.error(f"Error analyzing trends: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/health")
-async def health_check():
-    """Detailed health check"""
+@app.get("/history/{conversation_id}")
+async def get_conversation_history(conversation_id: str, limit: int = Query(20, ge=1, le=200), db = Depends(get_db)):
+    """Most recent stored analyses and suggestions for a conversation"""
+    try:
+        analyses = await db.scalars(
+            select(AnalysisRecord)
+            .where(AnalysisRecord.conversation_id == conversation_id)
+            .order_by(AnalysisRecord.created_at.desc())
+            .limit(limit)
+        )
+        suggestions = await db.scalars(
+            select(SuggestionRecord)
+            .where(SuggestionRecord.conversation_id == conversation_id)
+            .order_by(SuggestionRecord.created_at.desc())
+            .limit(limit)
+        )
+        return {
+            "conversation_id": conversation_id,
+            "analyses": [
+                {"analysis": record.analysis, "timestamp": record.created_at}
+                for record in analyses
+            ],
+            "suggestions": [
+                {"suggestion_type": record.suggestion_type, "suggestions": record.suggestions, "timestamp": record.created_at}
+                for record in suggestions
+            ]
+        }
+    except Exception as e:
+        logger.error(f"Error reading conversation history: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _health_payload() -> Dict[str, Any]:
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow(),
@@ -176,41 +564,125 @@ async def health_check():
             "openai_configured": bool(settings.openai_api_key),
             "debug_mode": settings.debug,
             "environment": settings.environment
+        },
+        "trend_store": trend_analyzer.store.stats(),
+        "quick_suggestions": suggestion_engine.quick_index.stats(),
+        "photo_analyzer": profile_optimizer.photo_analyzer.stats(),
+        "conversation_state": conversation_analyzer.state_store.stats(),
+        "history_writer": history_writer.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "model_router": model_router.stats(),
+        "startup": startup_timing,
+        "process": memory_stats(),
+        "response_cache": llm_gateway.cache.stats.as_dict() if llm_gateway.cache else None,
+        "http_cache": read_cache.stats(),
+        "jobs": job_queue.stats(),
+        "semantic_cache": (
+            {**suggestion_engine.semantic_cache.stats.as_dict(), "entries": len(suggestion_engine.semantic_cache)}
+            if suggestion_engine.semantic_cache else None
+        ),
+        "single_flight": {
+            "analyze_conversation": ConversationAnalyzer.analyze_conversation.single_flight.stats(),
+            "generate_suggestions": SuggestionEngine.generate_suggestions.single_flight.stats(),
+            "optimize_profile": ProfileOptimizer.optimize_profile.single_flight.stats(),
+            "analyze_trends": TrendAnalyzer.analyze_trends.single_flight.stats()
         }
     }
 
+@app.get("/health")
+async def health_check(request: Request):
+    """Detailed health check; a snapshot rebuilt at most every HEALTH_CACHE_SECONDS"""
+    return health_cache.get("health", _health_payload).response(request, "no-cache")
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/quick-suggestions/{message_type}")
-async def get_quick_suggestions(message_type: str):
-    """Get quick suggestions for common message types"""
+async def get_quick_suggestions(
+    message_type: str,
+    request: Request,
+    name: Optional[str] = None,
+    interests: Optional[str] = None,
+    user_interests: Optional[str] = None,
+    region: Optional[str] = None,
+    seed: Optional[str] = None,
+    count: int = Query(3, ge=1, le=10)
+):
+    """
+    Get quick suggestions for common message types. The optional match name,
+    comma-separated interests (match and user) and region fill in template
+    placeholders and pick interest- and region-specific lines. ``seed`` is
+    the caller's own key, e.g. a conversation id. The lines for a given query
+    change once per HTTP_CACHE_MAX_AGE_SECONDS window, so the response can be
+    cached for that long. Without any of these every request draws fresh
+    lines from the cached, pre-serialized generic templates, and the
+    response itself is not cached.
+    """
     try:
-        suggestions = suggestion_engine.get_quick_suggestions(message_type)
-        return {
-            "message_type": message_type,
-            "suggestions": suggestions,
-            "timestamp": datetime.utcnow()
-        }
+        if not any((name, interests, user_interests, region, seed)):
+            # Nothing tells callers apart: a shared cached draw would give everyone the same lines.
+            # Each request samples its own from the pre-serialized generic lines instead.
+            lines = suggestion_engine.quick_index.generic_lines(message_type, count)
+            body = b"".join((
+                b'{"message_type":', dumps(message_type),
+                b',"suggestions":[', b",".join(lines),
+                b'],"timestamp":', dumps(datetime.utcnow()), b"}"
+            ))
+            return Response(content=body, media_type=JSON_MEDIA_TYPE, headers={"Cache-Control": "no-store"})
+
+        window, window_start = cache_window(settings.http_cache_max_age_seconds)
+        trends_version = trend_analyzer.store.data_version() if region else None
+        key = ("quick-suggestions", message_type, name, interests, user_interests, region, seed, count, window, trends_version)
+
+        def build() -> Dict[str, Any]:
+            context = {
+                "name": name,
+                "interests": interests,
+                "user_interests": user_interests,
+                "region": region,
+                "topics": trend_analyzer.get_trending_topics(region) if region else None
+            }
+            # Seeded by the query and window, so every worker draws the same lines
+            suggestions = suggestion_engine.get_quick_suggestions(message_type, context, count, seed=repr(key))
+            return {
+                "message_type": message_type,
+                "suggestions": suggestions,
+                "timestamp": window_start
+            }
+
+        return read_cache.get(key, build).response(request, READ_CACHE_CONTROL)
     except Exception as e:
         logger.error(f"Error getting quick suggestions: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/trends/{region}")
-async def get_region_trends(region: str):
+async def get_region_trends(region: str, request: Request):
     """Get trending topics for a specific region"""
     try:
-        trending_topics = trend_analyzer.get_trending_topics(region)
-        popular_photos = trend_analyzer.get_popular_photo_types(region)
-        communication_style = trend_analyzer.get_communication_style(region)
-        
-        return {
-            "region": region,
-            "trending_topics": trending_topics,
-            "popular_photo_types": popular_photos,
-            "communication_style": communication_style,
-            "timestamp": datetime.utcnow()
-        }
+        version = trend_analyzer.store.data_version()
+
+        def build() -> Dict[str, Any]:
+            return {
+                "region": region,
+                "trending_topics": trend_analyzer.get_trending_topics(region),
+                "popular_photo_types": trend_analyzer.get_popular_photo_types(region),
+                "communication_style": trend_analyzer.get_communication_style(region),
+                # When the trend data last changed, so the body is stable between updates
+                "timestamp": datetime.utcfromtimestamp(version) if version else None
+            }
+
+        return read_cache.get(("trends", region, version), build).response(request, READ_CACHE_CONTROL)
     except Exception as e:
         logger.error(f"Error getting region trends: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+_imported = time.perf_counter()
+
 if __name__ == "__main__":
+    # Single process for development; production runs python -m app.serve
     uvicorn.run(app, host=settings.api_host, port=settings.api_port)
\ No newline at end of file
@@ -2,24 +2,76 @@
 Database configuration and connection management
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
 from app.config import settings
 
-# For now, we'll use SQLite as a simple database
-# In production, you'd want to use PostgreSQL
-DATABASE_URL = "sqlite:///./dating_assistant.db"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class Base(DeclarativeBase):
+    pass
 
-Base = declarative_base()
 
-def get_db():
+def async_database_url(url: str) -> str:
+    """Map a plain database URL to its async driver (asyncpg / aiosqlite)"""
+    if url.startswith("postgresql://") or url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url.split("://", 1)[1]
+    return url
+
+
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[async_sessionmaker] = None
+
+def get_engine() -> AsyncEngine:
+    """Create the engine on first use so importing this module never connects"""
+    global _engine, _session_factory
+    if _engine is None:
+        url = async_database_url(settings.database_url)
+        if url.startswith("sqlite"):
+            _engine = create_async_engine(url, connect_args={"timeout": 30})
+
+            @event.listens_for(_engine.sync_engine, "connect")
+            def _set_sqlite_pragmas(dbapi_connection, connection_record):
+                # WAL lets readers proceed while the history writer commits
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.close()
+        else:
+            _engine = create_async_engine(
+                url,
+                pool_size=settings.db_pool_size,
+                max_overflow=settings.db_max_overflow,
+                pool_timeout=settings.db_pool_timeout_seconds,
+                pool_recycle=1800,
+                pool_pre_ping=True
+            )
+        _session_factory = async_sessionmaker(_engine, expire_on_commit=False)
+    return _engine
+
+def get_session_factory() -> async_sessionmaker:
+    get_engine()
+    return _session_factory
+
+async def init_db():
+    """Create tables that do not exist yet"""
+    # Import models so they are registered on Base.metadata
+    from app.models import history  # noqa: F401
+
+    async with get_engine().begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+async def close_db():
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _session_factory = None
+
+async def get_db():
     """Dependency to get database session"""
-    db = SessionLocal()
-    try:
+    async with get_session_factory()() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
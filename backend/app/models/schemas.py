@@ -2,28 +2,39 @@
 Pydantic schemas for the Dating Conversation Assistant API
 """
 
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Dict, Any, Optional, Literal
 from datetime import datetime
 
+from app.config import settings
+
+# Column sizes of the history tables (app/models/history.py)
+HistoryId = Annotated[str, Field(max_length=128)]
+
 # Conversation Analysis Schemas
 class ConversationAnalysisRequest(BaseModel):
-    conversation_id: str
+    conversation_id: HistoryId
     messages: List[Dict[str, Any]]
     user_context: Optional[Dict[str, Any]] = None
     partner_context: Optional[Dict[str, Any]] = None
+    incremental: bool = False
+    mode: Literal["llm", "local"] = "llm"  # "llm" adds the model narrative, "local" uses heuristics only
 
 class ConversationAnalysisResponse(BaseModel):
     conversation_id: str
     analysis: Dict[str, Any]
     timestamp: datetime
 
+class BatchConversationAnalysisRequest(BaseModel):
+    items: List[ConversationAnalysisRequest] = Field(..., max_length=settings.batch_max_items)
+    max_concurrency: Optional[int] = Field(None, ge=1, le=settings.batch_max_concurrency)
+
 # Suggestion Schemas
 class SuggestionRequest(BaseModel):
-    conversation_id: str
+    conversation_id: HistoryId
     conversation_context: Dict[str, Any]
     user_preferences: Optional[Dict[str, Any]] = None
-    suggestion_type: str = "general"
+    suggestion_type: str = Field("general", max_length=64)
 
 class SuggestionResponse(BaseModel):
     conversation_id: str
@@ -32,17 +43,48 @@ class SuggestionResponse(BaseModel):
 
 # Profile Optimization Schemas
 class ProfileOptimizationRequest(BaseModel):
-    user_id: str
-    photos: List[str]
+    user_id: HistoryId
+    photos: List[str] = Field(max_length=settings.photo_max_count)
     bio: str
     preferences: Dict[str, Any]
-    region: str
+    region: HistoryId
 
 class ProfileOptimizationResponse(BaseModel):
     user_id: str
     optimization: Dict[str, Any]
     timestamp: datetime
 
+class ProfileOptimizationJobRequest(ProfileOptimizationRequest):
+    priority: Literal["high", "normal", "low"] = "normal"
+    callback_url: Optional[str] = None  # receives the finished job as a JSON POST
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str  # queued, running, succeeded or failed
+    priority: str
+    user_id: Optional[str] = None
+    callback_url: Optional[str] = None
+    deduplicated: bool = False  # an earlier submission's job was returned
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class BioScoreRequest(BaseModel):
+    bios: List[Annotated[str, Field(max_length=settings.bio_max_chars)]] = Field(max_length=settings.bio_score_max_bios)
+    region: Optional[str] = None
+    preferences: Optional[Dict[str, Any]] = None
+    user_id: Optional[str] = None
+    narrate: bool = True  # ask the model for a narrative on the winning bio
+
+class BioScoreResponse(BaseModel):
+    rankings: List[Dict[str, Any]]
+    best: Dict[str, Any]
+    narrative: Optional[Dict[str, Any]] = None
+    timestamp: datetime
+
 # Trend Analysis Schemas
 class TrendAnalysisRequest(BaseModel):
     region: str
@@ -53,3 +95,36 @@ class TrendAnalysisResponse(BaseModel):
     region: str
     trends: Dict[str, Any]
     timestamp: datetime
+
+# Structured model output schemas
+class SuggestionItem(BaseModel):
+    type: str
+    suggestion: str
+    reason: str
+
+class SuggestionList(BaseModel):
+    suggestions: List[SuggestionItem]
+
+class ConversationInsights(BaseModel):
+    summary: str
+    strengths: List[str] = []
+    improvements: List[str] = []
+    suggestions: List[str] = []
+
+class ProfileInsights(BaseModel):
+    summary: str
+    bio_suggestions: List[str]
+    photo_suggestions: List[str]
+
+class BioNarrative(BaseModel):
+    summary: str
+    bio_suggestions: List[str] = []
+
+class TrendRecord(BaseModel):
+    popular_topics: List[str]
+    trending_topics: List[str] = []
+    popular_photo_types: List[str] = []
+    communication_style: Dict[str, str] = {}
+    profile_preferences: Dict[str, str] = {}
+    success_factors: List[str] = []
+    detailed_analysis: str = ""
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+Production launcher: pre-forked workers sharing one listening socket
+
+The parent imports the app once. The code pages of FastAPI, OpenAI, NumPy and
+the rest stay shared copy-on-write with every worker. The parent then packs
+the read-mostly data (trend records, quick-suggestion templates) into
+SHARED_DATA_DIR, binds the socket and forks the workers. Each worker builds
+its services in the startup hook, after the fork, so no client, process pool
+or connection crosses a fork. When several workers run, the response cache
+gets a shared tier, job state moves to the same place and the rate-limit
+buckets are shared too: SQLite files in the same directory, unless Redis is
+configured for the cache and jobs. Workers that die are restarted. SIGTERM and SIGINT shut all
+workers down gracefully.
+
+Usage:
+    python -m app.serve --workers 4
+    python -m app.serve --workers 1 --port 8001
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import List, Dict
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies sooner than this after starting is treated as a startup failure
+MIN_WORKER_LIFETIME_SECONDS = 10.0
+
+
+def default_shared_dir(port: int) -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, f"dating-assistant-{port}")
+
+
+def configure(args):
+    """Apply launch options to settings before any service reads them"""
+    settings.api_host = args.host
+    settings.api_port = args.port
+    settings.shared_data_dir = args.shared_dir
+    settings.web_workers = args.workers
+    os.makedirs(args.shared_dir, exist_ok=True)
+    if args.workers > 1 and settings.rate_limit_enabled and not settings.rate_limit_store_path:
+        # Per-worker buckets would multiply every limit by the worker count
+        settings.rate_limit_store_path = os.path.join(args.shared_dir, "rate_limits.sqlite3")
+    if args.workers > 1 and settings.response_cache_enabled and not settings.response_cache_shared:
+        settings.response_cache_shared = True
+        settings.response_cache_shared_path = os.path.join(args.shared_dir, "response_cache.sqlite3")
+    if args.workers > 1 and settings.job_store == "memory":
+        # Any worker may answer GET /jobs/{id}, so job state goes where all of them see it
+        settings.job_store = "sqlite"
+        settings.job_store_path = os.path.join(args.shared_dir, "jobs.sqlite3")
+
+
+def prepare_shared_data():
+    """Pack the shared data once in the parent so workers only map it"""
+    from app.services.quick_suggestions import QuickSuggestionIndex
+    from app.services.trend_store import TrendStore
+
+    TrendStore()
+    QuickSuggestionIndex()
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket):
+    import uvicorn
+
+    from app.main import app
+
+    config = uvicorn.Config(app, log_level=settings.log_level.lower(), lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Arbiter:
+    def __init__(self, sock: socket.socket, workers: int):
+        self.sock = sock
+        self.count = workers
+        self.workers: Dict[int, int] = {}  # pid -> worker index
+        self.started_at: Dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            # Own process group: a terminal Ctrl+C reaches only the parent, which stops workers once
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(self.sock)
+            except Exception:
+                logger.exception(f"Worker {index} failed")
+                code = 1
+            # Unwind to a normal interpreter exit so atexit hooks (multiprocessing cleanup) run
+            sys.exit(code)
+        self.workers[pid] = index
+        self.started_at[pid] = time.monotonic()
+
+    def stop(self, signum=None, frame=None):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"Stopping {len(self.workers)} workers")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.count):
+            self.spawn(index)
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self.workers.pop(pid, None)
+            started = self.started_at.pop(pid, time.monotonic())
+            if index is None or self.stopping:
+                continue
+            lifetime = time.monotonic() - started
+            if lifetime < MIN_WORKER_LIFETIME_SECONDS:
+                logger.error(f"Worker {index} (pid {pid}) exited after {lifetime:.1f}s with status {status}; shutting down")
+                self.stop()
+                continue
+            logger.warning(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+            self.spawn(index)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked workers")
+    parser.add_argument("--workers", type=int, default=settings.web_workers or os.cpu_count() or 1)
+    parser.add_argument("--host", default=settings.api_host)
+    parser.add_argument("--port", type=int, default=settings.api_port)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--shared-dir", default=None, help="directory for mmap-shared data (default: under /dev/shm)")
+    args = parser.parse_args(argv)
+    args.shared_dir = args.shared_dir or settings.shared_data_dir or default_shared_dir(args.port)
+
+    logging.basicConfig(level=settings.log_level)
+    launched = time.perf_counter()
+    configure(args)
+    # Import in the parent so the workers share the imported code
+    import app.main  # noqa: F401
+
+    prepare_shared_data()
+    sock = bind_socket(args.host, args.port, args.backlog)
+    logger.info(
+        f"Forking {args.workers} workers on {args.host}:{args.port} after {time.perf_counter() - launched:.2f}s "
+        f"(shared data in {args.shared_dir})"
+    )
+    if not hasattr(os, "fork"):
+        logger.warning("os.fork is unavailable; running a single worker in this process")
+        run_worker(sock)
+        return
+    Arbiter(sock, args.workers).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Local, vectorized bio scoring
+
+Scores a batch of bios in one pass without calling the model. The bios are
+joined into one buffer, each pattern runs over it once, and its matches are
+binned per bio with ``searchsorted``/``bincount``. Every scoring step after
+that works on NumPy arrays over the whole batch:
+- length band
+- readability (Flesch reading ease)
+- specificity: numbers, proper nouns and concrete nouns
+- a question or call to action
+- cliché density
+- overlap with the region's trending topics
+
+Used to rank bio variants for ``POST /score-bios`` and as the ``bio_score`` of
+profile optimization.
+"""
+
+import re
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from app.services.trend_store import TrendStore
+
+# Bios are joined with this separator so each pass covers the whole batch
+SEPARATOR = "\x00"
+
+# Matched against the lowercased batch; IGNORECASE alternations are several times slower
+WORD_RE = re.compile(r"[a-z][a-z'-]*|\d+")
+SENTENCE_RE = re.compile(r"[.!?]+(?=\s|\x00|$)")
+
+VOWELS = np.array([ord(ch) for ch in "aeiouy"], dtype=np.uint32)
+UPPER_A, UPPER_Z, LOWER_A, LOWER_Z = ord("A"), ord("Z"), ord("a"), ord("z")
+SENTENCE_ENDS = np.array([ord(ch) for ch in ".!?" + SEPARATOR], dtype=np.uint32)
+
+CLICHES = (
+    "love to laugh", "partner in crime", "work hard play hard", "work hard, play hard",
+    "looking for my other half", "just ask", "fluent in sarcasm", "adventure seeker",
+    "wanderlust", "live laugh love", "no drama", "down to earth", "easy going", "easygoing",
+    "good vibes", "here for a good time", "love to travel", "i love to travel",
+    "bad at bios", "bad at this", "not sure what to write", "swipe right if",
+    "looking for someone to", "my friends would describe me", "netflix and chill",
+    "foodie", "gym rat", "coffee addict", "dog mom", "dog dad", "the office", "6'",
+    "living my best life", "if you can't handle me", "genuine connection", "spontaneous"
+)
+CLICHE_RE = re.compile(r"\b(?:" + "|".join(re.escape(phrase) for phrase in sorted(CLICHES, key=len, reverse=True)) + ")")
+
+CALL_TO_ACTION_RE = re.compile(
+    r"\b(?:ask me|tell me|message me|send me|let's|lets|bonus points|convince me|"
+    r"two truths|teach me|show me|recommend me|challenge me|your favorite|you pick)\b"
+)
+
+CONCRETE_WORDS = frozenset("""
+    hiking hike trail trails climbing bouldering surfing skiing snowboarding kayak kayaking
+    cycling bike marathon half-marathon running yoga pilates tennis soccer basketball chess
+    guitar piano drums violin vinyl records concerts jazz karaoke podcast podcasts
+    tacos sushi ramen pizza pasta bagels brunch coffee espresso wine whiskey beer cocktails
+    baking bread sourdough cooking recipes garden gardening plants pottery painting
+    photography camera film films museum museums gallery books novel novels poetry
+    dog dogs puppy cat cats beach mountains camping roadtrip road trips island festival
+    nurse teacher engineer designer chef doctor lawyer developer architect scientist
+""".split())
+
+# Points per feature; they sum to 10
+WEIGHTS = {
+    "length": 2.0,
+    "readability": 1.5,
+    "specificity": 2.5,
+    "call_to_action": 1.5,
+    "originality": 1.5,
+    "trend_overlap": 1.0
+}
+
+FEEDBACK = {
+    "length": "Aim for 40-120 words: enough to show personality without a wall of text",
+    "readability": "Use shorter sentences and simpler words so it reads at a glance",
+    "specificity": "Swap generic traits for specifics: a place, a dish, a number, a hobby by name",
+    "call_to_action": "End with a question or an easy prompt so matches know how to open",
+    "originality": "Replace clichés with something only you would say",
+    "trend_overlap": "Mention something popular locally to give nearby matches an easy opener"
+}
+
+
+class BioScorer:
+    def __init__(self, trend_store: TrendStore = None):
+        self.trend_store = trend_store
+
+    def topic_words(self, region: Optional[str]) -> frozenset:
+        """Lowercased words of the region's trending and popular topics"""
+        if not region or self.trend_store is None:
+            return frozenset()
+        record = self.trend_store.lookup(region) or {}
+        topics = list(record.get("trending_topics", [])) + list(record.get("popular_topics", []))
+        return frozenset(
+            word for topic in topics for word in WORD_RE.findall(topic.lower()) if len(word) > 3
+        )
+
+    def features(self, bios: List[str], topic_words: frozenset = frozenset()) -> Dict[str, np.ndarray]:
+        """Raw counts per bio, one array per feature"""
+        text = SEPARATOR.join(bio.replace(SEPARATOR, " ") for bio in bios)
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # A few characters lowercase to more than one; keep offsets aligned
+            lowered = "".join(ch.lower()[:1] for ch in text)
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        lower_codes = np.frombuffer(lowered.encode("utf-32-le"), dtype=np.uint32)
+        # Offset of the separator after each bio; a position belongs to the first bio ending after it
+        ends = np.cumsum([len(bio) + 1 for bio in bios]) - 1
+        count = len(bios)
+
+        def owners(positions) -> np.ndarray:
+            return np.searchsorted(ends, np.asarray(positions, dtype=np.int64), side="right")
+
+        def per_bio(positions, weights=None) -> np.ndarray:
+            return np.bincount(owners(positions), weights=weights, minlength=count).astype(float)
+
+        def matches(pattern: re.Pattern) -> np.ndarray:
+            return per_bio([match.start() for match in pattern.finditer(lowered)])
+
+        word_matches = list(WORD_RE.finditer(lowered))
+        starts = np.fromiter((match.start() for match in word_matches), dtype=np.int64, count=len(word_matches))
+        words = [match.group() for match in word_matches]
+        is_number = np.fromiter((word[0].isdigit() for word in words), dtype=bool, count=len(words))
+
+        # Vowel groups approximate syllables; a number reads as one
+        vowel = np.isin(lower_codes, VOWELS)
+        group_starts = np.flatnonzero(vowel & ~np.concatenate(([False], vowel[:-1])))
+
+        # Capitalized mid-sentence words ("... in Austin") are most likely names and places
+        padded = np.concatenate(([0, 0], codes, [0]))
+        first, second = padded[starts + 2], padded[starts + 3]
+        proper = (
+            (first >= UPPER_A) & (first <= UPPER_Z) & (second >= LOWER_A) & (second <= LOWER_Z)
+            & (padded[starts + 1] == ord(" ")) & ~np.isin(padded[starts], SENTENCE_ENDS) & (padded[starts] != ord(" "))
+        )
+
+        columns = {
+            "words": per_bio(starts),
+            "sentences": matches(SENTENCE_RE),
+            "syllables": per_bio(group_starts) + per_bio(starts, is_number),
+            "numbers": per_bio(starts, is_number),
+            "proper_nouns": per_bio(starts, proper),
+            "concrete": per_bio(starts, np.fromiter((word in CONCRETE_WORDS for word in words), dtype=bool, count=len(words))),
+            "questions": per_bio(np.flatnonzero(codes == ord("?"))),
+            "calls_to_action": matches(CALL_TO_ACTION_RE),
+            "cliches": matches(CLICHE_RE),
+            "topic_hits": per_bio(starts, np.fromiter((word in topic_words for word in words), dtype=bool, count=len(words)))
+        }
+        # Text without end punctuation is still one sentence
+        columns["sentences"] = np.where(columns["words"] > 0, np.maximum(columns["sentences"], 1), 0)
+        return columns
+
+    def score(self, bios: List[str], region: str = None) -> List[Dict[str, Any]]:
+        """Score every bio: total out of 10, per-feature scores (0-1) and feedback"""
+        if not bios:
+            return []
+        raw = self.features(bios, self.topic_words(region))
+        words = np.maximum(raw["words"], 1)
+        sentences = np.maximum(raw["sentences"], 1)
+
+        reading_ease = 206.835 - 1.015 * (words / sentences) - 84.6 * (raw["syllables"] / words)
+        specifics = raw["numbers"] + raw["proper_nouns"] + raw["concrete"]
+
+        parts = {
+            "length": np.interp(raw["words"], [0, 10, 40, 120, 200, 300], [0.0, 0.3, 1.0, 1.0, 0.6, 0.3]),
+            "readability": np.clip((reading_ease - 30) / 40, 0, 1),
+            "specificity": np.clip(specifics / np.maximum(3, words / 15), 0, 1),
+            "call_to_action": np.clip(0.6 * (raw["questions"] > 0) + 0.6 * (raw["calls_to_action"] > 0), 0, 1),
+            "originality": np.clip(1 - raw["cliches"] * 40 / words, 0, 1),
+            "trend_overlap": np.clip(raw["topic_hits"] / 2, 0, 1)
+        }
+        # A few words are trivially readable and cliché-free; don't reward that
+        short = np.minimum(raw["words"] / 10, 1)
+        parts["readability"] *= short
+        parts["originality"] *= short
+
+        total = sum(WEIGHTS[name] * values for name, values in parts.items())
+        results = []
+        for i in range(len(bios)):
+            breakdown = {name: round(float(values[i]), 3) for name, values in parts.items()}
+            weakest = sorted((value, name) for name, value in breakdown.items() if value < 0.6)
+            results.append({
+                "index": i,
+                "score": round(float(total[i]), 1),
+                "features": breakdown,
+                "word_count": int(raw["words"][i]),
+                "cliches": int(raw["cliches"][i]),
+                "feedback": [FEEDBACK[name] for _, name in weakest[:3]]
+            })
+        return results
+
+    def rank(self, bios: List[str], region: str = None) -> List[Dict[str, Any]]:
+        """Scored bios, best first (ties keep the submitted order)"""
+        return sorted(self.score(bios, region), key=lambda result: -result["score"])
@@ -0,0 +1,103 @@
+"""
+Circuit breakers and latency tracking for model calls
+
+A breaker opens after a run of consecutive failures. While it is open, calls
+fail immediately with CircuitOpenError, so the services return their fallbacks
+without first waiting out a timeout. Once the reset timeout passes, the
+breaker lets a few probe calls through (half-open): a success closes it again,
+and a failure re-opens it.
+
+LatencyTracker keeps a rolling window of call latencies. The gateway uses its
+upper quantile as the delay before sending a hedged second attempt.
+"""
+
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while its circuit is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """Reserve the right to make one call; every True must be settled with record_*/release"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+        if self.state == HALF_OPEN:
+            if self.probes_in_flight >= self.half_open_max_calls:
+                self.rejected += 1
+                return False
+            self.probes_in_flight += 1
+        return True
+
+    def release(self):
+        """Settle a call whose outcome says nothing about upstream health (cancelled, bad request)"""
+        if self.state == HALF_OPEN and self.probes_in_flight > 0:
+            self.probes_in_flight -= 1
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            self.state = CLOSED
+            self.probes_in_flight = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        if self.state != OPEN:
+            self.times_opened += 1
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probes_in_flight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = 200):
+        self.samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self.samples)
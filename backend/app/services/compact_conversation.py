@@ -0,0 +1,149 @@
+"""
+Compact, column-oriented conversation representation
+
+A conversation is stored as a few parallel arrays: a one-byte role code, an
+end offset into a single shared text buffer, and a float timestamp (NaN when
+missing). Role strings are interned once per process. This replaces one dict
+per message plus a string per field. Active conversations held for
+incremental analysis shrink accordingly, and analysis can work on whole
+columns with NumPy instead of looping over dicts.
+"""
+
+import sys
+from array import array
+from datetime import datetime
+from typing import List, Dict, Any, Iterator
+
+import numpy as np
+
+DEFAULT_ROLE = "user"
+
+ROLE_NAMES: List[str] = [DEFAULT_ROLE, "assistant", "system"]
+_ROLE_CODES: Dict[str, int] = {name: code for code, name in enumerate(ROLE_NAMES)}
+
+
+def role_code(role: Any) -> int:
+    """Intern a role name, returning its one-byte code"""
+    name = str(role) if role is not None else DEFAULT_ROLE
+    code = _ROLE_CODES.get(name)
+    if code is None:
+        if len(ROLE_NAMES) >= 256:
+            return _ROLE_CODES[DEFAULT_ROLE]
+        code = _ROLE_CODES[name] = len(ROLE_NAMES)
+        ROLE_NAMES.append(name)
+    return code
+
+
+def parse_timestamp(value: Any) -> float:
+    """Seconds since the epoch, or NaN when missing or unparseable"""
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return np.nan
+
+
+class CompactConversation:
+    __slots__ = ("roles", "ends", "text", "timestamps")
+
+    def __init__(self, roles: array = None, ends: array = None, text: str = "", timestamps: array = None):
+        self.roles = roles if roles is not None else array("B")
+        self.ends = ends if ends is not None else array("I")
+        self.text = text
+        self.timestamps = timestamps if timestamps is not None else array("d")
+
+    @classmethod
+    def from_messages(cls, messages: List[Dict[str, Any]]) -> "CompactConversation":
+        conversation = cls()
+        conversation.extend(messages)
+        return conversation
+
+    def extend(self, messages: List[Dict[str, Any]]):
+        """Append messages in the request format (role, content, timestamp)"""
+        contents = [str(msg.get("content") or "") for msg in messages]
+        end = self.ends[-1] if self.ends else 0
+        for content in contents:
+            end += len(content)
+            self.ends.append(end)
+        self.roles.extend(role_code(msg.get("role", DEFAULT_ROLE)) for msg in messages)
+        self.timestamps.extend(parse_timestamp(msg.get("timestamp")) for msg in messages)
+        self.text += "".join(contents)
+
+    def __len__(self) -> int:
+        return len(self.roles)
+
+    def _start(self, index: int) -> int:
+        return self.ends[index - 1] if index > 0 else 0
+
+    def role(self, index: int) -> str:
+        return ROLE_NAMES[self.roles[index]]
+
+    def content(self, index: int) -> str:
+        return self.text[self._start(index):self.ends[index]]
+
+    def contents(self) -> Iterator[str]:
+        start = 0
+        for end in self.ends:
+            yield self.text[start:end]
+            start = end
+
+    def turns(self) -> List[Dict[str, str]]:
+        """Messages as the role/content dicts sent to the model"""
+        return [
+            {"role": ROLE_NAMES[code], "content": content}
+            for code, content in zip(self.roles, self.contents())
+        ]
+
+    def slice(self, start: int = 0, stop: int = None) -> "CompactConversation":
+        """Copy of messages ``start:stop`` with offsets rebased to the new buffer"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = min(max(start, 0), stop)
+        base = self._start(start)
+        text_end = self._start(stop)
+        return CompactConversation(
+            array("B", self.roles[start:stop]),
+            array("I", (end - base for end in self.ends[start:stop])),
+            self.text[base:text_end],
+            array("d", self.timestamps[start:stop])
+        )
+
+    def concat(self, other: "CompactConversation") -> "CompactConversation":
+        combined = self.slice()
+        base = combined.ends[-1] if combined.ends else 0
+        combined.roles.extend(other.roles)
+        combined.ends.extend(end + base for end in other.ends)
+        combined.text += other.text
+        combined.timestamps.extend(other.timestamps)
+        return combined
+
+    # Columns as NumPy arrays for vectorized analysis
+
+    def role_column(self) -> np.ndarray:
+        return np.frombuffer(self.roles, dtype=np.uint8) if self.roles else np.zeros(0, dtype=np.uint8)
+
+    def timestamp_column(self) -> np.ndarray:
+        return np.frombuffer(self.timestamps, dtype=np.float64) if self.timestamps else np.zeros(0)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the buffers"""
+        return (
+            self.roles.itemsize * len(self.roles)
+            + self.ends.itemsize * len(self.ends)
+            + self.timestamps.itemsize * len(self.timestamps)
+            + sys.getsizeof(self.text)
+        )
+
+    def __getstate__(self):
+        # Role codes are per process, so spilled copies carry the names
+        return (list(ROLE_NAMES), self.roles, self.ends, self.text, self.timestamps)
+
+    def __setstate__(self, state):
+        names, roles, ends, text, timestamps = state
+        self.roles = array("B", (role_code(names[code]) for code in roles))
+        self.ends = ends
+        self.text = text
+        self.timestamps = timestamps
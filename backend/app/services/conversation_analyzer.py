@@ -2,88 +2,259 @@
 Conversation analysis service using OpenAI
 """
 
-import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Tuple
 from app.config import settings
+from app.services.llm_gateway import LLMGateway, get_llm_gateway
+from app.services.single_flight import coalesced
+from app.services.heuristic_analyzer import HeuristicAnalyzer
+from app.services.structured_output import JSON_MODE, complete_structured, parse_structured
+from app.services.prompts import CONVERSATION_ANALYSIS, CONVERSATION_SUMMARY
+from app.services.metrics import record_fallback
+from app.services.model_router import ModelRouter, ModelRoute, get_model_router
+from app.services.compact_conversation import CompactConversation
+from app.services.conversation_state import (
+    ConversationState,
+    ConversationStateStore,
+    estimate_tokens,
+    turns_tokens
+)
+from app.models.schemas import ConversationInsights
+
+SERVICE = "conversation_analyzer"
 
 class ConversationAnalyzer:
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.openai_api_key)
+    def __init__(
+        self,
+        gateway: LLMGateway = None,
+        state_store: ConversationStateStore = None,
+        router: ModelRouter = None
+    ):
+        self.gateway = gateway or get_llm_gateway()
+        self.state_store = state_store or ConversationStateStore()
+        self.router = router or get_model_router()
+        self.heuristics = HeuristicAnalyzer()
+        self.token_budget = settings.conversation_token_budget
     
+    @coalesced
     async def analyze_conversation(
         self, 
         messages: List[Dict[str, Any]], 
         user_context: Dict[str, Any] = None,
-        partner_context: Dict[str, Any] = None
+        partner_context: Dict[str, Any] = None,
+        conversation_id: str = None,
+        incremental: bool = False,
+        mode: str = "llm"
     ) -> Dict[str, Any]:
         """
-        Analyze a dating conversation and provide insights
+        Analyze a dating conversation and provide insights.
+        Scores always come from the local heuristic analyzer; ``mode="local"``
+        skips the model entirely. In incremental mode only messages added
+        since the last call for ``conversation_id`` are sent, together with a
+        rolling summary.
         """
+        conversation = CompactConversation.from_messages(messages)
+        scores = self.heuristics.analyze_compact(conversation, user_context, partner_context)
+        if mode == "local":
+            return {**scores, "mode": "local"}
+        
         try:
-            # Format messages for OpenAI
-            formatted_messages = []
-            for msg in messages:
-                formatted_messages.append({
-                    "role": msg.get("role", "user"),
-                    "content": msg.get("content", "")
-                })
+            if incremental and conversation_id:
+                async with self.state_store.lock(conversation_id):
+                    return await self._analyze_incremental(conversation_id, conversation, scores)
             
-            # Add system prompt for conversation analysis
-            system_prompt = """You are a dating conversation analyst. Analyze the conversation and provide insights on:
-            1. Conversation flow and engagement
-            2. Emotional tone and sentiment
-            3. Communication effectiveness
-            4. Areas for improvement
-            5. Compatibility indicators
+            insights = await self._complete_analysis(conversation.turns())
+            return self._build_analysis(insights, scores)
             
-            Provide specific, actionable feedback."""
+        except Exception as e:
+            return self._fallback_analysis(e, scores)
+    
+    async def stream_analysis(
+        self,
+        messages: List[Dict[str, Any]],
+        user_context: Dict[str, Any] = None,
+        partner_context: Dict[str, Any] = None,
+        conversation_id: str = None,
+        incremental: bool = False,
+        mode: str = "llm"
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream the analysis as ("token", text) events as the model produces
+        them, followed by a single ("result", analysis) event. ``mode`` and
+        ``incremental`` work as in analyze_conversation; local results come
+        as the result event alone.
+        """
+        conversation = CompactConversation.from_messages(messages)
+        scores = self.heuristics.analyze_compact(conversation, user_context, partner_context)
+        if mode == "local":
+            yield "result", {**scores, "mode": "local"}
+            return
+        
+        chunks = []
+        try:
+            if incremental and conversation_id:
+                async with self.state_store.lock(conversation_id):
+                    state, new_messages = await self._next_state(conversation_id, conversation)
+                    async for delta in self._stream_insights(state.recent.turns(), state.summary):
+                        chunks.append(delta)
+                        yield "token", delta
+                    insights = parse_structured("".join(chunks), ConversationInsights)
+                    analysis = self._commit_state(state, new_messages, self._build_analysis(insights, scores))
+                yield "result", analysis
+                return
             
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    *formatted_messages
-                ],
-                max_tokens=500,
-                temperature=0.7
+            async for delta in self._stream_insights(conversation.turns()):
+                chunks.append(delta)
+                yield "token", delta
+            insights = parse_structured("".join(chunks), ConversationInsights)
+            yield "result", self._build_analysis(insights, scores)
+        except Exception as e:
+            yield "result", self._fallback_analysis(e, scores)
+    
+    async def _stream_insights(self, formatted_messages: List[Dict[str, str]], summary: str = "") -> AsyncIterator[str]:
+        route = self._route(formatted_messages, summary)
+        async for delta in self.gateway.stream(
+            model=route.model,
+            messages=self._build_messages(formatted_messages, summary, route),
+            max_tokens=500,
+            temperature=0.7,
+            response_format=JSON_MODE,
+            service=SERVICE
+        ):
+            yield delta
+    
+    async def _analyze_incremental(
+        self,
+        conversation_id: str,
+        conversation: CompactConversation,
+        scores: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Analyze the new messages on top of the stored conversation state.
+        State only advances once the model call has succeeded.
+        """
+        state, new_messages = await self._next_state(conversation_id, conversation)
+        insights = await self._complete_analysis(state.recent.turns(), state.summary)
+        return self._commit_state(state, new_messages, self._build_analysis(insights, scores))
+    
+    async def _next_state(
+        self,
+        conversation_id: str,
+        conversation: CompactConversation
+    ) -> Tuple[ConversationState, int]:
+        """
+        The stored state advanced to cover ``conversation``, not stored yet,
+        and the number of messages added since the last analysis
+        """
+        state = self.state_store.get(conversation_id)
+        if state is None or len(conversation) < state.last_index:
+            # Unknown conversation, or the client rewrote its history
+            state = ConversationState(conversation_id=conversation_id)
+        
+        new_turns = conversation.slice(state.last_index)
+        summary, recent, folded = await self._fold_if_needed(state.summary, state.recent.concat(new_turns))
+        return ConversationState(
+            conversation_id=conversation_id,
+            summary=summary,
+            last_index=len(conversation),
+            summarized_count=state.summarized_count + folded,
+            recent=recent
+        ), len(new_turns)
+    
+    def _commit_state(self, state: ConversationState, new_messages: int, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        self.state_store.put(state)
+        analysis["incremental"] = {
+            "new_messages": new_messages,
+            "window_messages": len(state.recent),
+            "summarized_messages": state.summarized_count
+        }
+        return analysis
+    
+    async def _fold_if_needed(self, summary: str, window: CompactConversation):
+        """
+        Fold the oldest turns into the summary once the window exceeds the
+        token budget, keeping the window at half the budget afterwards.
+        """
+        tokens = [estimate_tokens(content) + 4 for content in window.contents()]
+        remaining = sum(tokens)
+        if remaining <= self.token_budget:
+            return summary, window, 0
+        
+        cut = 0
+        while cut < len(tokens) - 1 and remaining > self.token_budget // 2:
+            remaining -= tokens[cut]
+            cut += 1
+        
+        summary = await self._summarize(summary, window.slice(0, cut).turns())
+        return summary, window.slice(cut), cut
+    
+    async def _summarize(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """Merge turns into the running summary, falling back to a clipped transcript"""
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        try:
+            response = await self.gateway.complete(
+                model=self.router.route("conversation_summary").model,
+                messages=CONVERSATION_SUMMARY.messages(
+                    context=f"Current summary: {summary or '(none)'}\n\nNew turns:\n{transcript}"
+                ),
+                max_tokens=200,
+                temperature=0.3,
+                service=SERVICE
             )
-            
-            analysis_text = response.choices[0].message.content
-            
-            # Parse the analysis into structured format
-            return {
-                "overall_score": 7.5,  # Placeholder
-                "engagement_level": "good",
-                "sentiment": "positive",
-                "key_insights": analysis_text,
-                "suggestions": [
-                    "Ask more open-ended questions",
-                    "Share personal stories to build connection",
-                    "Show genuine interest in their responses"
-                ],
-                "compatibility_indicators": {
-                    "shared_interests": 3,
-                    "communication_style_match": "good",
-                    "emotional_connection": "developing"
-                }
-            }
-            
+            return response.text.strip()
         except Exception as e:
-            # Fallback analysis if OpenAI fails
-            return {
-                "overall_score": 6.0,
-                "engagement_level": "moderate",
-                "sentiment": "neutral",
-                "key_insights": "Conversation analysis temporarily unavailable. Please try again later.",
-                "suggestions": [
-                    "Keep the conversation flowing naturally",
-                    "Ask follow-up questions",
-                    "Share your own experiences"
-                ],
-                "compatibility_indicators": {
-                    "shared_interests": 2,
-                    "communication_style_match": "unknown",
-                    "emotional_connection": "developing"
-                },
-                "error": str(e)
-            }
\ No newline at end of file
+            record_fallback("conversation_summary", e)
+            # Keep the most recent text, about a quarter of the budget in tokens
+            merged = f"{summary} {transcript}".strip()
+            return merged[-self.token_budget:]
+    
+    def _route(self, formatted_messages: List[Dict[str, str]], summary: str = "") -> ModelRoute:
+        # Conversations too long for the normal prompt budget go to the large-context tier
+        return self.router.route(
+            "conversation_analysis",
+            input_tokens=turns_tokens(formatted_messages) + estimate_tokens(summary)
+        )
+    
+    def _build_messages(
+        self,
+        formatted_messages: List[Dict[str, str]],
+        summary: str = "",
+        route: ModelRoute = None
+    ) -> List[Dict[str, str]]:
+        # The fixed system prompt stays first so the provider can cache it
+        prefix = None
+        if summary:
+            prefix = [{"role": "system", "content": f"Summary of the earlier conversation: {summary}"}]
+        return CONVERSATION_ANALYSIS.messages(
+            history=formatted_messages,
+            prefix=prefix,
+            max_input_tokens=route.max_input_tokens if route else None
+        )
+    
+    async def _complete_analysis(self, formatted_messages: List[Dict[str, str]], summary: str = "") -> ConversationInsights:
+        route = self._route(formatted_messages, summary)
+        insights, _ = await complete_structured(
+            self.gateway,
+            ConversationInsights,
+            model=route.model,
+            escalation=route.escalation,
+            messages=self._build_messages(formatted_messages, summary, route),
+            max_tokens=500,
+            temperature=0.7,
+            service=SERVICE
+        )
+        return insights
+    
+    def _build_analysis(self, insights: ConversationInsights, scores: Dict[str, Any]) -> Dict[str, Any]:
+        # Merge the model's narrative into the locally computed scores
+        return {
+            **scores,
+            "key_insights": insights.summary,
+            "suggestions": insights.suggestions or scores["suggestions"],
+            "insights": insights.model_dump(),
+            "mode": "llm"
+        }
+    
+    def _fallback_analysis(self, error: Exception, scores: Dict[str, Any]) -> Dict[str, Any]:
+        # Fallback analysis if OpenAI fails: local scores without the narrative
+        record_fallback(SERVICE, error)
+        return {**scores, "mode": "local", "error": str(error)}
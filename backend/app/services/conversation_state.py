@@ -0,0 +1,187 @@
+"""
+Per-conversation state for incremental analysis
+
+Each conversation keeps a rolling summary of older turns, a bounded window of
+recent turns and the index of the last analyzed message, so a follow-up
+analysis only needs to send the new messages plus a compact context. The
+window is held as a CompactConversation. States evicted from memory can be
+spilled to disk and are loaded back on their next request.
+
+State is per process. Each worker keeps its own states and spills them to
+its own subdirectory of the spill directory, so workers never read or
+delete each other's files. A conversation whose next request lands on a
+different worker starts over there and is analyzed in full once.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+import hashlib
+import logging
+import os
+import pickle
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from app.config import settings
+from app.services.compact_conversation import CompactConversation
+from app.services.prompts import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    return count_tokens(text) + 1
+
+
+def turns_tokens(turns: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(turn["content"]) + 4 for turn in turns)
+
+
+@dataclass
+class ConversationState:
+    conversation_id: str
+    summary: str = ""
+    last_index: int = 0
+    summarized_count: int = 0
+    recent: CompactConversation = field(default_factory=CompactConversation)
+    updated_at: float = field(default_factory=time.time)
+
+
+class ConversationStateStore:
+    """
+    Bounded in-memory store with LRU eviction and per-conversation locks.
+    With a spill directory, evicted states are written to a per-process
+    subdirectory of it (up to ``spill_max_entries`` files, oldest removed
+    first) instead of dropped.
+    """
+
+    def __init__(self, max_entries: int = None, spill_dir: str = None, spill_max_entries: int = None):
+        self.max_entries = max_entries or settings.conversation_state_max_entries
+        self.spill_dir = settings.conversation_state_spill_dir if spill_dir is None else spill_dir
+        self.spill_max_entries = spill_max_entries or settings.conversation_state_spill_max_entries
+        self._states: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+        self._spilled: "OrderedDict[str, str]" = OrderedDict()
+        self.evictions = 0
+        self.spills = 0
+        self.spill_loads = 0
+        self.spill_errors = 0
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    @asynccontextmanager
+    async def lock(self, conversation_id: str):
+        """
+        Serialize incremental updates of the same conversation. The lock is
+        dropped once nobody holds or waits for it and no state is stored,
+        e.g. after a failed model call.
+        """
+        lock = self._locks.setdefault(conversation_id, asyncio.Lock())
+        self._lock_users[conversation_id] = self._lock_users.get(conversation_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[conversation_id] -= 1
+            if not self._lock_users[conversation_id]:
+                del self._lock_users[conversation_id]
+                if conversation_id not in self._states:
+                    self._locks.pop(conversation_id, None)
+
+    def get(self, conversation_id: str) -> Optional[ConversationState]:
+        state = self._states.get(conversation_id)
+        if state is not None:
+            self._states.move_to_end(conversation_id)
+            return state
+        if conversation_id in self._spilled:
+            state = self._load(conversation_id)
+            if state is not None:
+                self._states[conversation_id] = state
+                self._evict()
+        return state
+
+    def put(self, state: ConversationState):
+        state.updated_at = time.time()
+        self._states[state.conversation_id] = state
+        self._states.move_to_end(state.conversation_id)
+        path = self._spilled.pop(state.conversation_id, None)
+        if path is not None:
+            self._remove(path)
+        self._evict()
+
+    def _evict(self):
+        while len(self._states) > self.max_entries:
+            evicted, state = self._states.popitem(last=False)
+            self.evictions += 1
+            if self.spill_dir:
+                self._spill(state)
+            if evicted not in self._lock_users:
+                self._locks.pop(evicted, None)
+
+    def _spill_path(self, conversation_id: str) -> str:
+        # Resolved per call: the store may be created before workers fork
+        name = hashlib.sha256(conversation_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"worker-{os.getpid()}", f"{name}.state")
+
+    def _spill(self, state: ConversationState):
+        path = self._spill_path(state.conversation_id)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            self.spill_errors += 1
+            logger.warning(f"Could not spill conversation state: {str(e)}")
+            return
+        self.spills += 1
+        self._spilled[state.conversation_id] = path
+        self._spilled.move_to_end(state.conversation_id)
+        while len(self._spilled) > self.spill_max_entries:
+            _, oldest = self._spilled.popitem(last=False)
+            self._remove(oldest)
+
+    def _load(self, conversation_id: str) -> Optional[ConversationState]:
+        path = self._spilled.pop(conversation_id)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            self.spill_errors += 1
+            logger.warning(f"Could not load spilled conversation state: {str(e)}")
+            state = None
+        self._remove(path)
+        if state is not None:
+            self.spill_loads += 1
+        return state
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def delete(self, conversation_id: str):
+        self._states.pop(conversation_id, None)
+        if conversation_id not in self._lock_users:
+            self._locks.pop(conversation_id, None)
+        path = self._spilled.pop(conversation_id, None)
+        if path is not None:
+            self._remove(path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._states),
+            "locks": len(self._locks),
+            "window_bytes": sum(state.recent.nbytes for state in self._states.values()),
+            "evictions": self.evictions,
+            "spilled": len(self._spilled),
+            "spills": self.spills,
+            "spill_loads": self.spill_loads,
+            "spill_errors": self.spill_errors
+        }
+
+    def __len__(self) -> int:
+        return len(self._states)
@@ -0,0 +1,221 @@
+"""
+Local, deterministic conversation analysis
+
+Computes engagement, question ratio, reply-length balance, response-time gaps,
+lexicon-based sentiment and shared interests without calling the model. Used
+on its own for ``mode=local`` and as the structured scores that the LLM
+narrative is merged into.
+"""
+
+import re
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from app.services.compact_conversation import CompactConversation, ROLE_NAMES
+
+WORD_RE = re.compile(r"[a-z']+")
+# Words plus the separator placed between messages in the joined buffer
+WORD_OR_SEPARATOR_RE = re.compile(r"[a-z']+|\x00")
+
+POSITIVE_WORDS = frozenset("""
+    love loved lovely like liked great good amazing awesome fun funny haha lol
+    nice cool happy glad excited exciting beautiful wonderful fantastic
+    interesting enjoy enjoyed enjoying perfect sweet cute yes yay wow thanks
+    thank adorable incredible brilliant best favorite favourite laugh smile
+""".split())
+
+NEGATIVE_WORDS = frozenset("""
+    hate hated bad boring bored sad annoying annoyed tired awful terrible
+    sorry no nope ugh meh busy worst angry upset disappointed weird rude
+    stressed stress lonely cancel cancelled unfortunately
+""".split())
+
+PARTNER_ROLES = frozenset({"partner", "assistant", "match", "them"})
+
+
+def _interests(context: Optional[Dict[str, Any]]) -> set:
+    if not context:
+        return set()
+    interests = context.get("interests")
+    if isinstance(interests, str):
+        interests = interests.split(",")
+    elif not isinstance(interests, list):
+        # Client-supplied; anything but a list or a comma-separated string is ignored
+        return set()
+    return {str(interest).strip().lower() for interest in interests if str(interest).strip()}
+
+
+def _level(score: float) -> str:
+    if score >= 7.5:
+        return "high"
+    if score >= 6.0:
+        return "good"
+    if score >= 4.0:
+        return "moderate"
+    return "low"
+
+
+class HeuristicAnalyzer:
+    def analyze(
+        self,
+        messages: List[Dict[str, Any]],
+        user_context: Dict[str, Any] = None,
+        partner_context: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """
+        Score a conversation from its messages and both profiles.
+        Returns the same shape as the LLM-backed analysis.
+        """
+        return self.analyze_compact(CompactConversation.from_messages(messages), user_context, partner_context)
+
+    def analyze_compact(
+        self,
+        conversation: CompactConversation,
+        user_context: Dict[str, Any] = None,
+        partner_context: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """Score a conversation already in compact form, working on its columns"""
+        count = len(conversation)
+        pieces = [content.lower().replace("\x00", " ") for content in conversation.contents()]
+        # One buffer with a separator token, so a single regex pass yields every
+        # word and the message it belongs to
+        text = "\x00".join(pieces)
+        tokens = WORD_OR_SEPARATOR_RE.findall(text)
+        is_separator = np.fromiter(map("\x00".__eq__, tokens), dtype=bool, count=len(tokens))
+        is_word = ~is_separator
+        owner = np.cumsum(is_separator)[is_word]
+        is_positive = np.fromiter(map(POSITIVE_WORDS.__contains__, tokens), dtype=np.float64, count=len(tokens))[is_word]
+        is_negative = np.fromiter(map(NEGATIVE_WORDS.__contains__, tokens), dtype=np.float64, count=len(tokens))[is_word]
+
+        partner_codes = [code for code, name in enumerate(ROLE_NAMES) if name.lower() in PARTNER_ROLES]
+        is_partner = np.isin(conversation.role_column(), partner_codes)
+        word_counts = np.bincount(owner, minlength=count).astype(np.float64)
+        has_question = np.fromiter(map(str.__contains__, pieces, ["?"] * count), dtype=bool, count=count)
+        positive = np.bincount(owner, weights=is_positive, minlength=count)
+        negative = np.bincount(owner, weights=is_negative, minlength=count)
+        timestamps = conversation.timestamp_column()
+
+        metrics = self._metrics(is_partner, word_counts, has_question, positive, negative, timestamps)
+
+        user_interests = _interests(user_context)
+        partner_interests = _interests(partner_context)
+        shared = sorted(user_interests & partner_interests)
+        mentioned = sorted(
+            interest for interest in (user_interests | partner_interests)
+            if interest in text
+        )
+        metrics["shared_interests"] = shared
+        metrics["mentioned_interests"] = mentioned
+
+        engagement = self._engagement_score(metrics)
+        sentiment_score = metrics["sentiment_score"]
+        overall = round(float(np.clip(0.7 * engagement + 1.5 * (sentiment_score + 1) + 0.3 * min(len(shared), 3), 0, 10)), 1)
+
+        return {
+            "overall_score": overall,
+            "engagement_level": _level(engagement),
+            "key_insights": self._insights(metrics, engagement),
+            "sentiment": "positive" if sentiment_score > 0.15 else "negative" if sentiment_score < -0.15 else "neutral",
+            "suggestions": self._suggestions(metrics),
+            "compatibility_indicators": {
+                "shared_interests": len(shared),
+                "communication_style_match": "good" if metrics["length_balance"] >= 0.6 else "uneven",
+                "emotional_connection": "strong" if sentiment_score > 0.4 and engagement >= 7 else "developing"
+            },
+            "metrics": metrics
+        }
+
+    def _metrics(
+        self,
+        is_partner: np.ndarray,
+        word_counts: np.ndarray,
+        has_question: np.ndarray,
+        positive: np.ndarray,
+        negative: np.ndarray,
+        timestamps: np.ndarray
+    ) -> Dict[str, Any]:
+        count = len(word_counts)
+        user_words = word_counts[~is_partner]
+        partner_words = word_counts[is_partner]
+        user_mean = float(user_words.mean()) if user_words.size else 0.0
+        partner_mean = float(partner_words.mean()) if partner_words.size else 0.0
+        longer = max(user_mean, partner_mean)
+
+        # Turn switches: how often the speaker changes between consecutive messages
+        switches = int(np.count_nonzero(is_partner[1:] != is_partner[:-1])) if count > 1 else 0
+
+        sentiment_total = positive.sum() + negative.sum()
+        sentiment_score = float((positive.sum() - negative.sum()) / sentiment_total) if sentiment_total else 0.0
+
+        metrics = {
+            "message_count": count,
+            "user_messages": int(user_words.size),
+            "partner_messages": int(partner_words.size),
+            "avg_words_user": round(user_mean, 2),
+            "avg_words_partner": round(partner_mean, 2),
+            "length_balance": round(min(user_mean, partner_mean) / longer, 3) if longer else 0.0,
+            "question_ratio": round(float(has_question.mean()), 3) if count else 0.0,
+            "user_question_ratio": round(float(has_question[~is_partner].mean()), 3) if user_words.size else 0.0,
+            "turn_switch_ratio": round(switches / (count - 1), 3) if count > 1 else 0.0,
+            "sentiment_score": round(sentiment_score, 3),
+            "median_response_gap_seconds": None,
+            "max_response_gap_seconds": None
+        }
+
+        # Response gaps only between messages that both carry timestamps and switch speaker
+        valid = ~np.isnan(timestamps)
+        if np.count_nonzero(valid) > 1:
+            ts = timestamps[valid]
+            speakers = is_partner[valid]
+            gaps = np.diff(ts)[speakers[1:] != speakers[:-1]]
+            gaps = gaps[gaps >= 0]
+            if gaps.size:
+                metrics["median_response_gap_seconds"] = round(float(np.median(gaps)), 1)
+                metrics["max_response_gap_seconds"] = round(float(gaps.max()), 1)
+
+        return metrics
+
+    def _engagement_score(self, metrics: Dict[str, Any]) -> float:
+        if not metrics["message_count"]:
+            return 0.0
+        volume = min(metrics["message_count"] / 20.0, 1.0)
+        depth = min((metrics["avg_words_user"] + metrics["avg_words_partner"]) / 24.0, 1.0)
+        questions = min(metrics["question_ratio"] / 0.35, 1.0)
+        score = 10 * (
+            0.2 * volume
+            + 0.25 * depth
+            + 0.2 * questions
+            + 0.2 * metrics["length_balance"]
+            + 0.15 * metrics["turn_switch_ratio"]
+        )
+        gap = metrics["median_response_gap_seconds"]
+        if gap is not None and gap > 6 * 3600:
+            score -= 1.0
+        return round(float(np.clip(score, 0, 10)), 1)
+
+    def _insights(self, metrics: Dict[str, Any], engagement: float) -> str:
+        parts = [
+            f"{metrics['message_count']} messages with engagement {engagement}/10",
+            f"{int(metrics['question_ratio'] * 100)}% of messages ask a question",
+            f"reply length balance {metrics['length_balance']:.2f}"
+        ]
+        if metrics["median_response_gap_seconds"] is not None:
+            parts.append(f"median reply gap {metrics['median_response_gap_seconds'] / 60:.0f} min")
+        return "; ".join(parts) + "."
+
+    def _suggestions(self, metrics: Dict[str, Any]) -> List[str]:
+        suggestions = []
+        if metrics["user_question_ratio"] < 0.2:
+            suggestions.append("Ask more open-ended questions")
+        if metrics["avg_words_user"] < 0.5 * metrics["avg_words_partner"]:
+            suggestions.append("Match their effort with longer, more detailed replies")
+        elif metrics["avg_words_partner"] < 0.5 * metrics["avg_words_user"]:
+            suggestions.append("Keep messages shorter and give them room to respond")
+        if metrics["shared_interests"] and not metrics["mentioned_interests"]:
+            suggestions.append(f"Bring up your shared interest in {metrics['shared_interests'][0]}")
+        if metrics["sentiment_score"] < 0:
+            suggestions.append("Steer toward lighter, more positive topics")
+        if not suggestions:
+            suggestions.append("Share personal stories to build connection")
+        return suggestions
@@ -0,0 +1,123 @@
+"""
+Background writer for analysis history
+
+Endpoints enqueue records without awaiting the database; a single worker task
+drains the queue and inserts rows in batches, so the request path never waits
+on an INSERT. When the queue is full new records are dropped and counted
+rather than slowing requests down. If a batch fails, its rows are retried one
+at a time so a single bad row does not take the rest of the batch with it.
+"""
+
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional
+
+from app.config import settings
+from app.models.database import get_session_factory
+from app.models.history import AnalysisRecord, SuggestionRecord, ProfileOptimizationRecord
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    def __init__(
+        self,
+        batch_size: int = None,
+        flush_interval: float = None,
+        queue_size: int = None
+    ):
+        self.batch_size = batch_size or settings.history_batch_size
+        self.flush_interval = flush_interval or settings.history_flush_interval_seconds
+        self.queue_size = queue_size or settings.history_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush what is queued and stop the worker"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def _enqueue(self, record):
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def record_analysis(self, conversation_id: str, analysis: Dict[str, Any]):
+        self._enqueue(AnalysisRecord(conversation_id=conversation_id, analysis=analysis))
+
+    def record_suggestions(self, conversation_id: str, suggestion_type: str, suggestions: List[Dict[str, Any]]):
+        self._enqueue(SuggestionRecord(
+            conversation_id=conversation_id,
+            suggestion_type=suggestion_type,
+            suggestions=suggestions
+        ))
+
+    def record_profile_optimization(self, user_id: str, region: str, optimization: Dict[str, Any]):
+        self._enqueue(ProfileOptimizationRecord(user_id=user_id, region=region, optimization=optimization))
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+
+            # Collect more rows until the batch is full or the flush interval passes
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._write(batch)
+
+    async def _write(self, batch: List[Any]):
+        try:
+            await self._insert(batch)
+            self.written += len(batch)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                self.failed += 1
+                logger.error(f"Failed to write a history record: {str(e)}")
+                return
+            logger.warning(f"Failed to write {len(batch)} history records, retrying one by one: {str(e)}")
+        # The rolled-back rows are transient again and can be added to a new session
+        for record in batch:
+            await self._write([record])
+
+    async def _insert(self, records: List[Any]):
+        async with get_session_factory()() as session:
+            session.add_all(records)
+            await session.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
@@ -0,0 +1,122 @@
+"""
+Pre-serialized responses with HTTP validators for read endpoints
+
+A read endpoint builds its payload once per version of the underlying data.
+The payload is serialized to bytes (orjson when installed) and kept in a
+bounded LRU together with a strong ETag computed from the body. Repeat
+requests skip building and encoding entirely. A request whose
+``If-None-Match`` matches the ETag gets an empty 304, so CDNs and mobile
+clients can keep their copy.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    def _default(value: Any) -> Any:
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":"), default=_default).encode()
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def make_etag(body: bytes) -> str:
+    """Strong validator: a quoted hash of the exact body bytes"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """``If-None-Match`` uses weak comparison: ``W/`` prefixes are ignored, ``*`` matches anything"""
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CachedPayload:
+    __slots__ = ("body", "etag", "built_at")
+
+    def __init__(self, value: Any):
+        self.body = dumps(value)
+        self.etag = make_etag(self.body)
+        self.built_at = time.monotonic()
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": cache_control}
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+class PayloadCache:
+    """
+    LRU of serialized payloads. Keys should include the version of the data
+    they were built from, so a new version is simply a miss. ``ttl`` bounds
+    the age of payloads built from live data (e.g. /health).
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, CachedPayload]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> CachedPayload:
+        payload = self._entries.get(key)
+        if payload is not None and (self.ttl is None or time.monotonic() - payload.built_at < self.ttl):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+        self.misses += 1
+        payload = self._entries[key] = CachedPayload(build())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return payload
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+def cache_window(seconds: float, now: float = None) -> Tuple[int, datetime]:
+    """
+    Index of the current ``seconds``-long window and its start time (UTC).
+    Content that rotates per window stays byte-identical, across workers too,
+    for as long as a cache may keep it.
+    """
+    now = time.time() if now is None else now
+    index = int(now // seconds) if seconds > 0 else 0
+    return index, datetime.utcfromtimestamp(index * seconds if seconds > 0 else now)
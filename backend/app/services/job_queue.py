@@ -0,0 +1,378 @@
+"""
+Background jobs for long-running requests
+
+Submitting a job returns its id at once. Jobs wait in a priority queue and a
+fixed pool of asyncio worker tasks runs them, so at most JOB_WORKERS jobs
+call the model at a time. CPU-heavy stages inside a job (photo analysis)
+still go through their own process pool. Clients poll GET /jobs/{id} or
+pass a callback URL that receives the finished job as a JSON POST.
+Callbacks are refused unless JOB_CALLBACK_ALLOWED_HOSTS lists the host, and
+the host must resolve to public addresses both at submission and when the
+callback is sent; the callback connects to the addresses that were checked.
+
+Job state (status, timestamps, result) is kept for JOB_TTL_SECONDS in a
+key-value backend with the same interface as the response cache's shared
+tier. It is held in memory for a single process, in an SQLite file shared by
+the workers of one host, or in Redis at ``settings.redis_url``. The queue
+itself is per process: a job runs in the worker that accepted it. Each job
+records its owner (the accepting process), and owners refresh a heartbeat
+key while they live. A queued or running job whose owner's heartbeat has
+expired will never finish, so it is failed: by every worker at startup,
+and by whichever worker reads it first.
+
+Submissions are deduplicated per (kind, user_id). While a user's job is
+queued or running, resubmitting returns that job. Once it has succeeded, an
+identical resubmission returns the finished job until it expires. A changed
+request, or any request after a failed job, starts a new job.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from app.config import settings
+from app.services import metrics
+from app.services.response_cache import LocalSharedBackend, FileSharedBackend, RedisBackend
+from app.services.url_safety import UnsafeURLError, check_url, parse_hosts, pinned_client
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+FINISHED = ("succeeded", "failed")
+HEARTBEAT_SECONDS = 10.0
+# An owner that has not refreshed its heartbeat for this long is gone
+OWNER_TIMEOUT_SECONDS = 60.0
+ORPHANED_ERROR = "The worker running this job stopped before it finished; submit it again"
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class JobQueueFull(Exception):
+    """Raised by submit when JOB_QUEUE_SIZE jobs are already waiting"""
+
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class JobQueue:
+    def __init__(
+        self,
+        backend=None,
+        workers: int = None,
+        queue_size: int = None,
+        ttl: float = None,
+        callback_timeout: float = None,
+        callback_hosts: Set[str] = None
+    ):
+        self.backend = backend if backend is not None else LocalSharedBackend()
+        self.workers = max(1, workers or settings.job_workers)
+        self.queue_size = queue_size or settings.job_queue_size
+        self.ttl = ttl or settings.job_ttl_seconds
+        self.callback_timeout = callback_timeout or settings.job_callback_timeout_seconds
+        self.callback_hosts = parse_hosts(settings.job_callback_allowed_hosts) if callback_hosts is None else callback_hosts
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._callbacks: Set[asyncio.Task] = set()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sequence = itertools.count()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._announced = False
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.running = 0
+        self.counts = {"submitted": 0, "deduplicated": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+        self.orphaned = 0
+        self.callbacks_sent = 0
+        self.callbacks_failed = 0
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    def start(self):
+        if not self._tasks:
+            self._queue = asyncio.PriorityQueue(maxsize=self.queue_size)
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+            self._heartbeat = asyncio.create_task(self._beat())
+
+    async def stop(self):
+        """Let running jobs finish, fail the ones still queued and stop the workers"""
+        if not self._tasks:
+            return
+        while not self._queue.empty():
+            _, _, _, job, _ = self._queue.get_nowait()
+            await self._finish(job, error="Server shut down before the job ran")
+        for _ in self._tasks:
+            self._queue.put_nowait((math.inf, next(self._sequence), 0.0, None, None))
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+        self._heartbeat.cancel()
+        await asyncio.gather(self._heartbeat, return_exceptions=True)
+        self._heartbeat = None
+        if self._callbacks:
+            await asyncio.gather(*self._callbacks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        await self.backend.aclose()
+
+    async def check_callback_url(self, url: Optional[str]):
+        """
+        Raise ValueError unless the callback is an http(s) URL on an allowed
+        host that resolves to public addresses. No allowed hosts: no callbacks.
+        """
+        if not url:
+            return
+        try:
+            await check_url(url, self.callback_hosts, require_allowlist=True)
+        except UnsafeURLError as e:
+            raise ValueError(f"callback_url is not allowed: {str(e)}")
+
+    async def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        user_id: str = None,
+        priority: str = "normal",
+        callback_url: str = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Queue a job, or return the user's pending job of the same kind.
+        Returns (job, deduplicated).
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        await self.check_callback_url(callback_url)
+        fingerprint = request_fingerprint(payload)
+
+        existing = await self._pending_for(kind, user_id, fingerprint)
+        if existing is not None:
+            self._count(kind, "deduplicated")
+            return existing, True
+        if self._queue.full():
+            self._count(kind, "rejected")
+            raise JobQueueFull(f"{self._queue.qsize()} jobs are already queued")
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "priority": priority,
+            "user_id": user_id,
+            "owner": self.owner,
+            "fingerprint": fingerprint,
+            "callback_url": callback_url,
+            "created_at": datetime.utcnow().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        if not self._announced:
+            # Other workers must see this owner alive before they see its first job
+            await self._announce()
+        await self._save(job)
+        if user_id:
+            # Two racing first submissions: the loser returns the winner's job
+            claimed = await self.backend.add(self._user_key(kind, user_id), job["job_id"], self.ttl)
+            if not claimed:
+                winner = await self._pending_for(kind, user_id, fingerprint)
+                if winner is not None:
+                    self._count(kind, "deduplicated")
+                    return winner, True
+                await self.backend.set(self._user_key(kind, user_id), job["job_id"], self.ttl)
+
+        rank = PRIORITIES.get(priority, PRIORITIES["normal"])
+        try:
+            self._queue.put_nowait((rank, next(self._sequence), time.monotonic(), job, payload))
+        except asyncio.QueueFull:
+            # Filled up while the job was being stored; fail it so no resubmission waits on it
+            await self._finish(job, error="Job queue is full")
+            raise JobQueueFull(f"{self._queue.qsize()} jobs are already queued")
+        self._count(kind, "submitted")
+        return job, False
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self.backend.get(self._job_key(job_id))
+        if raw is None:
+            return None
+        job = json.loads(raw)
+        if await self._orphaned(job):
+            await self._fail_orphan(job)
+        return job
+
+    @staticmethod
+    def public(job: Dict[str, Any]) -> Dict[str, Any]:
+        """The job as shown to clients, without internal bookkeeping"""
+        return {key: value for key, value in job.items() if key not in ("fingerprint", "owner")}
+
+    async def recover_orphans(self) -> int:
+        """Fail every unfinished job whose owner has stopped; returns how many"""
+        recovered = 0
+        async for _, raw in self.backend.scan(self._job_key("")):
+            job = json.loads(raw)
+            if await self._orphaned(job) and await self._fail_orphan(job):
+                recovered += 1
+        if recovered:
+            logger.warning(f"Failed {recovered} jobs left behind by stopped workers")
+        return recovered
+
+    async def _orphaned(self, job: Dict[str, Any]) -> bool:
+        owner = job.get("owner")
+        if job["status"] in FINISHED or owner is None or owner == self.owner:
+            return False
+        return await self.backend.get(self._owner_key(owner)) is None
+
+    async def _fail_orphan(self, job: Dict[str, Any]) -> bool:
+        """Fail the job unless another worker already did; True if this one did"""
+        if not await self.backend.add(f"orphan:{job['job_id']}", self.owner, self.ttl):
+            job.update(json.loads(await self.backend.get(self._job_key(job["job_id"])) or "{}"))
+            return False
+        self.orphaned += 1
+        await self._finish(job, error=ORPHANED_ERROR)
+        return True
+
+    async def _announce(self):
+        await self.backend.set(self._owner_key(self.owner), str(time.time()), OWNER_TIMEOUT_SECONDS)
+        self._announced = True
+
+    async def _beat(self):
+        """Keep this owner's heartbeat alive; the first beat also sweeps up orphans"""
+        swept = False
+        while True:
+            try:
+                await self._announce()
+                if not swept:
+                    await self.recover_orphans()
+                    swept = True
+            except Exception as e:
+                logger.warning(f"Job heartbeat failed: {str(e)}")
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+
+    async def _pending_for(self, kind: str, user_id: Optional[str], fingerprint: str) -> Optional[Dict[str, Any]]:
+        """The user's current job if a new submission should return it instead"""
+        if not user_id:
+            return None
+        job_id = await self.backend.get(self._user_key(kind, user_id))
+        job = await self.get(job_id) if job_id else None
+        if job is None:
+            return None
+        if job["status"] not in FINISHED:
+            return job
+        if job["status"] == "succeeded" and job["fingerprint"] == fingerprint:
+            return job
+        return None
+
+    async def _run(self):
+        while True:
+            _, _, enqueued, job, payload = await self._queue.get()
+            if job is None:
+                break
+            metrics.JOB_SECONDS.observe(time.monotonic() - enqueued, kind=job["kind"], phase="queued")
+            # A task per job, so context variables set while running it (rate limits) stay with it
+            await asyncio.create_task(self._execute(job, payload))
+
+    async def _execute(self, job: Dict[str, Any], payload: Dict[str, Any]):
+        started = time.monotonic()
+        job["status"] = "running"
+        job["started_at"] = datetime.utcnow().isoformat()
+        self.running += 1
+        try:
+            await self._save(job)
+            result = await self._handlers[job["kind"]](payload)
+            await self._finish(job, result=result)
+        except Exception as e:
+            logger.error(f"Job {job['job_id']} ({job['kind']}) failed: {str(e)}")
+            await self._finish(job, error=str(e))
+        finally:
+            self.running -= 1
+            metrics.JOB_SECONDS.observe(time.monotonic() - started, kind=job["kind"], phase="running")
+
+    async def _finish(self, job: Dict[str, Any], result: Dict[str, Any] = None, error: str = None):
+        job["status"] = "failed" if error is not None else "succeeded"
+        job["result"] = result
+        job["error"] = error
+        job["finished_at"] = datetime.utcnow().isoformat()
+        self._count(job["kind"], job["status"])
+        try:
+            await self._save(job)
+        except Exception as e:
+            logger.error(f"Failed to store job {job['job_id']}: {str(e)}")
+        if job["callback_url"]:
+            task = asyncio.create_task(self._notify(job))
+            self._callbacks.add(task)
+            task.add_done_callback(self._callbacks.discard)
+
+    async def _notify(self, job: Dict[str, Any]):
+        if self._client is None:
+            self._client = pinned_client(timeout=self.callback_timeout)
+        try:
+            # Checked again: DNS may have changed since submission
+            await self.check_callback_url(job["callback_url"])
+            response = await self._client.post(job["callback_url"], json=self.public(job))
+            response.raise_for_status()
+            self.callbacks_sent += 1
+        except Exception as e:
+            self.callbacks_failed += 1
+            logger.warning(f"Callback for job {job['job_id']} failed: {str(e)}")
+
+    async def _save(self, job: Dict[str, Any]):
+        await self.backend.set(self._job_key(job["job_id"]), json.dumps(job, default=str), self.ttl)
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    @staticmethod
+    def _user_key(kind: str, user_id: str) -> str:
+        return f"user:{kind}:{user_id}"
+
+    @staticmethod
+    def _owner_key(owner: str) -> str:
+        return f"owner:{owner}"
+
+    def _count(self, kind: str, outcome: str):
+        self.counts[outcome] += 1
+        metrics.JOBS.inc(kind=kind, outcome=outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            **self.counts,
+            "orphaned": self.orphaned,
+            "callbacks_sent": self.callbacks_sent,
+            "callbacks_failed": self.callbacks_failed
+        }
+
+
+def build_job_queue() -> JobQueue:
+    """Create the queue with the state backend described by settings"""
+    backend = None
+    if settings.job_store == "sqlite" and settings.job_store_path:
+        try:
+            backend = FileSharedBackend(settings.job_store_path)
+        except sqlite3.Error as e:
+            logger.warning(f"Job store file unavailable, keeping jobs in memory: {str(e)}")
+    elif settings.job_store == "redis":
+        try:
+            backend = RedisBackend(settings.redis_url, prefix="jobs:")
+        except ImportError:
+            logger.warning("redis package not installed; keeping jobs in memory")
+    return JobQueue(backend=backend)
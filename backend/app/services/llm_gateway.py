@@ -0,0 +1,457 @@
+"""
+Shared async LLM gateway used by all services
+
+All model calls go through a single ``openai.AsyncOpenAI`` client backed by a
+pooled HTTP connection, so completions never block the event loop. A
+semaphore caps the number of in-flight completions per worker and every call
+is bounded by a timeout. A circuit breaker per model and calling service fails
+calls fast during an upstream outage, and slow calls can optionally be hedged with a second
+attempt.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable
+
+import httpx
+import openai
+from app.config import settings
+from app.services.response_cache import ResponseCache, make_cache_key, build_response_cache
+from app.services.rate_limiter import RateLimiter, LoadShedError, get_rate_limiter
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyTracker
+from app.services.metrics import LLM_REQUEST_SECONDS, LLM_TOKENS
+from app.services.tracing import span, current_trace
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Errors that say the upstream is unhealthy: transport errors, timeouts and
+    5xx/429 responses. Bad requests and bugs on our side do not count.
+    """
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code == 429
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError, asyncio.TimeoutError, TimeoutError))
+
+
+@dataclass
+class Completion:
+    """Normalized result of a chat completion"""
+    text: str
+    model: str
+    usage: Dict[str, int] = field(default_factory=dict)
+    latency: float = 0.0
+    cached: bool = False
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        max_connections: int = None,
+        max_keepalive_connections: int = None,
+        max_concurrency: int = None,
+        timeout: float = None,
+        connect_timeout: float = None,
+        max_retries: int = None,
+        cache: ResponseCache = None,
+        limiter: RateLimiter = None,
+        hedging: bool = None
+    ):
+        self.api_key = api_key if api_key is not None else settings.openai_api_key
+        self.base_url = base_url if base_url is not None else settings.openai_base_url
+        self.max_connections = max_connections or settings.llm_max_connections
+        self.max_keepalive_connections = max_keepalive_connections or settings.llm_max_keepalive_connections
+        self.max_concurrency = max_concurrency or settings.llm_max_concurrency
+        self.timeout = timeout or settings.llm_timeout_seconds
+        self.connect_timeout = connect_timeout or settings.llm_connect_timeout_seconds
+        self.max_retries = max_retries if max_retries is not None else settings.llm_max_retries
+        self.cache = cache
+        self.limiter = limiter
+        self.hedging = hedging if hedging is not None else settings.llm_hedging_enabled
+
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyTracker] = {}
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def breaker(self, model: str, service: str = None) -> CircuitBreaker:
+        """One breaker per (model, service), so one endpoint's failures do not trip the others"""
+        name = f"{model}/{service or 'unknown'}"
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=settings.circuit_failure_threshold,
+                reset_timeout=settings.circuit_reset_seconds,
+                half_open_max_calls=settings.circuit_half_open_max_calls
+            )
+        return breaker
+
+    def latency_tracker(self, model: str) -> LatencyTracker:
+        tracker = self._latency.get(model)
+        if tracker is None:
+            tracker = self._latency[model] = LatencyTracker()
+        return tracker
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """Create the pooled async client on first use"""
+        if self._client is None:
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            )
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url or None,
+                http_client=http_client,
+                max_retries=self.max_retries
+            )
+        return self._client
+
+    async def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "gpt-3.5-turbo",
+        max_tokens: int = 500,
+        temperature: float = 0.7,
+        timeout: float = None,
+        cache: bool = False,
+        service: str = None,
+        **kwargs
+    ) -> Completion:
+        """
+        Run a chat completion, waiting for a concurrency slot first.
+        The timeout covers both the wait and the model call. With
+        ``cache=True`` identical requests are answered from the response cache.
+        Requests shed by the rate limiter are only answered from cache and
+        otherwise raise LoadShedError; while the circuit for this model and
+        ``service`` is open the call raises CircuitOpenError without touching
+        the network. ``service`` also labels the call in metrics.
+        """
+        key = None
+        if cache and self.cache is not None:
+            key = make_cache_key(model, messages, temperature, max_tokens, **kwargs)
+            hit = await self.cache.get(key)
+            if hit is not None:
+                return Completion(**{**hit, "cached": True})
+
+        if self.limiter is not None:
+            if self.limiter.should_shed():
+                raise LoadShedError("Model capacity exhausted, serving local results")
+            max_tokens = self.limiter.adapt_max_tokens(max_tokens)
+
+        breaker = self.breaker(model, service)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open, serving fallback results")
+        start = time.perf_counter()
+        try:
+            with span("model_call"):
+                completion = await asyncio.wait_for(
+                    self._hedged(messages, model, max_tokens, temperature, **kwargs),
+                    timeout or self.timeout
+                )
+        except Exception as e:
+            self._observe(service, model, start, e)
+            if is_upstream_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.release()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success()
+        self._observe(service, model, start, usage=completion.usage)
+
+        if self.limiter is not None:
+            self.limiter.record_usage(completion.usage.get("total_tokens", 0))
+
+        if key is not None:
+            await self.cache.set(key, asdict(completion))
+        return completion
+
+    def _observe(
+        self,
+        service: str,
+        model: str,
+        start: float,
+        error: Exception = None,
+        usage: Dict[str, int] = None,
+        stream: bool = False
+    ):
+        elapsed = time.perf_counter() - start
+        trace = current_trace()
+        if stream and trace is not None:
+            # Streams span many yields, so they are added to the trace here rather than by span()
+            trace.add("model_call", elapsed)
+        if error is None:
+            outcome = "ok"
+        elif isinstance(error, asyncio.TimeoutError):
+            outcome = "timeout"
+        else:
+            outcome = "error"
+        service = service or "unknown"
+        LLM_REQUEST_SECONDS.observe(elapsed, service=service, model=model, outcome=outcome)
+        for kind in ("prompt", "completion"):
+            if usage and usage.get(f"{kind}_tokens"):
+                LLM_TOKENS.inc(usage[f"{kind}_tokens"], service=service, model=model, kind=kind)
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while hedging is off or uncalibrated"""
+        if not self.hedging or self.in_flight >= self.max_concurrency:
+            return None
+        tracker = self.latency_tracker(model)
+        if len(tracker) < settings.llm_hedge_min_samples:
+            return None
+        return max(tracker.quantile(settings.llm_hedge_quantile), settings.llm_hedge_min_delay_seconds)
+
+    async def _attempt(self, messages, model, max_tokens, temperature, **kwargs) -> Completion:
+        start = time.perf_counter()
+        completion = await self._complete(messages, model, max_tokens, temperature, **kwargs)
+        self.latency_tracker(model).record(time.perf_counter() - start)
+        return completion
+
+    async def _hedged(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        **kwargs
+    ) -> Completion:
+        """
+        Run the completion; if it is still pending after the model's latency
+        quantile, start a second identical attempt and return whichever
+        succeeds first. The loser is cancelled.
+        """
+        delay = self._hedge_delay(model)
+        if delay is None:
+            return await self._attempt(messages, model, max_tokens, temperature, **kwargs)
+
+        first = asyncio.ensure_future(self._attempt(messages, model, max_tokens, temperature, **kwargs))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+
+            self.hedges_sent += 1
+            tasks.append(asyncio.ensure_future(self._attempt(messages, model, max_tokens, temperature, **kwargs)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedges_won += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        **kwargs
+    ) -> Completion:
+        async with self._semaphore:
+            self.in_flight += 1
+            start = time.perf_counter()
+            try:
+                raw = await self.client.chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    **kwargs
+                )
+            except openai.RateLimitError as e:
+                if self.limiter is not None:
+                    retry_after = e.response.headers.get("retry-after")
+                    self.limiter.upstream.rate_limited(float(retry_after) if retry_after else None)
+                raise
+            finally:
+                self.in_flight -= 1
+
+        if self.limiter is not None:
+            self.limiter.upstream.update(raw.headers)
+        response = raw.parse()
+
+        usage = {}
+        if response.usage is not None:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens
+            }
+
+        return Completion(
+            text=response.choices[0].message.content or "",
+            model=response.model or model,
+            usage=usage,
+            latency=time.perf_counter() - start
+        )
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = "gpt-3.5-turbo",
+        max_tokens: int = 500,
+        temperature: float = 0.7,
+        timeout: float = None,
+        service: str = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion as text deltas. The timeout applies to
+        opening the stream and to each gap between chunks, so a long answer
+        is fine as long as tokens keep arriving.
+        """
+        timeout = timeout or self.timeout
+        if self.limiter is not None and self.limiter.should_shed():
+            raise LoadShedError("Model capacity exhausted, serving local results")
+        breaker = self.breaker(model, service)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open, serving fallback results")
+        start = time.perf_counter()
+        usage = None
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    response = await asyncio.wait_for(
+                        self.client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            stream=True,
+                            **kwargs
+                        ),
+                        timeout
+                    )
+                    chunks = response.__aiter__()
+                    try:
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                            except StopAsyncIteration:
+                                break
+                            if getattr(chunk, "usage", None) is not None:
+                                usage = chunk.usage.model_dump()
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                yield chunk.choices[0].delta.content
+                    finally:
+                        await response.close()
+                finally:
+                    self.in_flight -= 1
+        except Exception as e:
+            self._observe(service, model, start, e, stream=True)
+            if is_upstream_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.release()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            self._observe(service, model, start, usage=usage, stream=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "circuits": {name: breaker.stats() for name, breaker in self._breakers.items()},
+            "hedging": {
+                "enabled": self.hedging,
+                "sent": self.hedges_sent,
+                "won": self.hedges_won,
+                "delays": {
+                    model: tracker.quantile(settings.llm_hedge_quantile)
+                    for model, tracker in self._latency.items()
+                }
+            }
+        }
+
+    async def aclose(self):
+        """Release pooled connections"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        if self.cache is not None:
+            await self.cache.aclose()
+
+
+class StubLLMGateway(LLMGateway):
+    """
+    Offline gateway for tests and batch jobs. ``responder`` maps the request
+    messages to the reply text; usage is estimated from text length.
+    """
+
+    def __init__(self, responder: Callable[[List[Dict[str, Any]]], str] = None, latency: float = 0.0, **kwargs):
+        super().__init__(api_key="stub", **kwargs)
+        self.responder = responder or (lambda messages: "Stub analysis.")
+        self.latency = latency
+        self.calls = 0
+
+    async def _complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        **kwargs
+    ) -> Completion:
+        async with self._semaphore:
+            self.calls += 1
+            start = time.perf_counter()
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            text = self.responder(messages)
+        prompt_tokens = sum(len(str(msg.get("content", ""))) for msg in messages) // 4
+        completion_tokens = len(text) // 4
+        return Completion(
+            text=text,
+            model=model,
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            },
+            latency=time.perf_counter() - start
+        )
+
+    async def stream(self, messages: List[Dict[str, Any]], model: str = "gpt-3.5-turbo", **kwargs) -> AsyncIterator[str]:
+        completion = await self._complete(messages, model, 0, 0.0)
+        words = completion.text.split(" ")
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + " "
+
+    async def aclose(self):
+        pass
+
+
+_gateway: Optional[LLMGateway] = None
+
+def get_llm_gateway() -> LLMGateway:
+    """Return the process-wide gateway instance"""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway(cache=build_response_cache(), limiter=get_rate_limiter())
+    return _gateway
@@ -0,0 +1,210 @@
+"""
+Prometheus-style metrics
+
+A small in-process registry of counters, gauges and histograms with labels,
+rendered in the Prometheus text exposition format by ``GET /metrics``.
+Counters and gauges can be backed by a callback, so existing stats (cache,
+gateway, single-flight) are read when the metrics are scraped instead of being
+counted twice.
+"""
+
+import math
+from typing import List, Dict, Any, Tuple, Callable, Optional
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: LabelKey, extra: Dict[str, str] = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class ValueMetric(Metric):
+    """A single value per label set, either updated in place or read from a callback"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelKey, float] = {}
+        self._functions: Dict[LabelKey, Callable[[], float]] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """Read the value from ``function`` at scrape time"""
+        self._functions[self._key(labels)] = function
+
+    def samples(self) -> List[str]:
+        values = dict(self._values)
+        for key, function in self._functions.items():
+            try:
+                values[key] = float(function())
+            except Exception:
+                continue
+        return [f"{self.name}{_labels(self.label_names, key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Counter(ValueMetric):
+    kind = "counter"
+
+
+class Gauge(ValueMetric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * len(self.buckets)
+            self._sums[key] = 0.0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self._sums[key] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, {'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "request_stage_duration_seconds",
+    "Time spent per request stage (validation, prompt_build, model_call, parse, serialization)",
+    ("route", "stage")
+))
+LLM_REQUEST_SECONDS = registry.register(Histogram(
+    "llm_request_duration_seconds", "Model call latency by service and model", ("service", "model", "outcome")
+))
+LLM_TOKENS = registry.register(Counter(
+    "llm_tokens_total", "Tokens reported in response.usage", ("service", "model", "kind")
+))
+LLM_IN_FLIGHT = registry.register(Gauge(
+    "llm_requests_in_flight", "Model calls currently in flight"
+))
+LLM_ESCALATIONS = registry.register(Counter(
+    "llm_escalations_total", "Structured-output retries sent to a higher model tier", ("service", "from_model", "to_model")
+))
+FALLBACKS = registry.register(Counter(
+    "service_fallbacks_total", "Responses served from a fallback after an error", ("service", "reason")
+))
+CACHE_LOOKUPS = registry.register(Counter(
+    "response_cache_lookups_total", "Response cache lookups by result", ("result",)
+))
+CACHE_HIT_RATIO = registry.register(Gauge(
+    "response_cache_hit_ratio", "Share of response cache lookups answered from cache"
+))
+SEMANTIC_CACHE_LOOKUPS = registry.register(Counter(
+    "semantic_cache_lookups_total", "Semantic cache lookups by result", ("result",)
+))
+JOBS = registry.register(Counter(
+    "jobs_total", "Background jobs by kind and outcome (submitted, deduplicated, rejected, succeeded, failed)", ("kind", "outcome")
+))
+JOB_SECONDS = registry.register(Histogram(
+    "job_duration_seconds", "Time background jobs spend queued and running", ("kind", "phase")
+))
+JOBS_QUEUED = registry.register(Gauge(
+    "jobs_queued", "Background jobs waiting for a worker"
+))
+LOOP_LAG_SECONDS = registry.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes a periodic timer", buckets=LAG_BUCKETS
+))
+
+
+def record_fallback(service: str, error: BaseException = None):
+    FALLBACKS.inc(service=service, reason=type(error).__name__ if error is not None else "unknown")
+
+
+def render() -> str:
+    return registry.render()
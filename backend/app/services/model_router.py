@@ -0,0 +1,96 @@
+"""
+Model routing by tier
+
+Each request type (route) is mapped to a tier in Settings: fast, standard
+or large. Each tier is mapped to a model. Inputs too long for the normal
+prompt budget go straight to the large tier, which gets its own budget.
+A route also lists the models of the tiers above it. complete_structured
+escalates to them when a reply fails validation, so only the requests
+that need a slower model pay for one.
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from app.config import settings
+
+TIERS = ("fast", "standard", "large")
+
+
+def parse_routes(value: str) -> Dict[str, str]:
+    """Parse ``route=tier,route=tier`` into a dict"""
+    routes = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        route, tier = (part.strip() for part in item.split("=", 1))
+        if tier not in TIERS:
+            raise ValueError(f"unknown model tier '{tier}' for route '{route}'")
+        routes[route] = tier
+    return routes
+
+
+@dataclass
+class ModelRoute:
+    route: str
+    tier: str
+    model: str
+    max_input_tokens: int
+    escalation: List[str] = field(default_factory=list)
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        tiers: Dict[str, str] = None,
+        routes: Dict[str, str] = None,
+        large_context_tokens: int = None,
+        escalation_enabled: bool = None
+    ):
+        self.tiers = tiers or {
+            "fast": settings.model_tier_fast,
+            "standard": settings.model_tier_standard,
+            "large": settings.model_tier_large
+        }
+        self.routes = routes if routes is not None else parse_routes(settings.model_routes)
+        self.large_context_tokens = large_context_tokens or settings.model_large_context_tokens
+        self.escalation_enabled = (
+            escalation_enabled if escalation_enabled is not None else settings.model_escalation_enabled
+        )
+        self.routed: Dict[str, int] = {}
+
+    def route(self, name: str, input_tokens: int = 0) -> ModelRoute:
+        """Pick the model for a request type, moving long inputs to the large tier"""
+        tier = self.routes.get(name, "standard")
+        if input_tokens > self.large_context_tokens:
+            tier = "large"
+
+        escalation: List[str] = []
+        if self.escalation_enabled:
+            for higher in TIERS[TIERS.index(tier) + 1:]:
+                model = self.tiers[higher]
+                if model != self.tiers[tier] and model not in escalation:
+                    escalation.append(model)
+
+        key = f"{name}:{tier}"
+        self.routed[key] = self.routed.get(key, 0) + 1
+        return ModelRoute(
+            route=name,
+            tier=tier,
+            model=self.tiers[tier],
+            max_input_tokens=settings.large_prompt_max_input_tokens if tier == "large" else settings.prompt_max_input_tokens,
+            escalation=escalation
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tiers": dict(self.tiers), "routes": dict(self.routes), "routed": dict(self.routed)}
+
+
+_router: Optional[ModelRouter] = None
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide model router"""
+    global _router
+    if _router is None:
+        _router = ModelRouter()
+    return _router
@@ -0,0 +1,390 @@
+"""
+Local photo analysis for profile optimization
+
+Each photo reference (``data:`` URI, http(s) URL, or a path under
+``settings.photo_local_root``) is loaded asynchronously, then decoded in a
+process pool so the event loop never runs image code. The pool computes
+cheap CPU features: resolution, aspect ratio, sharpness (variance of the
+Laplacian), brightness and contrast, a skin-tone face heuristic and a DCT
+perceptual hash. Features are cached by the SHA-256 of the image bytes,
+and for PHOTO_URL_CACHE_TTL_SECONDS also by the normalized URL, so a photo
+URL seen recently is not downloaded again.
+The results drive a photo score, near-duplicate detection and a
+recommended photo order. Pillow is optional: without it photo analysis is
+skipped.
+
+Photo URLs come from clients, so fetches go only to public addresses on
+PHOTO_ALLOWED_HOSTS (any public host when empty), connections go to the
+addresses that were checked, redirects are followed by hand and checked at
+every hop, and per-photo errors sent back are generic.
+Images larger than PHOTO_MAX_PIXELS are rejected from their header, before
+any pixel is decoded.
+"""
+
+import asyncio
+import base64
+import hashlib
+import importlib.util
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import numpy as np
+
+from app.config import settings
+from app.services.response_cache import MemoryBackend
+from app.services.url_safety import UnsafeURLError, check_url, parse_hosts, pinned_client, redirect_target
+
+logger = logging.getLogger(__name__)
+
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+# Features are computed on a downscaled copy; the original size is kept for scoring
+ANALYSIS_SIZE = 256
+HASH_SIZE = 8
+HASH_SAMPLE = 32
+EXIF_ORIENTATION = 0x0112
+
+SHARPNESS_BLURRY = 60.0
+MIN_GOOD_SIDE = 1080
+MAX_REDIRECTS = 3
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class PhotoError(ValueError):
+    """A photo that cannot be used; the message is safe to show the client"""
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for a photo URL: scheme and host lowercased, default port and fragment dropped"""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").rstrip(".")
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != {"http": 80, "https": 443}.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+    return urlunsplit((parts.scheme.lower(), host, parts.path or "/", parts.query, ""))
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    k = np.arange(size)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT = _dct_matrix(HASH_SAMPLE)
+
+
+def perceptual_hash(gray) -> str:
+    """64-bit DCT hash of a PIL grayscale image, as hex"""
+    from PIL import Image
+
+    sample = np.asarray(gray.resize((HASH_SAMPLE, HASH_SAMPLE), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = (_DCT @ sample @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = low > np.median(low[1:])
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):016x}"
+
+
+def hamming(first: str, second: str) -> int:
+    return bin(int(first, 16) ^ int(second, 16)).count("1")
+
+
+def analyze_image_bytes(data: bytes, max_pixels: int) -> Dict[str, Any]:
+    """Decode one image and compute its features. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        # Image.open reads only the header; refuse decompression bombs before decoding
+        width, height = image.size
+        if width * height > max_pixels:
+            raise PhotoError("photo dimensions too large")
+        if image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEG can decode straight to a smaller size, which is most of the cost
+        image.draft("RGB", (ANALYSIS_SIZE * 2, ANALYSIS_SIZE * 2))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+
+    rgb = np.asarray(image, dtype=np.float32)
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    laplacian = (
+        gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1] - 4 * gray[1:-1, 1:-1]
+    )
+    sharpness = float(laplacian.var()) if laplacian.size else 0.0
+
+    # Skin-tone share in YCbCr over the central region, where a portrait's face sits
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    cb = 128 - 0.168736 * r - 0.331264 * g + 0.5 * b
+    cr = 128 + 0.5 * r - 0.418688 * g - 0.081312 * b
+    skin = (cb >= 77) & (cb <= 127) & (cr >= 133) & (cr <= 173)
+    rows, cols = skin.shape
+    center = skin[rows // 6: rows * 2 // 3, cols // 5: cols * 4 // 5]
+    skin_ratio = float(center.mean()) if center.size else 0.0
+
+    return {
+        "width": width,
+        "height": height,
+        "aspect_ratio": round(width / height, 3) if height else 0.0,
+        "brightness": round(float(gray.mean()) / 255, 3),
+        "contrast": round(float(gray.std()) / 255, 3),
+        "sharpness": round(sharpness, 1),
+        "skin_ratio": round(skin_ratio, 3),
+        "face_likely": 0.12 <= skin_ratio <= 0.85,
+        "phash": perceptual_hash(Image.fromarray(gray.astype(np.uint8)))
+    }
+
+
+def score_photo(features: Dict[str, Any]) -> Dict[str, Any]:
+    """0-10 score and the issues behind it"""
+    issues = []
+    score = 10.0
+    if min(features["width"], features["height"]) < MIN_GOOD_SIDE:
+        issues.append("low resolution")
+        score -= 1.5
+    if features["sharpness"] < SHARPNESS_BLURRY:
+        issues.append("blurry")
+        score -= 2.5
+    if features["brightness"] < 0.3:
+        issues.append("too dark")
+        score -= 2.0
+    elif features["brightness"] > 0.8:
+        issues.append("overexposed")
+        score -= 1.5
+    if features["contrast"] < 0.12:
+        issues.append("low contrast")
+        score -= 1.0
+    if not features["face_likely"]:
+        issues.append("no face visible")
+        score -= 2.0
+    if features["aspect_ratio"] > 1.4:
+        issues.append("wide landscape crop")
+        score -= 0.5
+    return {"score": round(max(score, 0.0), 1), "issues": issues}
+
+
+ISSUE_TIPS = {
+    "low resolution": "Replace low-resolution photos with sharper, higher-resolution ones",
+    "blurry": "Swap out blurry photos; a steady, in-focus shot makes a better impression",
+    "too dark": "Use photos taken in daylight or good indoor light",
+    "overexposed": "Avoid washed-out photos with harsh direct light",
+    "low contrast": "Pick photos with clearer contrast so you stand out from the background",
+    "no face visible": "Make sure your face is clearly visible in your main photos",
+    "wide landscape crop": "Crop wide photos to portrait so you fill the frame"
+}
+
+
+class PhotoAnalyzer:
+    def __init__(self, max_workers: int = None, cache_entries: int = None):
+        self.enabled = settings.photo_analysis_enabled and PILLOW_AVAILABLE
+        self.max_workers = max_workers or settings.photo_analysis_workers
+        self.cache = MemoryBackend(cache_entries or settings.photo_feature_cache_max_entries)
+        self.local_root = os.path.realpath(settings.photo_local_root) if settings.photo_local_root else None
+        self.allowed_hosts = parse_hosts(settings.photo_allowed_hosts)
+        self._fetch_slots: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._http = None
+        self.decoded = 0
+        self.cache_hits = 0
+        self.url_hits = 0
+        self.errors = 0
+        if settings.photo_analysis_enabled and not PILLOW_AVAILABLE:
+            logger.warning("Pillow is not installed; photo analysis is disabled")
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """
+        Created on the first photo to decode, not at startup: every web worker
+        would otherwise spawn and hold its own pool even if it never sees a photo
+        """
+        if self._executor is None:
+            # spawn, not fork: the parent has running threads and an event loop
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def load(self, reference: str) -> bytes:
+        """Fetch the bytes behind a photo reference"""
+        if reference.startswith("data:"):
+            _, _, payload = reference.partition(",")
+            data = base64.b64decode(payload, validate=False)
+        elif reference.startswith(("http://", "https://")):
+            data = await self._fetch(reference)
+        elif self.local_root:
+            path = os.path.realpath(os.path.join(self.local_root, reference.lstrip("/")))
+            if not path.startswith(self.local_root + os.sep):
+                raise PhotoError("photo path outside the photo root")
+            data = await asyncio.to_thread(self._read_file, path)
+        else:
+            raise PhotoError("unsupported photo reference")
+        if len(data) > settings.photo_max_bytes:
+            raise PhotoError("photo too large")
+        return data
+
+    def _read_file(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read(settings.photo_max_bytes + 1)
+
+    async def _fetch(self, url: str) -> bytes:
+        if self._http is None:
+            self._http = pinned_client(timeout=settings.photo_fetch_timeout_seconds, follow_redirects=False)
+        if self._fetch_slots is None:
+            self._fetch_slots = asyncio.Semaphore(settings.photo_fetch_concurrency)
+        async with self._fetch_slots:
+            for _ in range(MAX_REDIRECTS + 1):
+                await check_url(url, self.allowed_hosts)
+                chunks = []
+                size = 0
+                async with self._http.stream("GET", url) as response:
+                    if response.status_code in REDIRECT_STATUSES:
+                        url = redirect_target(url, response.headers.get("location"))
+                        continue
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > settings.photo_max_bytes:
+                            raise PhotoError("photo too large")
+                        chunks.append(chunk)
+                return b"".join(chunks)
+        raise PhotoError("too many redirects")
+
+    async def features(self, reference: str) -> Dict[str, Any]:
+        url_key = None
+        if reference.startswith(("http://", "https://")) and settings.photo_url_cache_ttl_seconds > 0:
+            url_key = "url:" + normalize_url(reference)
+            cached = self.cache.get(url_key)
+            if cached is not None:
+                self.cache_hits += 1
+                self.url_hits += 1
+                return cached
+        data = await self.load(reference)
+        if len(data) > 256 * 1024:
+            # hashlib releases the GIL on large inputs
+            key = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+        else:
+            key = hashlib.sha256(data).hexdigest()
+        features = self.cache.get(key)
+        if features is not None:
+            self.cache_hits += 1
+        else:
+            loop = asyncio.get_running_loop()
+            features = await loop.run_in_executor(self.executor, analyze_image_bytes, data, settings.photo_max_pixels)
+            features.update(score_photo(features))
+            self.decoded += 1
+            self.cache.set(key, features, settings.photo_feature_cache_ttl_seconds)
+        if url_key is not None:
+            self.cache.set(url_key, features, settings.photo_url_cache_ttl_seconds)
+        return features
+
+    async def analyze(self, photos: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Per-photo features, near-duplicate pairs, a recommended order and an
+        overall photo score. None when photo analysis is unavailable.
+        """
+        if not self.enabled or not photos:
+            return None
+
+        photos = photos[:settings.photo_max_count]
+        results = await asyncio.gather(*(self.features(photo) for photo in photos), return_exceptions=True)
+        analyzed = []
+        for index, result in enumerate(results):
+            if isinstance(result, BaseException):
+                self.errors += 1
+                # Fetch errors name hosts and statuses; keep them in the log, not the response
+                logger.warning(f"Photo {index} could not be analyzed: {type(result).__name__}: {str(result)}")
+                if isinstance(result, UnsafeURLError):
+                    error = "photo URL is not allowed"
+                elif isinstance(result, PhotoError):
+                    error = str(result)
+                else:
+                    error = "photo could not be loaded"
+                analyzed.append({"index": index, "error": error})
+            else:
+                analyzed.append({"index": index, **result})
+        valid = [photo for photo in analyzed if "error" not in photo]
+        if not valid:
+            return {"photos": analyzed, "order": list(range(len(photos))), "duplicates": [], "photo_score": None}
+
+        duplicates = []
+        duplicated = set()
+        for i, first in enumerate(valid):
+            for second in valid[i + 1:]:
+                if hamming(first["phash"], second["phash"]) <= settings.photo_duplicate_distance:
+                    duplicates.append([first["index"], second["index"]])
+                    duplicated.add(second["index"])
+
+        # Best first, a photo with a visible face leading; near-duplicates and failures last
+        ranked = sorted(valid, key=lambda photo: (photo["index"] in duplicated, -photo["score"]))
+        lead = next((photo for photo in ranked if photo["face_likely"] and photo["index"] not in duplicated), None)
+        if lead is not None:
+            ranked.remove(lead)
+            ranked.insert(0, lead)
+        order = [photo["index"] for photo in ranked] + [photo["index"] for photo in analyzed if "error" in photo]
+
+        # Weighted toward the photos people see first
+        top = [photo["score"] for photo in ranked if photo["index"] not in duplicated][:3]
+        weights = [0.5, 0.3, 0.2][:len(top)]
+        photo_score = sum(s * w for s, w in zip(top, weights)) / sum(weights)
+        if len(photos) < 3:
+            photo_score -= 1.0
+
+        return {
+            "photos": analyzed,
+            "order": order,
+            "duplicates": duplicates,
+            "photo_score": round(max(photo_score, 0.0), 1)
+        }
+
+    def suggestions(self, report: Optional[Dict[str, Any]]) -> List[str]:
+        """Specific photo tips derived from an analysis report"""
+        if not report:
+            return []
+        tips = []
+        issues = {issue for photo in report["photos"] for issue in photo.get("issues", [])}
+        tips.extend(tip for issue, tip in ISSUE_TIPS.items() if issue in issues)
+        if report["duplicates"]:
+            tips.append("Remove near-duplicate photos and show a different side of yourself")
+        if report["order"] and report["order"] != sorted(report["order"]):
+            tips.append(f"Reorder your photos: {', '.join(str(index + 1) for index in report['order'])}")
+        return tips
+
+    def summary(self, report: Optional[Dict[str, Any]]) -> Optional[str]:
+        """One compact line per photo for the model prompt"""
+        if not report or report["photo_score"] is None:
+            return None
+        lines = []
+        for photo in report["photos"]:
+            if "error" in photo:
+                lines.append(f"{photo['index'] + 1}: unreadable")
+            else:
+                issues = ", ".join(photo["issues"]) or "no issues"
+                lines.append(f"{photo['index'] + 1}: {photo['width']}x{photo['height']} score {photo['score']} ({issues})")
+        return "; ".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "decoded": self.decoded,
+            "cache_hits": self.cache_hits,
+            "url_cache_hits": self.url_hits,
+            "cached": len(self.cache),
+            "errors": self.errors
+        }
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+        if self._executor is not None:
+            # Waiting lets the pool release its semaphores; a forked server worker
+            # (app.serve) otherwise leaks them at exit
+            await asyncio.to_thread(self._executor.shutdown, wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,35 @@
+"""
+Memory use of the current process, for startup logs and /health
+
+RSS counts shared pages (imported code, mmap-shared data) in full for every
+worker. PSS divides each shared page among the processes that map it, so
+summing PSS over workers gives the real footprint. Both come from
+/proc/self/smaps_rollup on Linux. Elsewhere only the peak RSS is available.
+"""
+
+import os
+import sys
+from typing import Dict, Any
+
+SMAPS_FIELDS = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_clean_mb", "Private_Dirty": "private_dirty_mb"}
+
+
+def memory_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in SMAPS_FIELDS:
+                    stats[SMAPS_FIELDS[name]] = round(int(rest.split()[0]) / 1024, 1)
+        return stats
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return stats
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    stats["peak_rss_mb"] = round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return stats
@@ -2,69 +2,88 @@
 Profile optimization service for dating profiles
 """
 
-import openai
 from typing import List, Dict, Any
-from app.config import settings
+from app.services.llm_gateway import LLMGateway, get_llm_gateway
+from app.services.single_flight import coalesced
+from app.services.structured_output import complete_structured
+from app.services.prompts import PROFILE_OPTIMIZATION, BIO_NARRATIVE, format_context
+from app.services.metrics import record_fallback
+from app.services.model_router import ModelRouter, get_model_router
+from app.services.photo_analyzer import PhotoAnalyzer
+from app.services.bio_scorer import BioScorer
+from app.services.rate_limiter import LoadShedError
+from app.models.schemas import ProfileInsights, BioNarrative
+
+SERVICE = "profile_optimizer"
 
 class ProfileOptimizer:
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.openai_api_key)
+    def __init__(
+        self,
+        gateway: LLMGateway = None,
+        router: ModelRouter = None,
+        photo_analyzer: PhotoAnalyzer = None,
+        bio_scorer: BioScorer = None
+    ):
+        self.gateway = gateway or get_llm_gateway()
+        self.router = router or get_model_router()
+        self.photo_analyzer = photo_analyzer or PhotoAnalyzer()
+        self.bio_scorer = bio_scorer or BioScorer()
     
+    @coalesced
     async def optimize_profile(
         self,
         photos: List[str],
         bio: str,
         preferences: Dict[str, Any],
-        region: str
+        region: str,
+        use_model: bool = True
     ) -> Dict[str, Any]:
         """
-        Analyze and optimize user's dating profile
+        Analyze and optimize user's dating profile. With ``use_model=False``
+        only the local photo and bio analysis is returned.
         """
+        photo_report = await self.photo_analyzer.analyze(photos)
+        photo_score = photo_report["photo_score"] if photo_report else None
+        photo_tips = self.photo_analyzer.suggestions(photo_report)
+        bio_report = self.bio_scorer.score([bio], region)[0]
+        bio_score = bio_report["score"]
         try:
+            if not use_model:
+                raise LoadShedError("Request not admitted by the rate limiter, serving local results")
             # Create context for profile optimization
-            context = f"""
-            Current bio: {bio}
-            Region: {region}
-            Preferences: {preferences}
-            Number of photos: {len(photos)}
-            """
-            
-            system_prompt = """You are a dating profile optimization expert. Analyze the profile and provide specific recommendations for:
-            1. Bio improvements (tone, content, length)
-            2. Photo suggestions (types, order, quality)
-            3. Profile completeness
-            4. Appeal to target audience
+            context = format_context([
+                ("Region", region),
+                ("Preferences", preferences),
+                ("Number of photos", len(photos)),
+                ("Photo analysis", self.photo_analyzer.summary(photo_report)),
+                ("Bio score", f"{bio_score}/10, weakest: {', '.join(bio_report['feedback']) or 'none'}"),
+                ("Current bio", bio)
+            ])
             
-            Provide actionable, specific advice that will improve match rates."""
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": context}
-                ],
+            route = self.router.route("profile_optimization")
+            insights, _ = await complete_structured(
+                self.gateway,
+                ProfileInsights,
+                model=route.model,
+                escalation=route.escalation,
+                messages=PROFILE_OPTIMIZATION.messages(context=context),
                 max_tokens=500,
-                temperature=0.7
+                temperature=0.7,
+                cache=True,
+                service=SERVICE
             )
             
-            optimization_text = response.choices[0].message.content
-            
+            if photo_score is None:
+                photo_score = 6.5
             return {
-                "bio_score": 7.0,
-                "photo_score": 6.5,
-                "overall_score": 6.8,
-                "bio_suggestions": [
-                    "Add more specific details about your interests",
-                    "Include what you're looking for in a relationship",
-                    "Show your personality through humor or unique details"
-                ],
-                "photo_suggestions": [
-                    "Add a clear face photo as your first image",
-                    "Include photos showing your hobbies",
-                    "Add a full-body photo",
-                    "Consider photos with friends to show social side"
-                ],
-                "detailed_analysis": optimization_text,
+                "bio_score": bio_score,
+                "photo_score": photo_score,
+                "overall_score": round((bio_score + photo_score) / 2, 1),
+                "bio_suggestions": insights.bio_suggestions,
+                "bio_analysis": bio_report,
+                "photo_suggestions": photo_tips + [tip for tip in insights.photo_suggestions if tip not in photo_tips],
+                "photo_analysis": photo_report,
+                "detailed_analysis": insights.summary,
                 "completeness": {
                     "bio_complete": len(bio) > 50,
                     "photos_complete": len(photos) >= 3,
@@ -74,20 +93,25 @@ class ProfileOptimizer:
             
         except Exception as e:
             # Fallback optimization suggestions
+            record_fallback(SERVICE, e)
+            if photo_score is None:
+                photo_score = 6.0
             return {
-                "bio_score": 6.0,
-                "photo_score": 6.0,
-                "overall_score": 6.0,
-                "bio_suggestions": [
+                "bio_score": bio_score,
+                "photo_score": photo_score,
+                "overall_score": round((bio_score + photo_score) / 2, 1),
+                "bio_suggestions": bio_report["feedback"] or [
                     "Write a bio that shows your personality",
                     "Include your interests and hobbies",
                     "Mention what you're looking for"
                 ],
-                "photo_suggestions": [
+                "bio_analysis": bio_report,
+                "photo_suggestions": photo_tips or [
                     "Add clear, recent photos",
                     "Include photos of you doing activities",
                     "Make sure your first photo is your best"
                 ],
+                "photo_analysis": photo_report,
                 "detailed_analysis": "Profile optimization temporarily unavailable. Please try again later.",
                 "completeness": {
                     "bio_complete": len(bio) > 50,
@@ -95,4 +119,53 @@ class ProfileOptimizer:
                     "preferences_complete": bool(preferences)
                 },
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+
+    async def score_bios(
+        self,
+        bios: List[str],
+        region: str = None,
+        preferences: Dict[str, Any] = None,
+        narrate: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Rank bio variants locally and, if ``narrate`` is set, ask the model to
+        explain the winner. Only the best bio is sent to the model.
+        """
+        rankings = self.bio_scorer.rank(bios, region)
+        if not rankings:
+            return {"rankings": [], "best": {}, "narrative": None}
+        best = {**rankings[0], "bio": bios[rankings[0]["index"]]}
+        narrative = await self.narrate_bio(best, region, preferences) if narrate else None
+        return {"rankings": rankings, "best": best, "narrative": narrative}
+
+    async def narrate_bio(self, best: Dict[str, Any], region: str = None, preferences: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Model narrative for a scored bio; falls back to the local feedback"""
+        try:
+            context = format_context([
+                ("Region", region),
+                ("Preferences", preferences),
+                ("Score", f"{best['score']}/10"),
+                ("Feature scores (0-1)", best["features"]),
+                ("Bio", best["bio"])
+            ])
+            route = self.router.route("bio_narrative")
+            narrative, _ = await complete_structured(
+                self.gateway,
+                BioNarrative,
+                model=route.model,
+                escalation=route.escalation,
+                messages=BIO_NARRATIVE.messages(context=context),
+                max_tokens=250,
+                temperature=0.7,
+                cache=True,
+                service=SERVICE
+            )
+            return narrative.model_dump()
+        except Exception as e:
+            record_fallback(SERVICE, e)
+            return {
+                "summary": f"This bio scored {best['score']}/10 on length, readability, specificity, call to action, originality and local relevance.",
+                "bio_suggestions": best["feedback"],
+                "error": str(e)
+            }
@@ -0,0 +1,239 @@
+"""
+Prompt assembly for model calls
+
+System prompts are compiled once at import time. They do not change between
+requests, so every call to a service starts with the same bytes, which
+lets the provider cache the prompt prefix. Per-request values go after
+the prefix, ordered from most to least stable. Context dicts are
+serialized as compact ``key: value`` lines instead of Python reprs.
+Tokens are counted locally, using tiktoken when it is installed and its
+encoding is available, so that contexts and histories are cut to a budget
+before they are sent.
+"""
+
+import inspect
+import json
+import math
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+
+from app.config import settings
+from app.services.tracing import span
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # The encoding file is downloaded on first use; offline we estimate
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count of ``text``, exact with tiktoken, otherwise a close estimate"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # BPE splits long words into ~4 character pieces; punctuation is one token each
+    return sum(math.ceil(len(piece) / 4) for piece in WORD_RE.findall(text))
+
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(count_tokens(str(msg.get("content") or "")) + MESSAGE_OVERHEAD for msg in messages) + 2
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "start") -> str:
+    """Cut ``text`` to at most ``max_tokens``, keeping its start or its end"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        tokens = tokens[:max_tokens] if keep == "start" else tokens[-max_tokens:]
+        return encoding.decode(tokens)
+    # Binary search on characters against the estimate
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        piece = text[:middle] if keep == "start" else text[-middle:]
+        if count_tokens(piece) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] if keep == "start" else text[len(text) - low:]
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def compact(value: Any) -> str:
+    """Serialize a context value with as little punctuation as stays unambiguous"""
+    if isinstance(value, dict):
+        parts = [f"{key}={compact(item)}" for key, item in value.items() if not _is_empty(item)]
+        return ", ".join(parts)
+    if isinstance(value, (list, tuple, set)):
+        return ", ".join(compact(item) for item in value if not _is_empty(item))
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (int, float, bool)):
+        return json.dumps(value)
+    return str(value)
+
+
+def format_context(fields: List[Tuple[str, Any]]) -> str:
+    """Render (label, value) pairs as ``label: value`` lines, skipping empty values"""
+    lines = []
+    with span("prompt_build"):
+        for label, value in fields:
+            if _is_empty(value):
+                continue
+            if isinstance(value, dict):
+                lines.append(f"{label}:")
+                lines.extend(f"- {key}: {compact(item)}" for key, item in value.items() if not _is_empty(item))
+            else:
+                lines.append(f"{label}: {compact(value)}")
+    return "\n".join(lines)
+
+
+class PromptTemplate:
+    """A fixed system prompt plus the rules for fitting the rest into a budget"""
+
+    def __init__(self, name: str, system: str, max_input_tokens: int = None):
+        self.name = name
+        self.system = inspect.cleandoc(system)
+        self.system_tokens = count_tokens(self.system)
+        self.max_input_tokens = max_input_tokens or settings.prompt_max_input_tokens
+
+    def messages(
+        self,
+        context: str = None,
+        history: List[Dict[str, str]] = None,
+        prefix: List[Dict[str, str]] = None,
+        max_input_tokens: int = None
+    ) -> List[Dict[str, str]]:
+        """
+        Build ``[system, *prefix, *history, context]``. When over budget the
+        oldest history turns are dropped first (the latest turn is always
+        kept), then the context is cut. ``max_input_tokens`` overrides the
+        template's budget, e.g. for a large-context model.
+        """
+        with span("prompt_build"):
+            messages = [{"role": "system", "content": self.system}, *(prefix or [])]
+            budget = (max_input_tokens or self.max_input_tokens) - count_message_tokens(messages)
+
+            if history:
+                history = self._fit_history(history, budget - (count_tokens(context) + MESSAGE_OVERHEAD if context else 0))
+                messages.extend(history)
+                budget -= count_message_tokens(history) - 2
+
+            if context:
+                messages.append({
+                    "role": "user",
+                    "content": truncate_to_tokens(context, max(budget - MESSAGE_OVERHEAD, 0))
+                })
+            return messages
+
+    def _fit_history(self, history: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+        kept: List[Dict[str, str]] = []
+        used = 0
+        for turn in reversed(history):
+            tokens = count_tokens(turn["content"]) + MESSAGE_OVERHEAD
+            if kept and used + tokens > budget:
+                break
+            kept.append(turn)
+            used += tokens
+        kept.reverse()
+        if used > budget and kept:
+            # A single oversized latest turn: keep its end, where the reply is due
+            last = kept[-1]
+            kept[-1] = {**last, "content": truncate_to_tokens(last["content"], max(budget - MESSAGE_OVERHEAD, 1), keep="end")}
+        return kept
+
+
+CONVERSATION_ANALYSIS = PromptTemplate("conversation_analysis", """
+    You are a dating conversation analyst. Analyze the conversation and provide insights on:
+    1. Conversation flow and engagement
+    2. Emotional tone and sentiment
+    3. Communication effectiveness
+    4. Areas for improvement
+    5. Compatibility indicators
+
+    Provide specific, actionable feedback.
+
+    Reply with a JSON object with 'summary' (2-4 sentences), 'strengths', 'improvements' and 'suggestions' (lists of short strings).
+""")
+
+CONVERSATION_SUMMARY = PromptTemplate("conversation_summary", """
+    Update the running summary of a dating conversation with the new turns.
+    Keep names, shared interests, plans and the emotional tone. Reply with the summary only, under 120 words.
+""")
+
+SUGGESTIONS = PromptTemplate("suggestions", """
+    You are a dating conversation coach. Based on the conversation context, provide 3-5 specific, actionable suggestions for improving the conversation. Focus on:
+    1. Questions to ask next
+    2. Topics to explore
+    3. Ways to show interest
+    4. Conversation flow improvements
+
+    Follow the suggestion type given with the context.
+
+    Format your response as a JSON object with a 'suggestions' array of objects with 'type', 'suggestion', and 'reason' fields.
+""")
+
+PROFILE_OPTIMIZATION = PromptTemplate("profile_optimization", """
+    You are a dating profile optimization expert. Analyze the profile and provide specific recommendations for:
+    1. Bio improvements (tone, content, length)
+    2. Photo suggestions (types, order, quality)
+    3. Profile completeness
+    4. Appeal to target audience
+
+    Provide actionable, specific advice that will improve match rates.
+
+    Reply with a JSON object with 'summary' (2-3 sentences), 'bio_suggestions' (3 strings) and 'photo_suggestions' (3-4 strings).
+""")
+
+BIO_NARRATIVE = PromptTemplate("bio_narrative", """
+    You are a dating profile coach. The bio below scored best among several variants on local checks; the scores and weakest areas are given with it.
+    Explain in plain words why it works and how to make it even better, without rewriting it completely.
+
+    Reply with a JSON object with 'summary' (2-3 sentences) and 'bio_suggestions' (2-3 short strings).
+""")
+
+TREND_ANALYSIS = PromptTemplate("trend_analysis", """
+    You are a dating trends analyst. Analyze dating trends for the region and provide insights on:
+    1. Popular conversation topics
+    2. Common interests and hobbies
+    3. Communication styles
+    4. Profile preferences
+    5. Dating app usage patterns
+
+    Focus on actionable insights for users in the given region.
+
+    Reply with a JSON object with these keys:
+    - popular_topics: 4 conversation topics
+    - trending_topics: 5 currently trending local topics
+    - popular_photo_types: 5 photo types that perform well
+    - communication_style: object with tone, length, emoji_usage, formality
+    - profile_preferences: object with bio_length, photo_style, interests
+    - success_factors: 3 short success factors
+    - detailed_analysis: 1-2 sentences
+""")
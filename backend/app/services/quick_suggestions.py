@@ -0,0 +1,209 @@
+"""
+Precomputed quick-suggestion index
+
+The template library is loaded once from a JSON file and compiled into
+per-message-type lists. Each template's text is pre-split into literal and
+placeholder parts. A lookup drops templates whose placeholders, interest tags
+or regions don't fit the caller's context. It then samples the rest without
+replacement, weighted so that personalized lines come up more often, and
+fills the placeholders. No model call is made. For an empty context, the
+lines that fit are kept already serialized per message type, so a draw
+only samples from them.
+
+With ``shared_dir`` set, the raw library is packed into an mmap-shared file
+(see shared_data). Each worker then compiles a message type's templates the
+first time that type is requested.
+"""
+
+import json
+import logging
+import os
+import random
+from string import Formatter
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.config import settings
+from app.services.http_cache import dumps
+from app.services.trend_store import normalize_region
+from app.services.shared_data import MappedRecords, open_shared_records, shared_stats
+
+logger = logging.getLogger(__name__)
+
+# Extra weight for a template whose interest tag or region matches the context
+TAG_BOOST = 2.0
+REGION_BOOST = 2.0
+
+
+def _split_interests(value: Any) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [" ".join(str(item).split()) for item in value if str(item).strip()]
+
+
+def weighted_sample(weights: List[float], count: int, rng: random.Random) -> List[int]:
+    """Indices of ``count`` items sampled without replacement (Efraimidis-Spirakis keys)"""
+    keyed = sorted(range(len(weights)), key=lambda i: rng.random() ** (1.0 / weights[i]), reverse=True)
+    return keyed[:count]
+
+
+class QuickTemplate:
+    __slots__ = ("text", "parts", "fields", "tags", "regions", "weight")
+
+    def __init__(self, text: str, tags: List[str] = None, regions: List[str] = None, weight: float = 1.0):
+        self.text = text
+        self.parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(text)
+        ]
+        self.fields = frozenset(field for _, field in self.parts if field)
+        self.tags = frozenset(tag.lower() for tag in tags or [])
+        self.regions = frozenset(normalize_region(region) for region in regions or [])
+        self.weight = float(weight)
+
+    def fill(self, values: Dict[str, str]) -> str:
+        return "".join(literal + (values[field] if field else "") for literal, field in self.parts)
+
+
+class QuickSuggestionIndex:
+    def __init__(self, path: str = None, rng: random.Random = None, shared_dir: str = None):
+        self.path = path or settings.quick_suggestions_path
+        self.rng = rng or random.Random()
+        self.shared_dir = shared_dir if shared_dir is not None else settings.shared_data_dir
+        self.templates: Dict[str, List[QuickTemplate]] = {}
+        self.counts: Dict[str, int] = {}
+        self.aliases: Dict[str, str] = {}
+        self.default_type = "general"
+        self.version = None
+        self._shared: Optional[MappedRecords] = None
+        self._generic: Dict[str, Tuple[List[bytes], List[float]]] = {}
+        self.load()
+
+    def _read_library(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Template entries per message type, plus the rest of the file"""
+        with open(self.path, "rb") as f:
+            data = json.loads(f.read())
+        templates = data.pop("templates", {})
+        data["counts"] = {message_type: len(entries) for message_type, entries in templates.items()}
+        return templates, data
+
+    def load(self):
+        try:
+            if self.shared_dir:
+                stat = os.stat(self.path)
+                self._shared = open_shared_records(
+                    self.path, (stat.st_mtime_ns, stat.st_size, stat.st_ino), self.shared_dir, self._read_library
+                )
+                entries, meta = {}, self._shared.meta
+            else:
+                entries, meta = self._read_library()
+        except Exception as e:
+            logger.error(f"Failed to load quick suggestions from {self.path}: {str(e)}")
+            entries, meta = {}, {}
+
+        self.templates = {
+            message_type: [QuickTemplate(**entry) for entry in items]
+            for message_type, items in entries.items()
+        }
+        self.counts = meta.get("counts", {})
+        self.aliases = meta.get("aliases", {})
+        self.default_type = meta.get("default_type", "general")
+        self.version = meta.get("version")
+        self._generic = {}
+        logger.info(f"Loaded {sum(self.counts.values())} quick suggestion templates")
+
+    def _templates(self, message_type: str) -> List[QuickTemplate]:
+        templates = self.templates.get(message_type)
+        if templates is None and self._shared is not None:
+            # Compiled on first use in this worker; the raw entries stay in the shared map
+            templates = self.templates[message_type] = [
+                QuickTemplate(**entry) for entry in self._shared.get(message_type, [])
+            ]
+        return templates or []
+
+    def resolve_type(self, message_type: str) -> str:
+        key = str(message_type).lower().replace("-", "_")
+        key = self.aliases.get(key, key)
+        return key if key in self.counts else self.default_type
+
+    def context_values(self, context: Dict[str, Any], rng: random.Random = None) -> Tuple[Dict[str, str], frozenset, str]:
+        """Placeholder values, lowercased interest tags and normalized region for a context"""
+        rng = rng or self.rng
+        interests = _split_interests(context.get("interests"))
+        user_interests = {item.lower() for item in _split_interests(context.get("user_interests"))}
+        shared = [item for item in interests if item.lower() in user_interests]
+
+        values = {}
+        if context.get("name"):
+            values["name"] = str(context["name"]).strip()
+        if shared:
+            values["shared_interest"] = rng.choice(shared).lower()
+        if interests:
+            values["interest"] = values.get("shared_interest") or rng.choice(interests).lower()
+        region = normalize_region(context["region"]) if context.get("region") else ""
+        if region:
+            values["region"] = region.title()
+        topics = context.get("topics") or []
+        if topics and region:
+            values["topic"] = rng.choice(topics).lower()
+
+        # Interest tags come from the match's interests: that's who the line is for
+        tags = frozenset(word for item in interests for word in item.lower().split())
+        return values, tags, region
+
+    def suggest(self, message_type: str, context: Dict[str, Any] = None, count: int = 3, seed: Any = None) -> List[str]:
+        """
+        Up to ``count`` distinct suggestions for the message type, filled from
+        ``context`` (name, interests, user_interests, region, topics). The same
+        ``seed`` always draws the same lines, in any process.
+        """
+        rng = random.Random(seed) if seed is not None else self.rng
+        values, tags, region = self.context_values(context or {}, rng)
+        available = values.keys()
+
+        candidates = []
+        weights = []
+        for template in self._templates(self.resolve_type(message_type)):
+            if not template.fields <= available:
+                continue
+            if template.regions and region not in template.regions:
+                continue
+            if template.tags and not template.tags & tags:
+                continue
+            weight = template.weight
+            if template.tags:
+                weight *= TAG_BOOST
+            if template.regions:
+                weight *= REGION_BOOST
+            candidates.append(template)
+            weights.append(weight)
+
+        return [candidates[i].fill(values) for i in weighted_sample(weights, count, rng)]
+
+    def generic_lines(self, message_type: str, count: int = 3) -> List[bytes]:
+        """
+        A fresh draw of ``suggest(message_type, {}, count)``, each line already
+        serialized as a JSON string. The lines that need no context are
+        found and encoded once per message type.
+        """
+        resolved = self.resolve_type(message_type)
+        pool = self._generic.get(resolved)
+        if pool is None:
+            templates = [
+                template for template in self._templates(resolved)
+                if not (template.fields or template.regions or template.tags)
+            ]
+            pool = self._generic[resolved] = (
+                [dumps(template.fill({})) for template in templates],
+                [template.weight for template in templates]
+            )
+        lines, weights = pool
+        return [lines[i] for i in weighted_sample(weights, count, self.rng)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "version": self.version,
+            "templates": dict(self.counts),
+            "shared": shared_stats(self._shared)
+        }
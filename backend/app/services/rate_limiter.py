@@ -0,0 +1,378 @@
+"""
+Token-bucket rate limiting, per-user token budgets and upstream load shedding
+
+Each request is admitted against a bucket for its endpoint, a bucket for the
+(user, endpoint) pair and the user's model-token budget. The upstream's
+rate-limit headers are tracked as well. Requests that do not fit are not
+rejected: they are marked as shed, and the gateway then answers them only
+from cache, so services fall through to their local results instead of
+returning 500s. Endpoints also branch on the result of ``admit`` and ask
+services for their local results directly.
+
+Under the pre-forked launcher (app.serve) every worker would otherwise hold
+its own buckets and the effective limits would be multiplied by the worker
+count. There the buckets live in one SQLite file (RATE_LIMIT_STORE_PATH)
+that all workers of the host update atomically. If that file cannot be
+used, each worker keeps local buckets with the rates and capacities divided
+by the worker count.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Mapping
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_shed: ContextVar[bool] = ContextVar("rate_limit_shed", default=False)
+# Token tally for one shared computation (see single_flight), so every caller can be billed
+_meter: ContextVar[Optional[list]] = ContextVar("rate_limit_meter", default=None)
+_user: ContextVar[Optional[str]] = ContextVar("rate_limit_user", default=None)
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class LoadShedError(Exception):
+    """Raised instead of calling the model while a request is being shed"""
+
+
+def parse_duration(value: str) -> float:
+    """Parse upstream reset durations such as '20ms', '1s' or '6m0s'"""
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in DURATION_RE.findall(value or ""))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def consume(self, amount: float):
+        """Charge after the fact; the bucket may go into debt"""
+        self._refill()
+        self.tokens -= amount
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+class BucketMap:
+    """Buckets per key, bounded with LRU eviction so idle keys do not pile up"""
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 100000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def get(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SharedTokenBucket:
+    """One key of a SharedBucketMap, with the TokenBucket interface"""
+
+    def __init__(self, buckets: "SharedBucketMap", key: str):
+        self._buckets = buckets
+        self._key = key
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        return self._buckets.try_acquire(self._key, amount)
+
+    def consume(self, amount: float):
+        self._buckets.consume(self._key, amount)
+
+    def available(self) -> float:
+        return self._buckets.available(self._key)
+
+
+class SharedBucketMap:
+    """
+    Buckets per key kept in an SQLite database in WAL mode, shared by the
+    workers of one host. Refill and withdrawal happen in a single UPDATE, so
+    concurrent workers never spend the same tokens twice. A full bucket is
+    the same as a missing one, so full rows are purged now and then.
+
+    The connection is opened lazily and per process: the limiter is built in
+    the launcher before it forks. Store errors admit the request (fail open)
+    rather than turning a rate-limit check into a 500.
+    """
+
+    PURGE_EVERY = 1024
+    REFILLED = "MIN(:capacity, tokens + MAX(0, :now - updated) * :rate)"
+
+    def __init__(self, path: str, name: str, rate: float, capacity: float):
+        self.path = path
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.errors = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT NOT NULL, key TEXT NOT NULL, "
+                "tokens REAL NOT NULL, updated REAL NOT NULL, PRIMARY KEY (name, key))"
+            )
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    def check(self):
+        """Create the table now and close again, so no connection is left to cross a fork"""
+        self._connect().close()
+        self._db = None
+
+    def _params(self, key: str, **extra) -> Dict[str, Any]:
+        return {"name": self.name, "key": key, "rate": self.rate, "capacity": self.capacity, "now": time.time(), **extra}
+
+    def _withdraw(self, key: str, amount: float, condition: str) -> bool:
+        params = self._params(key, amount=amount)
+        db = self._connect()
+        db.execute("INSERT OR IGNORE INTO buckets VALUES (:name, :key, :capacity, :now)", params)
+        cursor = db.execute(
+            f"UPDATE buckets SET tokens = {self.REFILLED} - :amount, updated = :now "
+            f"WHERE name = :name AND key = :key{condition}",
+            params
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            db.execute(f"DELETE FROM buckets WHERE name = :name AND {self.REFILLED} >= :capacity", params)
+        return cursor.rowcount == 1
+
+    def try_acquire(self, key: str, amount: float = 1.0) -> bool:
+        try:
+            return self._withdraw(key, amount, f" AND {self.REFILLED} >= :amount")
+        except sqlite3.Error as e:
+            self._failed(e)
+            return True
+
+    def consume(self, key: str, amount: float):
+        """Charge after the fact; the bucket may go into debt"""
+        try:
+            self._withdraw(key, amount, "")
+        except sqlite3.Error as e:
+            self._failed(e)
+
+    def available(self, key: str) -> float:
+        try:
+            row = self._connect().execute(
+                f"SELECT {self.REFILLED} FROM buckets WHERE name = :name AND key = :key", self._params(key)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._failed(e)
+            return self.capacity
+        return self.capacity if row is None else row[0]
+
+    def _failed(self, error: Exception):
+        self.errors += 1
+        logger.warning(f"Shared rate-limit store unavailable: {str(error)}")
+
+    def get(self, key: str) -> SharedTokenBucket:
+        return SharedTokenBucket(self, key)
+
+    def __len__(self) -> int:
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM buckets WHERE name = ?", (self.name,)).fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+def build_buckets(name: str, rate: float, capacity: float):
+    """
+    Buckets shared by all workers when RATE_LIMIT_STORE_PATH is set,
+    otherwise local ones with the limits split across WEB_WORKERS
+    """
+    if settings.rate_limit_store_path:
+        try:
+            buckets = SharedBucketMap(settings.rate_limit_store_path, name, rate, capacity)
+            buckets.check()
+            return buckets
+        except sqlite3.Error as e:
+            logger.warning(f"Shared rate-limit store unavailable, splitting limits per worker: {str(e)}")
+    workers = max(1, settings.web_workers)
+    return BucketMap(rate / workers, capacity / workers)
+
+
+class UpstreamState:
+    """Remaining upstream capacity as reported by x-ratelimit-* headers"""
+
+    def __init__(self, min_remaining_fraction: float):
+        self.min_remaining_fraction = min_remaining_fraction
+        self.remaining_fraction = 1.0
+        self.token_fraction = 1.0
+        self.blocked_until = 0.0
+
+    def update(self, headers: Mapping[str, str]):
+        fractions = []
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            if remaining is None or not limit:
+                continue
+            try:
+                fraction = float(remaining) / float(limit)
+            except (TypeError, ValueError, ZeroDivisionError):
+                continue
+            fractions.append(fraction)
+            if kind == "tokens":
+                self.token_fraction = fraction
+            if fraction < self.min_remaining_fraction:
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}", "")) or 1.0
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+        if fractions:
+            self.remaining_fraction = min(fractions)
+
+    def rate_limited(self, retry_after: float = None):
+        """Upstream answered 429: stop sending until it says we may retry"""
+        self.remaining_fraction = 0.0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + (retry_after or 1.0))
+
+    def exhausted(self) -> bool:
+        return time.monotonic() < self.blocked_until
+
+
+class RateLimiter:
+    def __init__(self):
+        self.enabled = settings.rate_limit_enabled
+        self.user_requests = build_buckets(
+            "user_requests", settings.user_requests_per_minute / 60.0, settings.user_request_burst
+        )
+        self.endpoint_requests = build_buckets(
+            "endpoint_requests", settings.endpoint_requests_per_second, settings.endpoint_request_burst
+        )
+        self.token_budgets = build_buckets(
+            "token_budgets", settings.user_tokens_per_minute / 60.0, settings.user_tokens_per_minute
+        )
+        self.upstream = UpstreamState(settings.upstream_min_remaining_fraction)
+        self.admitted = 0
+        self.shed = 0
+
+    def admit(self, endpoint: str, user_key: str) -> bool:
+        """
+        Decide whether this request may call the model and remember the
+        decision for the rest of the request. Returns False when shed.
+        """
+        _user.set(user_key)
+        if not self.enabled:
+            return True
+        allowed = (
+            self.endpoint_requests.get(endpoint).try_acquire()
+            and self.user_requests.get(f"{user_key}:{endpoint}").try_acquire()
+            and self.token_budgets.get(user_key).available() > 0
+            and not self.upstream.exhausted()
+        )
+        _shed.set(not allowed)
+        if allowed:
+            self.admitted += 1
+        else:
+            self.shed += 1
+        return allowed
+
+    def admit_budget(self, user_key: str) -> bool:
+        """
+        Admit one more model call within a request that was already admitted,
+        such as one item of a batch: only the user's token budget and the
+        upstream are checked, not the request buckets
+        """
+        _user.set(user_key)
+        if not self.enabled:
+            return True
+        allowed = self.token_budgets.get(user_key).available() > 0 and not self.upstream.exhausted()
+        _shed.set(not allowed)
+        if not allowed:
+            self.shed += 1
+        return allowed
+
+    def should_shed(self) -> bool:
+        """Checked by the gateway right before each model call"""
+        if not self.enabled:
+            return False
+        if _shed.get() or self.upstream.exhausted():
+            return True
+        user = _user.get()
+        return user is not None and self.token_budgets.get(user).available() <= 0
+
+    def adapt_max_tokens(self, requested: int) -> int:
+        """Shrink completions when upstream token capacity or the user's budget runs low"""
+        if not self.enabled:
+            return requested
+        limit = requested
+        if self.upstream.token_fraction < 0.25:
+            limit = int(requested * max(self.upstream.token_fraction * 4, 0.3))
+        user = _user.get()
+        if user is not None:
+            limit = min(limit, int(self.token_budgets.get(user).available()))
+        return max(64, min(limit, requested))
+
+    def record_usage(self, tokens: int):
+        meter = _meter.get()
+        if meter is not None and tokens:
+            meter[0] += tokens
+        user = _user.get()
+        if self.enabled and user is not None and tokens:
+            self.token_budgets.get(user).consume(tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "shared": isinstance(self.token_budgets, SharedBucketMap),
+            "tracked_users": len(self.token_budgets),
+            "upstream_remaining_fraction": round(self.upstream.remaining_fraction, 3),
+            "upstream_exhausted": self.upstream.exhausted()
+        }
+
+
+def start_meter() -> list:
+    """Tally tokens recorded from here on in this context (and tasks it starts) into the returned [count]"""
+    meter = [0]
+    _meter.set(meter)
+    return meter
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
@@ -0,0 +1,296 @@
+"""
+Content-addressed cache for model completions
+
+Keys are a hash of the normalized request (model, messages including the
+system prompt, temperature and max_tokens). Entries live in an in-process LRU
+tier with a TTL and, optionally, in a shared tier so that all workers benefit
+from each other's completions. The shared tier is Redis (``settings.redis_url``), or an
+SQLite file when ``settings.response_cache_shared_path`` is set. Under
+/dev/shm that file lives in shared memory and serves the workers of one host.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: float,
+    max_tokens: int,
+    **extra
+) -> str:
+    """Hash a completion request after normalizing whitespace and float noise"""
+    payload = {
+        "model": model,
+        "messages": [
+            {
+                "role": msg.get("role", "user"),
+                "content": " ".join(str(msg.get("content", "")).split())
+            }
+            for msg in messages
+        ],
+        "temperature": round(float(temperature), 3),
+        "max_tokens": int(max_tokens),
+        "extra": extra
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    shared_errors: int = 0
+    tokens_saved: int = 0
+    latency_saved: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        lookups = self.hits + self.misses
+        stats["hit_ratio"] = round(self.hits / lookups, 4) if lookups else 0.0
+        stats["latency_saved"] = round(self.latency_saved, 3)
+        return stats
+
+
+class MemoryBackend:
+    """In-process LRU tier with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1024, stats: CacheStats = None):
+        self.max_entries = max_entries
+        self.stats = stats or CacheStats()
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LocalSharedBackend:
+    """
+    Stand-in for the shared tier with the same async interface as
+    RedisBackend. Used in tests and when Redis is not available.
+    """
+
+    def __init__(self):
+        self._store: Dict[str, Tuple[float, str]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._store[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._store[key] = (time.monotonic() + ttl, value)
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        """Set only if the key is absent or expired; True if it was set"""
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def scan(self, prefix: str) -> AsyncIterator[Tuple[str, str]]:
+        """Yield (key, value) for every live key starting with prefix"""
+        for key in [key for key in self._store if key.startswith(prefix)]:
+            value = await self.get(key)
+            if value is not None:
+                yield key, value
+
+    async def aclose(self):
+        self._store.clear()
+
+
+class RedisBackend:
+    """Shared tier stored in Redis with native key expiry"""
+
+    def __init__(self, url: str, prefix: str = "llmcache:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._redis.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        return bool(await self._redis.set(self.prefix + key, value, ex=max(1, int(ttl)), nx=True))
+
+    async def scan(self, prefix: str) -> AsyncIterator[Tuple[str, str]]:
+        async for key in self._redis.scan_iter(match=self.prefix + prefix + "*"):
+            value = await self._redis.get(key)
+            if value is not None:
+                yield key[len(self.prefix):], value
+
+    async def aclose(self):
+        await self._redis.close()
+
+
+class FileSharedBackend:
+    """
+    Shared tier for the workers of one host: an SQLite database in WAL mode.
+    Lookups are local primary-key reads, so they run inline on the event loop.
+    Open it after forking; a connection must not cross into a child process.
+    """
+
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    async def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, now + ttl, value))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._db.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+
+    async def add(self, key: str, value: str, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._db.execute(
+            "INSERT INTO entries VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE "
+            "SET expires_at = excluded.expires_at, value = excluded.value WHERE entries.expires_at < ?",
+            (key, now + ttl, value, now)
+        )
+        return cursor.rowcount == 1
+
+    async def scan(self, prefix: str) -> AsyncIterator[Tuple[str, str]]:
+        rows = self._db.execute(
+            "SELECT key, value FROM entries WHERE substr(key, 1, ?) = ? AND expires_at >= ?",
+            (len(prefix), prefix, time.time())
+        ).fetchall()
+        for key, value in rows:
+            yield key, value
+
+    async def aclose(self):
+        self._db.close()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600,
+        shared_backend=None
+    ):
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.local = MemoryBackend(max_entries, self.stats)
+        self.shared = shared_backend
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a completion, promoting shared-tier hits into the local tier"""
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            try:
+                raw = await self.shared.get(key)
+            except Exception as e:
+                self.stats.shared_errors += 1
+                logger.warning(f"Shared cache lookup failed: {str(e)}")
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(key, value, self.ttl)
+                self.stats.shared_hits += 1
+
+        if value is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        self.stats.tokens_saved += value.get("usage", {}).get("total_tokens", 0)
+        self.stats.latency_saved += value.get("latency", 0.0)
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        self.local.set(key, value, self.ttl)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, json.dumps(value), self.ttl)
+            except Exception as e:
+                self.stats.shared_errors += 1
+                logger.warning(f"Shared cache write failed: {str(e)}")
+
+    async def aclose(self):
+        if self.shared is not None:
+            await self.shared.aclose()
+
+
+def build_response_cache() -> Optional[ResponseCache]:
+    """Create the cache described by settings, or None when disabled"""
+    if not settings.response_cache_enabled:
+        return None
+
+    shared_backend = None
+    if settings.response_cache_shared and settings.response_cache_shared_path:
+        try:
+            shared_backend = FileSharedBackend(settings.response_cache_shared_path)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared response cache file unavailable: {str(e)}")
+    elif settings.response_cache_shared:
+        try:
+            shared_backend = RedisBackend(settings.redis_url)
+        except ImportError:
+            logger.warning("redis package not installed; shared response cache disabled")
+
+    return ResponseCache(
+        max_entries=settings.response_cache_max_entries,
+        ttl=settings.response_cache_ttl_seconds,
+        shared_backend=shared_backend
+    )
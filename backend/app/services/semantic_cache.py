@@ -0,0 +1,171 @@
+"""
+Semantic cache for near-duplicate requests
+
+Conversation contexts are rarely byte-identical, so exact-match caching misses
+most repeats ("just matched, talked about hiking"). Here the context text is
+embedded with a hashed word and character n-gram vectorizer (no model, no
+download). The embedding is looked up in a fixed-size NumPy matrix by cosine
+similarity. Entries are partitioned by an exact namespace (e.g. suggestion
+type, user preferences and the names in the context), so only the
+free-form context is matched approximately. Only the context's values are
+embedded: keys are shared by every context and would inflate similarity.
+Least recently used rows are reused when the matrix is full.
+"""
+
+import hashlib
+import re
+import time
+import zlib
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from app.config import settings
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+class HashedNgramVectorizer:
+    """Signed feature hashing of word unigrams, word bigrams and character trigrams"""
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def features(self, text: str) -> List[str]:
+        words = WORD_RE.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        features.extend(f"b:{first} {second}" for first, second in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        """Return an L2-normalized float32 vector; all zeros for empty text"""
+        hashes = np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in self.features(text)),
+            dtype=np.uint32
+        )
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        if hashes.size:
+            # The top bit picks the sign so colliding features tend to cancel out
+            signs = np.where(hashes >> 31, -1.0, 1.0)
+            vector += np.bincount(hashes % self.dimensions, weights=signs, minlength=self.dimensions)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+        return vector
+
+
+def values_text(value: Any) -> str:
+    """The values of a nested context as plain text, without its keys"""
+    if isinstance(value, dict):
+        return " ".join(values_text(item) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return " ".join(values_text(item) for item in value)
+    return "" if value is None else str(value)
+
+
+def namespace_id(*parts: Any) -> int:
+    """Stable 63-bit id for the exact-match part of a request"""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+@dataclass
+class SemanticCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    similarity_sum: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = asdict(self)
+        lookups = self.hits + self.misses
+        stats["hit_ratio"] = round(self.hits / lookups, 4) if lookups else 0.0
+        stats["mean_hit_similarity"] = round(self.similarity_sum / self.hits, 4) if self.hits else 0.0
+        del stats["similarity_sum"]
+        return stats
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        threshold: float = 0.85,
+        ttl: float = 3600,
+        dimensions: int = 512
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.vectorizer = HashedNgramVectorizer(dimensions)
+        self.stats = SemanticCacheStats()
+        self._vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._namespaces = np.zeros(max_entries, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._values: List[Any] = [None] * max_entries
+        self._size = 0
+
+    def get(self, text: str, namespace: int = 0) -> Optional[Any]:
+        """Return the value stored for the most similar text above the threshold"""
+        if self._size == 0:
+            self.stats.misses += 1
+            return None
+        now = time.monotonic()
+        vector = self.vectorizer.embed(text)
+        size = self._size
+        scores = self._vectors[:size] @ vector
+        scores[(self._namespaces[:size] != namespace) | (self._expires[:size] < now)] = -1.0
+        row = int(np.argmax(scores))
+        if scores[row] < self.threshold:
+            self.stats.misses += 1
+            return None
+        self._last_used[row] = now
+        self.stats.hits += 1
+        self.stats.similarity_sum += float(scores[row])
+        return self._values[row]
+
+    def set(self, text: str, value: Any, namespace: int = 0):
+        vector = self.vectorizer.embed(text)
+        if not vector.any():
+            return
+        now = time.monotonic()
+        if self._size < self.max_entries:
+            row = self._size
+            self._size += 1
+        else:
+            expired = np.flatnonzero(self._expires < now)
+            if expired.size:
+                row = int(expired[0])
+                self.stats.expirations += 1
+            else:
+                row = int(np.argmin(self._last_used))
+                self.stats.evictions += 1
+        self._vectors[row] = vector
+        self._namespaces[row] = namespace
+        self._expires[row] = now + self.ttl
+        self._last_used[row] = now
+        self._values[row] = value
+
+    def clear(self):
+        self._values = [None] * self.max_entries
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def build_semantic_cache() -> Optional[SemanticCache]:
+    """Create the cache described by settings, or None when disabled"""
+    if not settings.semantic_cache_enabled:
+        return None
+    return SemanticCache(
+        max_entries=settings.semantic_cache_max_entries,
+        threshold=settings.semantic_cache_threshold,
+        ttl=settings.semantic_cache_ttl_seconds,
+        dimensions=settings.semantic_cache_dimensions
+    )
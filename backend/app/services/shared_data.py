@@ -0,0 +1,144 @@
+"""
+Read-only records shared between worker processes through mmap
+
+Read-mostly data (trend records, quick-suggestion templates) is packed once
+into a flat file: a header mapping each key to the offset and length of its
+JSON payload, followed by the payloads. Every worker maps the same file
+read-only, so the pages sit once in the OS page cache instead of once per
+worker heap. A lookup decodes only the record it needs.
+
+Packed files are named after the source file and its (mtime, size, inode)
+signature. A worker that sees the source change either opens the packed file
+another worker already wrote or packs it itself. Content is deterministic
+and the file is renamed into place atomically, so concurrent packers are
+harmless.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from typing import Dict, Any, Optional, Callable, Tuple, Iterator
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DCAREC1\n"
+HEADER_SIZE = struct.Struct("<Q")
+
+
+def pack_records(path: str, records: Dict[str, Any], meta: Dict[str, Any] = None):
+    """Write records to ``path`` atomically (temp file in the same directory, then rename)"""
+    payloads = []
+    keys = {}
+    offset = 0
+    for key in sorted(records):
+        payload = json.dumps(records[key], separators=(",", ":"), sort_keys=True).encode()
+        keys[key] = (offset, len(payload))
+        payloads.append(payload)
+        offset += len(payload)
+    header = json.dumps({"meta": meta or {}, "keys": keys}, separators=(",", ":"), sort_keys=True).encode()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".rec")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(HEADER_SIZE.pack(len(header)))
+            f.write(header)
+            f.writelines(payloads)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class MappedRecords:
+    """Read-only view of a packed file; ``get`` decodes one record per call"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"not a packed record file: {path}")
+        (header_size,) = HEADER_SIZE.unpack_from(self._map, len(MAGIC))
+        header_start = len(MAGIC) + HEADER_SIZE.size
+        header = json.loads(self._map[header_start:header_start + header_size])
+        self.meta: Dict[str, Any] = header["meta"]
+        self._keys: Dict[str, Tuple[int, int]] = header["keys"]
+        self._base = header_start + header_size
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._keys.get(key)
+        if entry is None:
+            return default
+        start = self._base + entry[0]
+        return json.loads(self._map[start:start + entry[1]])
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._map)
+
+
+def packed_path(source_path: str, signature: tuple, shared_dir: str) -> str:
+    """Packed file for this version of the source, e.g. ``trends-3fa2c1d0-9b1e22aa.rec``"""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    source_id = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:8]
+    version_id = hashlib.sha1(repr(signature).encode()).hexdigest()[:8]
+    return os.path.join(shared_dir, f"{stem}-{source_id}-{version_id}.rec")
+
+
+def _remove_stale(path: str):
+    """Delete packed files of older versions of the same source; open maps stay valid"""
+    directory, name = os.path.split(path)
+    prefix = name.rsplit("-", 1)[0] + "-"
+    for other in os.listdir(directory):
+        if other.startswith(prefix) and other.endswith(".rec") and other != name:
+            try:
+                os.unlink(os.path.join(directory, other))
+            except OSError:
+                pass
+
+
+def open_shared_records(
+    source_path: str,
+    signature: tuple,
+    shared_dir: str,
+    build: Callable[[], Tuple[Dict[str, Any], Dict[str, Any]]]
+) -> MappedRecords:
+    """
+    Map the packed file for this source version, packing it first if no worker
+    has yet. ``build`` returns (records, meta) from the source file.
+    """
+    path = packed_path(source_path, signature, shared_dir)
+    try:
+        return MappedRecords(path)
+    except FileNotFoundError:
+        pass
+    records, meta = build()
+    pack_records(path, records, meta)
+    _remove_stale(path)
+    logger.info(f"Packed {len(records)} shared records from {source_path} into {path}")
+    return MappedRecords(path)
+
+
+def shared_stats(records: Optional[MappedRecords]) -> Optional[Dict[str, Any]]:
+    if records is None:
+        return None
+    return {"path": records.path, "records": len(records), "bytes": records.nbytes}
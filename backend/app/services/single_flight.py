@@ -0,0 +1,107 @@
+"""
+Single-flight request coalescing
+
+Concurrent calls with the same normalized inputs share one in-flight
+computation instead of each starting their own model call. Nothing is kept
+once the computation finishes, so there is no staleness beyond the burst.
+
+The computation runs with the first caller's rate-limit context. Callers
+that are being shed therefore only coalesce with each other. Each follower
+is billed the tokens the shared computation used, so per-user budgets still
+hold.
+"""
+
+import asyncio
+import copy
+import functools
+import hashlib
+import json
+from typing import Dict, Any, Callable, Awaitable, Tuple
+
+from app.services.rate_limiter import get_rate_limiter, start_meter
+
+
+def make_flight_key(name: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """Hash call arguments independent of dict ordering and tuple/list spelling"""
+    def normalize(value):
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            return {str(k): normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return value
+
+    payload = json.dumps(
+        [name, normalize(list(args)), normalize(kwargs)],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _metered(fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Tuple[Any, int]:
+    meter = start_meter()
+    result = await fn(*args, **kwargs)
+    return result, meter[0]
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Run ``fn`` once per key at a time. The computation runs in its own task
+        so a cancelled caller does not cancel it for everyone else waiting.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            result, tokens = await asyncio.shield(task)
+            # The leader's usage was billed to the leader; bill this caller as well
+            get_rate_limiter().record_usage(tokens)
+            # Followers get their own copy so nobody mutates a shared result
+            return copy.deepcopy(result)
+
+        self.executed += 1
+        task = asyncio.ensure_future(_metered(fn, *args, **kwargs))
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._finish(key, t))
+        result, _ = await asyncio.shield(task)
+        return result
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls)
+        }
+
+
+def coalesced(method):
+    """
+    Decorator for async service methods: identical concurrent calls on the
+    same instance await a single execution.
+    """
+    group = SingleFlight()
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        # Shed and admitted callers must not share a computation
+        shed = get_rate_limiter().should_shed()
+        key = make_flight_key(f"{method.__qualname__}:{id(self)}:{shed}", args, kwargs)
+        return await group.do(key, method, self, *args, **kwargs)
+
+    wrapper.single_flight = group
+    return wrapper
@@ -0,0 +1,202 @@
+"""
+Structured (JSON) output layer for model completions
+
+Requests JSON mode, parses with orjson when it is installed, repairs the usual
+damage (markdown fences, prose around the JSON, truncation at max_tokens,
+trailing commas) locally, validates into a Pydantic model, and only re-prompts
+when the reply still does not validate, with a capped number of retries. The
+retry sends the broken reply back for correction instead of regenerating the
+whole answer.
+"""
+
+import json
+import logging
+import re
+from dataclasses import asdict
+from typing import List, Dict, Any, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from app.config import settings
+from app.services.llm_gateway import LLMGateway, Completion
+from app.services.response_cache import make_cache_key
+from app.services.tracing import span
+from app.services.metrics import LLM_ESCALATIONS
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+    _DecodeError = (orjson.JSONDecodeError, ValueError)
+except ImportError:
+    _loads = json.loads
+    _DecodeError = (ValueError,)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+DANGLING_RE = re.compile(r"(,\s*\"[^\"]*\"\s*:\s*|[,:]\s*)$")
+
+JSON_MODE = {"type": "json_object"}
+
+
+class StructuredOutputError(Exception):
+    def __init__(self, message: str, text: str = ""):
+        super().__init__(message)
+        self.text = text
+
+
+def _close(fragment: str, stack: List[str], in_string: bool) -> str:
+    if in_string:
+        fragment += '"'
+    fragment = DANGLING_RE.sub("", fragment.rstrip())
+    return fragment + "".join(reversed(stack))
+
+
+def parse_json(text: str) -> Any:
+    """
+    Parse JSON from a model reply, repairing fences, surrounding prose,
+    trailing commas and truncation. Raises ValueError if nothing parses.
+    """
+    text = text.strip()
+    try:
+        return _loads(text)
+    except _DecodeError:
+        pass
+
+    fence = FENCE_RE.search(text)
+    if fence:
+        text = fence.group(1).strip()
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise ValueError("no JSON value in reply")
+    text = text[min(starts):]
+
+    # Scan once, tracking nesting and the last safe cut points outside strings
+    stack: List[str] = []
+    cut_points: List[Tuple[int, List[str]]] = []
+    in_string = escaped = False
+    end = None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                end = i + 1
+                break
+        elif ch == ",":
+            cut_points.append((i, list(stack)))
+
+    if end is not None:
+        candidates = [text[:end]]
+    else:
+        # Truncated: close what is open, or drop the last incomplete element
+        candidates = [_close(text, stack, in_string)]
+        candidates += [_close(text[:i], cut_stack, False) for i, cut_stack in reversed(cut_points[-3:])]
+
+    for candidate in candidates:
+        try:
+            return _loads(TRAILING_COMMA_RE.sub(r"\1", candidate))
+        except _DecodeError:
+            continue
+    raise ValueError("could not repair JSON reply")
+
+
+def parse_structured(text: str, model_cls: Type[T]) -> T:
+    """Parse and validate a reply into ``model_cls``"""
+    with span("parse"):
+        try:
+            data = parse_json(text)
+        except ValueError as e:
+            raise StructuredOutputError(str(e), text)
+
+        # A bare array is accepted for models with a single list field
+        if isinstance(data, list) and len(model_cls.model_fields) == 1:
+            data = {next(iter(model_cls.model_fields)): data}
+
+        try:
+            return model_cls.model_validate(data)
+        except ValidationError as e:
+            raise StructuredOutputError(str(e), text)
+
+
+async def complete_structured(
+    gateway: LLMGateway,
+    model_cls: Type[T],
+    messages: List[Dict[str, Any]],
+    model: str = "gpt-3.5-turbo",
+    max_tokens: int = 500,
+    temperature: float = 0.7,
+    max_retries: int = None,
+    service: str = None,
+    escalation: List[str] = None,
+    **kwargs
+) -> Tuple[T, Completion]:
+    """
+    Run a JSON-mode completion and validate it into ``model_cls``.
+    On failure the reply and the validation error are sent back for a
+    correction, at most ``max_retries`` times. Corrections go to the next
+    model in ``escalation`` while there is one. With ``cache=True`` only
+    replies that validated are cached.
+    """
+    max_retries = settings.structured_max_retries if max_retries is None else max_retries
+    
+    key = None
+    if kwargs.pop("cache", False) and gateway.cache is not None:
+        key = make_cache_key(model, messages, temperature, max_tokens, response_format=JSON_MODE, **kwargs)
+        hit = await gateway.cache.get(key)
+        if hit is not None:
+            completion = Completion(**{**hit, "cached": True})
+            return parse_structured(completion.text, model_cls), completion
+    
+    models = [model] + list(escalation or [])
+    attempt_model = model
+    attempt_messages = list(messages)
+    for attempt in range(max_retries + 1):
+        next_model = models[min(attempt, len(models) - 1)]
+        if next_model != attempt_model:
+            LLM_ESCALATIONS.inc(service=service or "unknown", from_model=attempt_model, to_model=next_model)
+            attempt_model = next_model
+        completion = await gateway.complete(
+            messages=attempt_messages,
+            model=attempt_model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            response_format=JSON_MODE,
+            service=service,
+            **kwargs
+        )
+        try:
+            parsed = parse_structured(completion.text, model_cls)
+        except StructuredOutputError as e:
+            if attempt == max_retries:
+                raise
+            logger.warning(f"Invalid structured output for {model_cls.__name__}, retrying: {str(e)[:200]}")
+            attempt_messages = list(messages) + [
+                {"role": "assistant", "content": completion.text},
+                {
+                    "role": "user",
+                    "content": f"That reply was not valid JSON for the requested schema ({str(e)[:300]}). "
+                               "Reply with only the corrected JSON object."
+                }
+            ]
+            continue
+        
+        if key is not None:
+            await gateway.cache.set(key, asdict(completion))
+        return parsed, completion
@@ -2,119 +2,208 @@
 Suggestion engine for dating conversations
 """
 
-import openai
-from typing import List, Dict, Any
-from app.config import settings
+import re
+from typing import List, Dict, Any, AsyncIterator, Tuple, Optional
+from app.services.llm_gateway import LLMGateway, get_llm_gateway
+from app.services.single_flight import coalesced
+from app.services.structured_output import JSON_MODE, complete_structured, parse_structured
+from app.services.prompts import SUGGESTIONS, compact, format_context
+from app.services.metrics import record_fallback
+from app.services.model_router import ModelRouter, get_model_router
+from app.services.semantic_cache import SemanticCache, build_semantic_cache, namespace_id, values_text
+from app.services.quick_suggestions import QuickSuggestionIndex
+from app.services.rate_limiter import LoadShedError
+from app.models.schemas import SuggestionList
+
+SERVICE = "suggestion_engine"
+# Context keys naming a person; they scope the semantic cache exactly
+NAME_KEYS = ("match_name", "partner_name", "user_name", "name", "first_name")
 
 class SuggestionEngine:
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.openai_api_key)
+    def __init__(
+        self,
+        gateway: LLMGateway = None,
+        router: ModelRouter = None,
+        semantic_cache: Optional[SemanticCache] = None,
+        quick_index: QuickSuggestionIndex = None
+    ):
+        self.gateway = gateway or get_llm_gateway()
+        self.router = router or get_model_router()
+        self.semantic_cache = semantic_cache if semantic_cache is not None else build_semantic_cache()
+        self.quick_index = quick_index or QuickSuggestionIndex()
     
+    @coalesced
     async def generate_suggestions(
         self,
         conversation_context: Dict[str, Any],
         user_preferences: Dict[str, Any] = None,
-        suggestion_type: str = "general"
+        suggestion_type: str = "general",
+        use_model: bool = True
     ) -> List[Dict[str, Any]]:
         """
-        Generate smart suggestions for improving the conversation
+        Generate smart suggestions for improving the conversation. With
+        ``use_model=False`` only cached or fallback suggestions are returned.
         """
+        cached = self._cached_suggestions(conversation_context, user_preferences, suggestion_type)
+        if cached is not None:
+            return cached
         try:
-            # Create context for suggestions
-            context_text = f"Conversation context: {conversation_context}"
-            if user_preferences:
-                context_text += f"\nUser preferences: {user_preferences}"
-            
-            system_prompt = f"""You are a dating conversation coach. Based on the conversation context, provide 3-5 specific, actionable suggestions for improving the conversation. Focus on:
-            1. Questions to ask next
-            2. Topics to explore
-            3. Ways to show interest
-            4. Conversation flow improvements
-            
-            Suggestion type: {suggestion_type}
-            
-            Format your response as a JSON array of objects with 'type', 'suggestion', and 'reason' fields."""
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": context_text}
-                ],
+            if not use_model:
+                raise LoadShedError("Request not admitted by the rate limiter, serving local results")
+            route = self.router.route("suggestions")
+            suggestions, _ = await complete_structured(
+                self.gateway,
+                SuggestionList,
+                model=route.model,
+                escalation=route.escalation,
+                messages=self._build_messages(conversation_context, user_preferences, suggestion_type),
                 max_tokens=400,
-                temperature=0.8
+                temperature=0.8,
+                service=SERVICE
             )
+            result = [item.model_dump() for item in suggestions.suggestions]
+            self._store_suggestions(conversation_context, user_preferences, suggestion_type, result)
+            return result
             
-            suggestions_text = response.choices[0].message.content
-            
-            # Parse suggestions (fallback if JSON parsing fails)
-            return [
-                {
-                    "type": "question",
-                    "suggestion": "What's the most interesting place you've traveled to recently?",
-                    "reason": "Travel stories often reveal personality and create connection"
-                },
-                {
-                    "type": "topic",
-                    "suggestion": "Ask about their hobbies or passions",
-                    "reason": "Shows genuine interest in their life"
-                },
-                {
-                    "type": "engagement",
-                    "suggestion": "Share a related personal experience",
-                    "reason": "Creates mutual vulnerability and deeper connection"
-                }
-            ]
-            
         except Exception as e:
-            # Fallback suggestions
-            return [
-                {
-                    "type": "question",
-                    "suggestion": "What do you enjoy doing in your free time?",
-                    "reason": "Open-ended questions encourage sharing"
-                },
-                {
-                    "type": "topic",
-                    "suggestion": "Ask about their favorite music or movies",
-                    "reason": "Cultural interests often lead to good conversations"
-                },
-                {
-                    "type": "engagement",
-                    "suggestion": "Be genuinely curious about their responses",
-                    "reason": "Active listening builds connection"
-                }
-            ]
+            record_fallback(SERVICE, e)
+            return self._fallback_suggestions()
+    
+    async def stream_suggestions(
+        self,
+        conversation_context: Dict[str, Any],
+        user_preferences: Dict[str, Any] = None,
+        suggestion_type: str = "general"
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream suggestion tokens as ("token", text) events as they arrive,
+        followed by a single ("result", suggestions) event
+        """
+        cached = self._cached_suggestions(conversation_context, user_preferences, suggestion_type)
+        if cached is not None:
+            yield "result", cached
+            return
+        chunks = []
+        try:
+            async for delta in self.gateway.stream(
+                model=self.router.route("suggestions").model,
+                messages=self._build_messages(conversation_context, user_preferences, suggestion_type),
+                max_tokens=400,
+                temperature=0.8,
+                response_format=JSON_MODE,
+                service=SERVICE
+            ):
+                chunks.append(delta)
+                yield "token", delta
+            suggestions = parse_structured("".join(chunks), SuggestionList)
+            result = [item.model_dump() for item in suggestions.suggestions]
+            self._store_suggestions(conversation_context, user_preferences, suggestion_type, result)
+            yield "result", result
+        except Exception as e:
+            record_fallback(SERVICE, e)
+            yield "result", self._fallback_suggestions()
+    
+    def _cached_suggestions(
+        self,
+        conversation_context: Dict[str, Any],
+        user_preferences: Dict[str, Any],
+        suggestion_type: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Suggestions stored for a near-identical context, from any user or
+        conversation, with the same type, preferences and names
+        """
+        if self.semantic_cache is None:
+            return None
+        cached = self.semantic_cache.get(
+            values_text(conversation_context),
+            self._namespace(conversation_context, user_preferences, suggestion_type)
+        )
+        return [dict(item) for item in cached] if cached is not None else None
+    
+    def _store_suggestions(
+        self,
+        conversation_context: Dict[str, Any],
+        user_preferences: Dict[str, Any],
+        suggestion_type: str,
+        suggestions: List[Dict[str, Any]]
+    ):
+        if self.semantic_cache is None:
+            return
+        # A line that addresses someone by name only fits that context
+        names = self._names(conversation_context, user_preferences)
+        text = " ".join(values_text(item) for item in suggestions).lower()
+        if any(re.search(rf"\b{re.escape(name)}\b", text) for name in names):
+            return
+        self.semantic_cache.set(
+            values_text(conversation_context),
+            suggestions,
+            self._namespace(conversation_context, user_preferences, suggestion_type)
+        )
     
-    def get_quick_suggestions(self, message_type: str) -> List[str]:
+    def _names(self, *contexts: Optional[Dict[str, Any]]) -> List[str]:
+        return sorted({
+            str(context[key]).strip().lower()
+            for context in contexts if isinstance(context, dict)
+            for key in NAME_KEYS if context.get(key) and str(context[key]).strip()
+        })
+    
+    def _namespace(
+        self,
+        conversation_context: Dict[str, Any],
+        user_preferences: Optional[Dict[str, Any]],
+        suggestion_type: str
+    ) -> int:
+        return namespace_id(
+            suggestion_type,
+            compact(user_preferences or {}),
+            self._names(conversation_context, user_preferences)
+        )
+    
+    def _build_messages(
+        self,
+        conversation_context: Dict[str, Any],
+        user_preferences: Dict[str, Any],
+        suggestion_type: str
+    ) -> List[Dict[str, str]]:
+        # Most stable values first, the conversation itself last
+        context = format_context([
+            ("Suggestion type", suggestion_type),
+            ("User preferences", user_preferences),
+            ("Conversation context", conversation_context)
+        ])
+        return SUGGESTIONS.messages(context=context)
+    
+    def _fallback_suggestions(self) -> List[Dict[str, Any]]:
+        # Fallback suggestions
+        return [
+            {
+                "type": "question",
+                "suggestion": "What do you enjoy doing in your free time?",
+                "reason": "Open-ended questions encourage sharing"
+            },
+            {
+                "type": "topic",
+                "suggestion": "Ask about their favorite music or movies",
+                "reason": "Cultural interests often lead to good conversations"
+            },
+            {
+                "type": "engagement",
+                "suggestion": "Be genuinely curious about their responses",
+                "reason": "Active listening builds connection"
+            }
+        ]
+    
+    def get_quick_suggestions(
+        self,
+        message_type: str,
+        context: Dict[str, Any] = None,
+        count: int = 3,
+        seed: Any = None
+    ) -> List[str]:
         """
-        Get quick suggestions for common message types
+        Get quick suggestions for common message types, personalized from
+        ``context`` (name, interests, user_interests, region, topics).
+        A ``seed`` makes the draw repeatable.
         """
-        suggestions_map = {
-            "opener": [
-                "Hi! I noticed you're into [shared interest]. What got you started with that?",
-                "Your profile made me smile! What's the story behind [specific detail]?",
-                "I love your [photo/interest]. Have you always been into that?"
-            ],
-            "response": [
-                "That's so interesting! Tell me more about that.",
-                "I can relate to that! What was that experience like for you?",
-                "That sounds amazing! What's your favorite part about it?"
-            ],
-            "follow_up": [
-                "What made you choose that specifically?",
-                "How long have you been doing that?",
-                "What's the most challenging part about it?"
-            ],
-            "closing": [
-                "I'd love to hear more about this over coffee sometime!",
-                "This has been such a great conversation! Would you like to continue it in person?",
-                "I feel like we have so much more to talk about. How about we grab a drink?"
-            ]
-        }
-        
-        return suggestions_map.get(message_type, [
-            "Ask an open-ended question",
-            "Share something personal",
-            "Show genuine interest in their response"
-        ])
\ No newline at end of file
+        return self.quick_index.suggest(message_type, context, count, seed)
@@ -0,0 +1,153 @@
+"""
+Lightweight per-request tracing
+
+Each HTTP request gets a Trace held in a context variable. Code on the
+request path times its stages with ``span(name)``. Request parsing and
+validation, and response serialization, are timed by the route class and
+the middleware. At the end of the request the stage durations go to the
+stage histogram. They are also returned in a ``Server-Timing`` header, so a
+single slow request can be inspected from the client. Stages that run
+concurrently within one request (batch items) are summed.
+"""
+
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi.routing import APIRoute
+
+from app.services.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, STAGE_SECONDS, LOOP_LAG_SECONDS
+
+_trace: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.handler_end: Optional[float] = None
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def span(name: str):
+    """Time a block and add it to the current request's trace, if any"""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - start)
+
+
+def _traced_endpoint(endpoint):
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        trace = _trace.get()
+        if trace is not None:
+            # Everything before the endpoint runs: body read, parsing, validation
+            trace.add("validation", time.perf_counter() - trace.start)
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            if trace is not None:
+                trace.handler_end = time.perf_counter()
+    return wrapper
+
+
+class TracedRoute(APIRoute):
+    """Route class that marks where validation ends and serialization begins"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = _traced_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class TracingMiddleware:
+    """ASGI middleware recording request latency, in-flight requests and stage timings"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = _trace.set(trace)
+        status = 500
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace.handler_end is not None:
+                    trace.add("serialization", time.perf_counter() - trace.handler_end)
+                if trace.stages:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing().encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _trace.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - trace.start,
+                method=scope["method"],
+                route=route,
+                status=status
+            )
+            for stage, seconds in trace.stages.items():
+                STAGE_SECONDS.observe(seconds, route=route, stage=stage)
+
+
+class EventLoopMonitor:
+    """Samples event-loop lag: how late a periodic sleep wakes up"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, loop.time() - start - self.interval)
+            LOOP_LAG_SECONDS.observe(self.last_lag)
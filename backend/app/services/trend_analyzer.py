@@ -2,74 +2,78 @@
 Trend analysis service for regional dating patterns
 """
 
-import openai
-from typing import List, Dict, Any
-from app.config import settings
+from typing import List, Dict, Any, Tuple, Union
+from app.services.llm_gateway import LLMGateway, Completion, get_llm_gateway
+from app.services.single_flight import coalesced
+from app.services.structured_output import complete_structured
+from app.services.trend_store import TrendStore
+from app.services.prompts import TREND_ANALYSIS, format_context
+from app.services.metrics import record_fallback
+from app.services.model_router import ModelRouter, get_model_router
+from app.services.rate_limiter import LoadShedError
+from app.models.schemas import TrendRecord
+
+STORE_FIELDS = ("popular_topics", "communication_style", "profile_preferences", "success_factors", "detailed_analysis")
+
+SERVICE = "trend_analyzer"
+
+
+def describe_style(style: Union[str, Dict[str, str]]) -> str:
+    """
+    The analyze_trends response carries communication_style as one sentence;
+    trend records keep it as a dict (still served whole by get_communication_style)
+    """
+    if not isinstance(style, dict):
+        return str(style)
+    details = ", ".join(f"{key.replace('_', ' ')}: {value}" for key, value in style.items() if key != "tone" and value)
+    tone = style.get("tone", "")
+    if tone and details:
+        return f"{tone} ({details})"
+    return tone or details
+
+
+def response_trends(record: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """Shape a trend record like the other analyze_trends results"""
+    trends = {field: record[field] for field in STORE_FIELDS if field in record}
+    if "communication_style" in trends:
+        trends["communication_style"] = describe_style(trends["communication_style"])
+    trends["source"] = source
+    return trends
+
 
 class TrendAnalyzer:
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.openai_api_key)
+    def __init__(self, gateway: LLMGateway = None, store: TrendStore = None, router: ModelRouter = None):
+        self.gateway = gateway or get_llm_gateway()
+        self.store = store or TrendStore()
+        self.router = router or get_model_router()
     
+    @coalesced
     async def analyze_trends(
         self,
         region: str,
         age_range: tuple = None,
-        preferences: Dict[str, Any] = None
+        preferences: Dict[str, Any] = None,
+        use_model: bool = True
     ) -> Dict[str, Any]:
         """
-        Analyze regional dating trends and preferences
+        Analyze regional dating trends and preferences.
+        Regions present in the trend store are answered from it without a
+        model call; unknown regions fall back to the model, or to generic
+        trends with ``use_model=False``.
         """
+        record = self.store.lookup(region, age_range)
+        if record is not None:
+            return response_trends(record, "trend_store")
+        
         try:
-            context = f"Region: {region}"
-            if age_range:
-                context += f", Age range: {age_range[0]}-{age_range[1]}"
-            if preferences:
-                context += f", Preferences: {preferences}"
-            
-            system_prompt = f"""You are a dating trends analyst. Analyze dating trends for the region and provide insights on:
-            1. Popular conversation topics
-            2. Common interests and hobbies
-            3. Communication styles
-            4. Profile preferences
-            5. Dating app usage patterns
-            
-            Focus on actionable insights for users in {region}."""
-            
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": context}
-                ],
-                max_tokens=400,
-                temperature=0.8
-            )
-            
-            trends_text = response.choices[0].message.content
-            
-            return {
-                "popular_topics": [
-                    "Local events and activities",
-                    "Food and dining",
-                    "Travel and adventures",
-                    "Career and ambitions"
-                ],
-                "communication_style": "Direct and friendly",
-                "profile_preferences": {
-                    "bio_length": "Medium (2-3 sentences)",
-                    "photo_style": "Casual and authentic",
-                    "interests": "Outdoor activities, food, travel"
-                },
-                "success_factors": [
-                    "Being genuine and authentic",
-                    "Showing local knowledge",
-                    "Asking about specific interests"
-                ],
-                "detailed_analysis": trends_text
-            }
+            if not use_model:
+                raise LoadShedError("Request not admitted by the rate limiter, serving local results")
+            trend_record, _ = await self.generate_trend_record(region, age_range, preferences)
+            return response_trends(trend_record.model_dump(), "model")
             
         except Exception as e:
             # Fallback trend data
+            record_fallback(SERVICE, e)
             return {
                 "popular_topics": [
                     "Hobbies and interests",
@@ -92,8 +96,43 @@ class TrendAnalyzer:
                 "error": str(e)
             }
     
+    async def generate_trend_record(
+        self,
+        region: str,
+        age_range: tuple = None,
+        preferences: Dict[str, Any] = None,
+        model: str = None,
+        cache: bool = True
+    ) -> Tuple[TrendRecord, Completion]:
+        """
+        Ask the model for a full trend record. Used for regions missing from
+        the trend store and by the offline refresh job. ``model`` overrides
+        the routed model (and disables escalation).
+        """
+        route = self.router.route("trend_analysis")
+        context = format_context([
+            ("Region", region),
+            ("Age range", f"{age_range[0]}-{age_range[1]}" if age_range else None),
+            ("Preferences", preferences)
+        ])
+        
+        return await complete_structured(
+            self.gateway,
+            TrendRecord,
+            model=model or route.model,
+            escalation=None if model else route.escalation,
+            messages=TREND_ANALYSIS.messages(context=context),
+            max_tokens=600,
+            temperature=0.8,
+            cache=cache,
+            service=SERVICE
+        )
+    
     def get_trending_topics(self, region: str) -> List[str]:
         """Get trending conversation topics for a region"""
+        record = self.store.lookup_or_default(region)
+        if record and "trending_topics" in record:
+            return record["trending_topics"]
         return [
             "Local events and festivals",
             "New restaurants and cafes",
@@ -104,6 +143,9 @@ class TrendAnalyzer:
     
     def get_popular_photo_types(self, region: str) -> List[str]:
         """Get popular photo types for a region"""
+        record = self.store.lookup_or_default(region)
+        if record and "popular_photo_types" in record:
+            return record["popular_photo_types"]
         return [
             "Outdoor adventure photos",
             "Food and dining photos",
@@ -114,6 +156,9 @@ class TrendAnalyzer:
     
     def get_communication_style(self, region: str) -> Dict[str, str]:
         """Get communication style preferences for a region"""
+        record = self.store.lookup_or_default(region)
+        if record and "communication_style" in record:
+            return record["communication_style"]
         return {
             "tone": "Friendly and approachable",
             "length": "Medium length messages",
@@ -0,0 +1,167 @@
+"""
+Precompiled regional trend store
+
+Trend data is loaded from a compact on-disk file (JSON, or msgpack when the
+file ends in ``.msgpack``) and indexed by (region, age bucket) so lookups are
+a single dict access. The file is re-checked at most every
+``reload_interval`` seconds and swapped in atomically when it changes, so
+readers always see either the old or the new index, never a partial one.
+
+With ``shared_dir`` set (multi-worker deployments), the index is packed into
+a file there and memory-mapped. All workers then share one copy and decode
+only the records they look up (see shared_data).
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Dict, Any, Optional, Tuple, Union
+
+from app.config import settings
+from app.services.shared_data import MappedRecords, open_shared_records, shared_stats
+
+logger = logging.getLogger(__name__)
+
+AGE_BUCKETS = ((18, 24, "18-24"), (25, 34, "25-34"), (35, 44, "35-44"), (45, 54, "45-54"), (55, 200, "55+"))
+ALL_AGES = "all"
+
+
+def normalize_region(region: str) -> str:
+    return " ".join(str(region).lower().split())
+
+
+def age_bucket(age_range: Optional[tuple]) -> str:
+    """Map an (min, max) age range to the bucket containing its midpoint"""
+    if not age_range or len(age_range) < 2:
+        return ALL_AGES
+    try:
+        midpoint = (float(age_range[0]) + float(age_range[1])) / 2
+    except (TypeError, ValueError):
+        return ALL_AGES
+    for low, high, name in AGE_BUCKETS:
+        if low <= midpoint <= high + 0.99:
+            return name
+    return ALL_AGES
+
+
+def record_key(region: str, bucket: str) -> str:
+    return f"{region}|{bucket}"
+
+
+def load_trend_file(path: str) -> Dict[str, Any]:
+    if path.endswith(".msgpack"):
+        import msgpack
+
+        with open(path, "rb") as f:
+            return msgpack.unpackb(f.read(), raw=False)
+    with open(path, "rb") as f:
+        return json.loads(f.read())
+
+
+def dump_trend_file(path: str, data: Dict[str, Any]) -> bytes:
+    """Encode ``data`` in the format ``load_trend_file`` expects for ``path``"""
+    if path.endswith(".msgpack"):
+        import msgpack
+
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
+class TrendStore:
+    def __init__(self, path: str = None, reload_interval: float = None, shared_dir: str = None):
+        self.path = path or settings.trend_data_path
+        self.reload_interval = reload_interval if reload_interval is not None else settings.trend_reload_interval_seconds
+        self.shared_dir = shared_dir if shared_dir is not None else settings.shared_data_dir
+        self._index: Union[Dict[str, Dict[str, Any]], MappedRecords] = {}
+        self._default: Optional[Dict[str, Any]] = None
+        self._signature = None
+        self._next_check = 0.0
+        self.version = None
+        self.loaded_at: Optional[float] = None
+        self.reload()
+
+    def reload(self) -> bool:
+        """Load the file if it changed on disk; returns True when swapped"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._signature is not None:
+                logger.warning(f"Trend data file disappeared: {self.path}")
+            return False
+
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if signature == self._signature:
+            return False
+
+        try:
+            if self.shared_dir:
+                index = open_shared_records(self.path, signature, self.shared_dir, self._build_records)
+                default, version = index.meta.get("default"), index.meta.get("version")
+            else:
+                index, meta = self._build_records()
+                default, version = meta.get("default"), meta.get("version")
+        except Exception as e:
+            # Keep serving the previous index if a write is in progress or the file is bad
+            logger.error(f"Failed to load trend data from {self.path}: {str(e)}")
+            return False
+
+        # Single reference assignments, so concurrent readers never see a partial index
+        self._index = index
+        self._default = default
+        self.version = version
+        self._signature = signature
+        self.loaded_at = time.time()
+        logger.info(f"Loaded trend data for {len(index)} region/age entries from {self.path}")
+        return True
+
+    @property
+    def updated_at(self) -> Optional[float]:
+        """Modification time of the loaded file; the same in every worker, unlike loaded_at"""
+        return self._signature[0] / 1e9 if self._signature else None
+
+    def data_version(self) -> Optional[float]:
+        """Reload if due, then return updated_at; used to key caches derived from the data"""
+        self._maybe_reload()
+        return self.updated_at
+
+    def _build_records(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Any]]:
+        """Index the source file: records keyed by region|bucket, plus default and version"""
+        data = load_trend_file(self.path)
+        index = {}
+        for region, buckets in data.get("regions", {}).items():
+            for bucket, record in buckets.items():
+                index[record_key(normalize_region(region), bucket)] = record
+        return index, {"default": data.get("default"), "version": data.get("version")}
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            self.reload()
+
+    def lookup(self, region: str, age_range: tuple = None) -> Optional[Dict[str, Any]]:
+        """
+        Most specific record for the region and age range: the exact age
+        bucket, then the region's all-ages record. None if the region is unknown.
+        """
+        self._maybe_reload()
+        key = normalize_region(region)
+        bucket = age_bucket(age_range)
+        record = self._index.get(record_key(key, bucket))
+        if record is None and bucket != ALL_AGES:
+            record = self._index.get(record_key(key, ALL_AGES))
+        return record
+
+    def lookup_or_default(self, region: str, age_range: tuple = None) -> Optional[Dict[str, Any]]:
+        record = self.lookup(region, age_range)
+        return record if record is not None else self._default
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "version": self.version,
+            "entries": len(self._index),
+            "loaded_at": self.loaded_at,
+            "shared": shared_stats(self._index) if isinstance(self._index, MappedRecords) else None
+        }
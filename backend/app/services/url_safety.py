@@ -0,0 +1,143 @@
+"""
+Checks for URLs the server fetches or posts to on a client's behalf
+
+Photo URLs and job callbacks come from clients. Before connecting, the host
+must pass the configured allowlist and every address it resolves to must be
+public. Loopback, private, link-local (including cloud metadata at
+169.254.169.254), reserved and multicast ranges are refused. Callers that
+follow redirects check each hop again.
+
+Checking the name is not enough on its own: the HTTP client would resolve it
+again when connecting, and a rebinding DNS server can answer with a private
+address the second time. Clients from ``pinned_client`` therefore resolve
+each host themselves, check the addresses and connect to exactly those. TLS
+still verifies the certificate against, and sends SNI for, the hostname.
+"""
+
+import asyncio
+import ipaddress
+import socket
+from typing import Iterable, List, Optional, Set
+from urllib.parse import urlsplit
+
+import httpcore
+import httpx
+
+
+class UnsafeURLError(ValueError):
+    """The URL is malformed, not on the allowlist, or points at a non-public address"""
+
+
+def parse_hosts(value: str) -> Set[str]:
+    """Comma-separated host list; an entry starting with '.' also matches subdomains"""
+    return {host.strip().lower() for host in (value or "").split(",") if host.strip()}
+
+
+def host_allowed(host: str, allowed: Set[str]) -> bool:
+    host = host.lower().rstrip(".")
+    for entry in allowed:
+        if entry.startswith("."):
+            if host == entry[1:] or host.endswith(entry):
+                return True
+        elif host == entry:
+            return True
+    return False
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_url(url: str, allowed_hosts: Set[str], require_allowlist: bool = False) -> str:
+    """
+    Validate ``url`` and resolve its host; returns the hostname. An empty
+    allowlist admits any public host unless ``require_allowlist`` is set.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise UnsafeURLError("URL must be an absolute http or https URL")
+    host = parts.hostname
+    if allowed_hosts:
+        if not host_allowed(host, allowed_hosts):
+            raise UnsafeURLError(f"host {host} is not allowed")
+    elif require_allowlist:
+        raise UnsafeURLError("no hosts are allowed")
+
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise UnsafeURLError("URL has an invalid port")
+    await resolve_public(host, port)
+    return host
+
+
+async def resolve_public(host: str, port: int) -> List[str]:
+    """Addresses of ``host``, refusing the host if any of them is not public"""
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError):
+        raise UnsafeURLError(f"host {host} cannot be resolved")
+    if not infos or not all(is_public_address(info[4][0]) for info in infos):
+        raise UnsafeURLError(f"host {host} resolves to a non-public address")
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+
+class PinnedNetworkBackend(httpcore.AsyncNetworkBackend):
+    """Connects only to addresses it has just resolved and checked itself"""
+
+    def __init__(self):
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None,
+        local_address: Optional[str] = None,
+        socket_options: Optional[Iterable] = None
+    ) -> httpcore.AsyncNetworkStream:
+        error: Optional[Exception] = None
+        for address in await resolve_public(host, port):
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None):
+        raise UnsafeURLError("unix sockets are not allowed")
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class PinnedTransport(httpx.AsyncHTTPTransport):
+    """httpx transport whose connections go through PinnedNetworkBackend"""
+
+    def __init__(self, limits: httpx.Limits = httpx.Limits()):
+        super().__init__(trust_env=False, limits=limits)
+        # httpx has no public hook for the network backend, so the pool is rebuilt with one
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(trust_env=False),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=PinnedNetworkBackend()
+        )
+
+
+def pinned_client(**kwargs) -> httpx.AsyncClient:
+    """
+    AsyncClient for client-supplied URLs. Environment proxies are ignored,
+    since a proxy would connect to whatever the name resolves to.
+    """
+    return httpx.AsyncClient(transport=PinnedTransport(), trust_env=False, **kwargs)
+
+
+def redirect_target(base: str, location: Optional[str]) -> str:
+    if not location:
+        raise UnsafeURLError("redirect without a Location header")
+    return str(httpx.URL(base).join(location))
@@ -0,0 +1,183 @@
+"""
+Mock OpenAI-compatible chat completions server for benchmarks
+
+Answers /v1/chat/completions (plain and streaming) after a delay drawn from a
+configurable latency distribution, fails a configurable fraction of calls,
+and returns valid structured replies for each service prompt. It recognizes
+the prompt by its system message, so the app's validation and repair paths
+behave as they would against the real API.
+
+Usage:
+    python -m benchmarks.mock_openai --port 9100 --latency lognormal:0.4,0.5 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from typing import Dict, Any, Callable
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.prompts import (
+    CONVERSATION_ANALYSIS,
+    CONVERSATION_SUMMARY,
+    SUGGESTIONS,
+    PROFILE_OPTIMIZATION,
+    BIO_NARRATIVE,
+    TREND_ANALYSIS
+)
+
+STRUCTURED_REPLIES = {
+    CONVERSATION_ANALYSIS.system: {
+        "summary": "The conversation flows well with balanced questions and shared interests.",
+        "strengths": ["Asks open questions", "Builds on shared interests"],
+        "improvements": ["Share a bit more about yourself"],
+        "suggestions": ["Suggest meeting for a hike", "Ask about their favorite trail"]
+    },
+    SUGGESTIONS.system: {
+        "suggestions": [
+            {"type": "question", "suggestion": "What got you into hiking?", "reason": "Builds on a shared interest"},
+            {"type": "topic", "suggestion": "Talk about favorite weekend trips", "reason": "Easy for both to share"},
+            {"type": "engagement", "suggestion": "Mention a trail you want to try", "reason": "Opens the door to a plan"}
+        ]
+    },
+    PROFILE_OPTIMIZATION.system: {
+        "summary": "A friendly profile that would benefit from more specific details.",
+        "bio_suggestions": ["Name one concrete hobby", "Add a conversation hook", "Keep it to three sentences"],
+        "photo_suggestions": ["Lead with a clear smiling photo", "Add an activity photo", "Include one full-body photo"]
+    },
+    BIO_NARRATIVE.system: {
+        "summary": "Specific hobbies and a closing question make this bio easy to reply to.",
+        "bio_suggestions": ["Name the trail you want to try next", "Trim the second sentence"]
+    },
+    TREND_ANALYSIS.system: {
+        "popular_topics": ["Local events", "Food and dining", "Travel", "Career and goals"],
+        "trending_topics": ["Run clubs", "New restaurants", "Live music", "Weekend trips", "Art walks"],
+        "popular_photo_types": ["Outdoor photos", "Food photos", "Travel photos", "Hobby photos", "Group photos"],
+        "communication_style": {"tone": "Friendly", "length": "Medium", "emoji_usage": "Moderate", "formality": "Casual"},
+        "profile_preferences": {"bio_length": "2-3 sentences", "photo_style": "Clear and recent", "interests": "Specific"},
+        "success_factors": ["Be specific", "Ask good questions", "Suggest a concrete plan"],
+        "detailed_analysis": "Mock trends for benchmarking."
+    }
+}
+
+TEXT_REPLIES = {
+    CONVERSATION_SUMMARY.system: "They bonded over hiking and travel and are warming up to a first date."
+}
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Build a latency sampler from ``fixed:S``, ``uniform:LOW,HIGH``,
+    ``lognormal:MEDIAN,SIGMA`` or ``exponential:MEAN`` (seconds)
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    if kind == "exponential":
+        return lambda: random.expovariate(1.0 / values[0])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+def create_app(latency: str = "fixed:0.2", error_rate: float = 0.0, stream_chunk_delay: float = 0.005) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI")
+    sample_latency = parse_latency(latency)
+    stats = {"calls": 0, "errors": 0, "streams": 0, "prompt_chars": 0}
+
+    def reply_for(body: Dict[str, Any]) -> str:
+        messages = body.get("messages") or []
+        system = messages[0].get("content", "") if messages and messages[0].get("role") == "system" else ""
+        if body.get("response_format"):
+            return json.dumps(STRUCTURED_REPLIES.get(system, {"result": "ok"}))
+        return TEXT_REPLIES.get(system, "Mock reply from the benchmark server.")
+
+    def usage(body: Dict[str, Any], text: str) -> Dict[str, int]:
+        prompt = sum(len(str(msg.get("content") or "")) for msg in body.get("messages") or []) // 4
+        return {"prompt_tokens": prompt, "completion_tokens": len(text) // 4, "total_tokens": prompt + len(text) // 4}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["calls"] += 1
+        stats["prompt_chars"] += sum(len(str(msg.get("content") or "")) for msg in body.get("messages") or [])
+        await asyncio.sleep(sample_latency())
+
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "mock upstream error", "type": "server_error"}}, status_code=500)
+
+        text = reply_for(body)
+        headers = {
+            "x-ratelimit-limit-requests": "10000",
+            "x-ratelimit-remaining-requests": "9999",
+            "x-ratelimit-limit-tokens": "2000000",
+            "x-ratelimit-remaining-tokens": "1999000"
+        }
+        created = int(time.time())
+
+        if body.get("stream"):
+            stats["streams"] += 1
+
+            async def chunks():
+                pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+                for piece in pieces:
+                    chunk = {
+                        "id": "mock", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    if stream_chunk_delay:
+                        await asyncio.sleep(stream_chunk_delay)
+                chunk = {
+                    "id": "mock", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream", headers=headers)
+
+        return JSONResponse({
+            "id": "mock",
+            "object": "chat.completion",
+            "created": created,
+            "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage(body, text)
+        }, headers=headers)
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="fixed:0.2", help="fixed:S, uniform:LOW,HIGH, lognormal:MEDIAN,SIGMA or exponential:MEAN")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with a 500")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    uvicorn.run(create_app(args.latency, args.error_rate), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+"""
+Benchmark suite for the API
+
+Starts the mock model server in a subprocess and points the app at it. It
+then drives each endpoint scenario in-process through an ASGI transport,
+using a fixed number of concurrent workers. For each scenario it reports:
+- throughput
+- latency percentiles (and time to first byte for streams against --url;
+  the in-process transport buffers whole responses)
+- event-loop lag
+- memory
+- the number of upstream model calls
+
+The report is written as JSON so runs can be compared with ``--compare``.
+
+Usage (from backend/):
+    python -m benchmarks.run
+    python -m benchmarks.run --concurrency 64 --requests 500 --latency lognormal:0.4,0.6 --error-rate 0.02
+    python -m benchmarks.run --scenarios get-suggestions analyze-trends --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+MESSAGES = [
+    ("user", "Hey! I saw you like hiking. What's your favorite trail around here?"),
+    ("assistant", "Hi! I love the coastal trail, the views at sunset are amazing. Do you hike often?"),
+    ("user", "Most weekends! I'm trying to do every trail in the state park this year."),
+    ("assistant", "That's ambitious, I like it 😄 How many have you done so far?"),
+    ("user", "Twelve out of thirty. Maybe you could show me the coastal one sometime?"),
+    ("assistant", "I'd love that! Saturday morning could work if you're free.")
+]
+
+
+def conversation(i: int, length: int = 6) -> List[Dict[str, str]]:
+    turns = [MESSAGES[n % len(MESSAGES)] for n in range(length)]
+    return [{"role": role, "content": f"{content} ({i})"} for role, content in turns]
+
+
+def _payload(vary: bool) -> Callable[[int], int]:
+    # Identical payloads exercise the caches and request coalescing instead
+    return (lambda i: i) if vary else (lambda i: 0)
+
+
+class Scenario:
+    def __init__(self, name: str, method: str, path: Callable[[int], str], body: Callable[[int], Any] = None, stream: bool = False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.stream = stream
+
+
+def build_scenarios(vary: bool) -> List[Scenario]:
+    key = _payload(vary)
+    regions = ["new york", "london", "austin", "chicago"]
+    return [
+        Scenario("root", "GET", lambda i: "/"),
+        Scenario("health", "GET", lambda i: "/health"),
+        Scenario("metrics", "GET", lambda i: "/metrics"),
+        Scenario("analyze-conversation", "POST", lambda i: "/analyze-conversation", lambda i: {
+            "conversation_id": f"bench-{key(i)}",
+            "messages": conversation(key(i))
+        }),
+        Scenario("analyze-conversation-local", "POST", lambda i: "/analyze-conversation", lambda i: {
+            "conversation_id": f"bench-{key(i)}",
+            "messages": conversation(key(i), 30),
+            "mode": "local"
+        }),
+        Scenario("analyze-conversation-incremental", "POST", lambda i: "/analyze-conversation", lambda i: {
+            "conversation_id": f"bench-inc-{key(i) % 20}",
+            "messages": conversation(key(i) % 20, 6 + key(i) // 20),
+            "incremental": True
+        }),
+        Scenario("analyze-conversations-batch", "POST", lambda i: "/analyze-conversations/batch", lambda i: {
+            "items": [{"conversation_id": f"bench-{key(i)}-{n}", "messages": conversation(key(i) * 10 + n)} for n in range(10)]
+        }, stream=True),
+        Scenario("analyze-conversation-stream", "POST", lambda i: "/analyze-conversation/stream", lambda i: {
+            "conversation_id": f"bench-{key(i)}",
+            "messages": conversation(key(i))
+        }, stream=True),
+        Scenario("get-suggestions", "POST", lambda i: "/get-suggestions", lambda i: {
+            "conversation_id": f"bench-{key(i)}",
+            "conversation_context": {"last_message": f"I love hiking ({key(i)})", "topics": ["hiking", "travel"]},
+            "user_preferences": {"style": "playful"}
+        }),
+        Scenario("get-suggestions-stream", "POST", lambda i: "/get-suggestions/stream", lambda i: {
+            "conversation_id": f"bench-{key(i)}",
+            "conversation_context": {"last_message": f"I love hiking ({key(i)})"}
+        }, stream=True),
+        Scenario("optimize-profile", "POST", lambda i: "/optimize-profile", lambda i: {
+            "user_id": f"bench-user-{key(i)}",
+            "photos": ["a.jpg", "b.jpg", "c.jpg"],
+            "bio": f"Hiker, home cook and amateur photographer ({key(i)}).",
+            "preferences": {"age_range": [25, 35], "interests": ["hiking", "cooking"]},
+            "region": "new york"
+        }),
+        Scenario("analyze-trends", "POST", lambda i: "/analyze-trends", lambda i: {
+            "region": regions[key(i) % len(regions)],
+            "age_range": [25, 34]
+        }),
+        Scenario("analyze-trends-unknown-region", "POST", lambda i: "/analyze-trends", lambda i: {
+            "region": f"bench town {key(i)}"
+        }),
+        Scenario("history", "GET", lambda i: f"/history/bench-{key(i) % 50}"),
+        Scenario("quick-suggestions", "GET", lambda i: ["/quick-suggestions/opener", "/quick-suggestions/closing"][i % 2]),
+        Scenario("trends", "GET", lambda i: f"/trends/{regions[i % len(regions)]}")
+    ]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """Latency summary in milliseconds"""
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+    return {
+        "mean": ms(sum(values) / len(values)) if values else None,
+        "p50": ms(percentile(values, 0.50)),
+        "p95": ms(percentile(values, 0.95)),
+        "p99": ms(percentile(values, 0.99)),
+        "max": ms(max(values)) if values else None
+    }
+
+
+def rss_mb() -> float:
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up, i.e. how long the loop was blocked"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def reset(self):
+        self.samples = []
+
+
+async def run_request(client: httpx.AsyncClient, scenario: Scenario, i: int, measure_ttfb: bool = False) -> Dict[str, Any]:
+    body = scenario.body(i) if scenario.body else None
+    start = time.perf_counter()
+    ttfb = None
+    try:
+        if scenario.stream:
+            async with client.stream(scenario.method, scenario.path(i), json=body) as response:
+                async for _ in response.aiter_bytes():
+                    if ttfb is None and measure_ttfb:
+                        ttfb = time.perf_counter() - start
+                status = response.status_code
+        else:
+            response = await client.request(scenario.method, scenario.path(i), json=body)
+            status = response.status_code
+        error = None if status < 400 else f"HTTP {status}"
+    except Exception as e:
+        error = type(e).__name__
+    return {"latency": time.perf_counter() - start, "ttfb": ttfb, "error": error}
+
+
+async def upstream_calls(mock_url: Optional[str]) -> Optional[int]:
+    if mock_url is None:
+        return None
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{mock_url}/stats")).json()["calls"]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    monitor: Optional[LoopLagMonitor],
+    mock_url: Optional[str],
+    measure_ttfb: bool = False
+) -> Dict[str, Any]:
+    for i in range(warmup):
+        await run_request(client, scenario, requests + i)
+
+    results: List[Dict[str, Any]] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            results.append(await run_request(client, scenario, i, measure_ttfb))
+
+    calls_before = await upstream_calls(mock_url)
+    rss_before = rss_mb()
+    if monitor is not None:
+        monitor.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    calls_after = await upstream_calls(mock_url)
+
+    errors: Dict[str, int] = {}
+    for result in results:
+        if result["error"]:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    ttfbs = [result["ttfb"] for result in results if result["ttfb"] is not None]
+
+    return {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 1) if elapsed else None,
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / len(results), 4) if results else 0.0,
+        "latency_ms": summarize([result["latency"] for result in results]),
+        "ttfb_ms": summarize(ttfbs) if ttfbs else None,
+        "loop_lag_ms": summarize(monitor.samples) if monitor is not None else None,
+        "memory_mb": {"rss_before": rss_before, "rss_after": rss_mb(), "peak": peak_rss_mb()},
+        "upstream_calls": calls_after - calls_before if calls_before is not None else None
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(port: int, latency: str, error_rate: float, seed: Optional[int]) -> subprocess.Popen:
+    command = [sys.executable, "-m", "benchmarks.mock_openai", "--port", str(port), "--latency", latency, "--error-rate", str(error_rate)]
+    if seed is not None:
+        command += ["--seed", str(seed)]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("mock server exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=0.5)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("mock server did not start")
+
+
+def configure_environment(args, mock_url: str, workdir: str):
+    """Point the app at the mock server; must run before the app is imported"""
+    os.environ["OPENAI_BASE_URL"] = f"{mock_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'benchmark.db')}")
+    if not args.rate_limits:
+        os.environ["RATE_LIMIT_ENABLED"] = "False"
+    if args.hedging:
+        os.environ["LLM_HEDGING_ENABLED"] = "True"
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\nCompared with {baseline.get('started_at', 'baseline')}:")
+    print(f"{'scenario':<34} {'rps':>16} {'p95 ms':>20} {'p99 ms':>20}")
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+
+        def delta(new, old):
+            if new is None or not old:
+                return f"{new}"
+            return f"{new} ({(new - old) / old * 100:+.0f}%)"
+
+        print(
+            f"{name:<34} {delta(current['throughput_rps'], previous['throughput_rps']):>16} "
+            f"{delta(current['latency_ms']['p95'], previous['latency_ms']['p95']):>20} "
+            f"{delta(current['latency_ms']['p99'], previous['latency_ms']['p99']):>20}"
+        )
+
+
+async def run_suite(args, scenarios: List[Scenario], mock_url: Optional[str]) -> Dict[str, Any]:
+    monitor = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        app_main = None
+    else:
+        app_main = importlib.import_module("app.main")
+        await app_main.startup()
+        monitor = LoopLagMonitor()
+        monitor.start()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app_main.app),
+            base_url="http://benchmark",
+            timeout=args.timeout
+        )
+
+    results = {}
+    try:
+        for scenario in scenarios:
+            results[scenario.name] = await run_scenario(
+                client, scenario, args.requests, args.concurrency, args.warmup, monitor, mock_url,
+                measure_ttfb=bool(args.url)
+            )
+            summary = results[scenario.name]
+            print(
+                f"{scenario.name:<34} {summary['throughput_rps']:>8} rps  "
+                f"p50 {summary['latency_ms']['p50']:>8} ms  p95 {summary['latency_ms']['p95']:>8} ms  "
+                f"p99 {summary['latency_ms']['p99']:>8} ms  errors {summary['error_rate']:.1%}"
+            )
+    finally:
+        await client.aclose()
+        if monitor is not None:
+            await monitor.stop()
+        if app_main is not None:
+            await app_main.shutdown()
+    return results
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the API against a mock model server")
+    parser.add_argument("--scenarios", nargs="*", help="scenarios to run (default: all)")
+    parser.add_argument("--list", action="store_true", help="list scenarios and exit")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=5, help="unrecorded requests before each scenario")
+    parser.add_argument("--latency", default="lognormal:0.3,0.5", help="mock model latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock model calls that fail")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat-payloads", action="store_true", help="send identical payloads to exercise caching")
+    parser.add_argument("--rate-limits", action="store_true", help="keep rate limiting on (off by default)")
+    parser.add_argument("--hedging", action="store_true", help="enable hedged model requests")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--url", default=None, help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--output", default=None, help="report file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="earlier report to compare against")
+    args = parser.parse_args(argv)
+
+    scenarios = build_scenarios(vary=not args.repeat_payloads)
+    if args.list:
+        for scenario in scenarios:
+            print(scenario.name)
+        return 0
+    if args.scenarios:
+        unknown = set(args.scenarios) - {scenario.name for scenario in scenarios}
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.scenarios]
+
+    mock = None
+    mock_url = None
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    if not args.url:
+        port = free_port()
+        mock = start_mock_server(port, args.latency, args.error_rate, args.seed)
+        mock_url = f"http://127.0.0.1:{port}"
+        configure_environment(args, mock_url, workdir)
+
+    started_at = datetime.utcnow().isoformat() + "Z"
+    try:
+        results = asyncio.run(run_suite(args, scenarios, mock_url))
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    report = {
+        "started_at": started_at,
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "latency": None if args.url else args.latency,
+            "error_rate": None if args.url else args.error_rate,
+            "repeat_payloads": args.repeat_payloads,
+            "rate_limits": args.rate_limits,
+            "hedging": args.hedging,
+            "target": args.url or "in-process"
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "git_commit": _git_commit()
+        },
+        "scenarios": results
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
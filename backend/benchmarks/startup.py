@@ -0,0 +1,140 @@
+"""
+Cold-start and memory benchmark for the pre-forked server
+
+For each worker count, launches ``python -m app.serve`` on a free port and
+reports:
+- time until the first response (cold start)
+- time until every worker has answered /health
+- RSS and PSS per worker and for the launcher plus workers, read from
+  /proc/<pid>/smaps_rollup (Linux); the photo-analysis pools below the
+  workers are reported separately
+
+PSS splits shared pages among the processes that map them. Its total is the
+figure that matters when packing workers onto a host.
+
+Usage (from backend/):
+    python -m benchmarks.startup --workers 1 4
+    python -m benchmarks.startup --workers 4 --output /tmp/startup.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Dict, Any
+
+import httpx
+
+from benchmarks.run import BACKEND_DIR, free_port
+
+
+def smaps(pid: int) -> Dict[str, float]:
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    values[name.lower() + "_mb"] = round(int(rest.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return values
+
+
+def children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def measure(workers: int, timeout: float) -> Dict[str, Any]:
+    port = free_port()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"),
+        HISTORY_ENABLED="False",
+        LOG_LEVEL="WARNING"
+    )
+    shared_dir = tempfile.mkdtemp(prefix="startup-")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port), "--shared-dir", shared_dir],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    first_response = None
+    all_ready = None
+    seen = {}
+    try:
+        # A new connection per request, so the workers' accept loops share them out
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=2.0, headers={"Connection": "close"}) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    health = client.get("/health").json()
+                except httpx.HTTPError:
+                    time.sleep(0.01)
+                    continue
+                now = time.perf_counter()
+                first_response = first_response or now - started
+                seen[health["process"]["pid"]] = health["startup"]
+                if len(seen) >= workers:
+                    all_ready = now - started
+                    break
+        time.sleep(0.5)
+        # The workers are the launcher's direct children; photo pools hang below them
+        worker_pids = children(server.pid)
+        processes = {pid: smaps(pid) for pid in [server.pid] + worker_pids}
+        pool = [smaps(grandchild) for pid in worker_pids for grandchild in children(pid)]
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {
+        "workers": workers,
+        "first_response_seconds": round(first_response, 3) if first_response else None,
+        "all_ready_seconds": round(all_ready, 3) if all_ready else None,
+        "worker_startup": list(seen.values()),
+        "parent": processes.get(server.pid, {}),
+        "workers_memory": [processes[pid] for pid in worker_pids],
+        "photo_pool_pss_mb": round(sum(p.get("pss_mb", 0) for p in pool), 1),
+        "total_rss_mb": round(sum(p.get("rss_mb", 0) for p in processes.values()), 1),
+        "total_pss_mb": round(sum(p.get("pss_mb", 0) for p in processes.values()), 1)
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Measure server cold start and per-worker memory")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(
+        f"{'workers':>7} {'first ms':>9} {'all ready ms':>13} {'worker RSS MB':>14} "
+        f"{'worker PSS MB':>14} {'total PSS MB':>13} {'photo pool PSS MB':>18}"
+    )
+    for workers in args.workers:
+        result = measure(workers, args.timeout)
+        results.append(result)
+        memory = result["workers_memory"] or [{}]
+        print(
+            f"{workers:>7} {(result['first_response_seconds'] or 0) * 1000:>9.0f} "
+            f"{(result['all_ready_seconds'] or 0) * 1000:>13.0f} "
+            f"{sum(m.get('rss_mb', 0) for m in memory) / len(memory):>14.1f} "
+            f"{sum(m.get('pss_mb', 0) for m in memory) / len(memory):>14.1f} "
+            f"{result['total_pss_mb']:>13.1f} {result['photo_pool_pss_mb']:>18.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
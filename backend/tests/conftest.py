@@ -0,0 +1,21 @@
+import asyncio
+
+import pytest
+
+from app.services import rate_limiter
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop"""
+    return asyncio.run
+
+
+@pytest.fixture(autouse=True)
+def request_context():
+    """Admission decisions live in context variables; keep them from leaking into the next test"""
+    variables = (rate_limiter._shed, rate_limiter._user, rate_limiter._meter)
+    tokens = [variable.set(variable.get()) for variable in variables]
+    yield
+    for variable, token in zip(variables, tokens):
+        variable.reset(token)
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from app.config import settings
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from app.services.llm_gateway import StubLLMGateway, is_upstream_failure
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def open_breaker(**kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker("gpt-4o-mini", failure_threshold=3, **kwargs)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("gpt-4o-mini", failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_success_resets_the_failure_run():
+    breaker = CircuitBreaker("gpt-4o-mini", failure_threshold=2, reset_timeout=60)
+    for _ in range(5):
+        breaker.allow()
+        breaker.record_failure()
+        breaker.allow()
+        breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_limited_probes():
+    breaker = open_breaker(reset_timeout=0.01, half_open_max_calls=1)
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes():
+    breaker = open_breaker(reset_timeout=0.01)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = open_breaker(reset_timeout=0.01)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_released_probe_frees_its_slot():
+    breaker = open_breaker(reset_timeout=0.01)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def upstream_error(status: int) -> openai.APIStatusError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return openai.APIStatusError("error", response=httpx.Response(status, request=request), body=None)
+
+
+@pytest.mark.parametrize("error, counts", [
+    (asyncio.TimeoutError(), True),
+    (openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com")), True),
+    (httpx.ConnectError("refused"), True),
+    (upstream_error(503), True),
+    (upstream_error(429), True),
+    (upstream_error(400), False),
+    (TypeError("bad argument"), False),
+    (ValueError("bad reply"), False),
+])
+def test_only_upstream_errors_count(error, counts):
+    assert is_upstream_failure(error) is counts
+
+
+def test_breakers_are_per_model_and_service(run, monkeypatch):
+    monkeypatch.setattr(settings, "circuit_failure_threshold", 2)
+    monkeypatch.setattr(settings, "circuit_reset_seconds", 60)
+
+    def responder(messages):
+        raise asyncio.TimeoutError()
+
+    gateway = StubLLMGateway(responder, hedging=False)
+
+    async def call(service, model="gpt-4o-mini"):
+        await gateway.complete(MESSAGES, model=model, service=service)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await call("suggestion_engine")
+        with pytest.raises(CircuitOpenError):
+            await call("suggestion_engine")
+        # Other services and models still reach the upstream
+        with pytest.raises(asyncio.TimeoutError):
+            await call("trend_analyzer")
+        with pytest.raises(asyncio.TimeoutError):
+            await call("suggestion_engine", model="gpt-4o")
+
+    run(scenario())
+    circuits = gateway.stats()["circuits"]
+    assert circuits["gpt-4o-mini/suggestion_engine"]["state"] == OPEN
+    assert circuits["gpt-4o-mini/trend_analyzer"]["state"] == CLOSED
+
+
+def test_bugs_do_not_open_the_circuit(run, monkeypatch):
+    monkeypatch.setattr(settings, "circuit_failure_threshold", 1)
+
+    def responder(messages):
+        raise TypeError("bad argument")
+
+    gateway = StubLLMGateway(responder, hedging=False)
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(TypeError):
+                await gateway.complete(MESSAGES, service="suggestion_engine")
+
+    run(scenario())
+    assert gateway.breaker("gpt-3.5-turbo", "suggestion_engine").state == CLOSED
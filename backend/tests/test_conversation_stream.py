@@ -0,0 +1,58 @@
+import json
+
+from app.services.conversation_analyzer import ConversationAnalyzer
+from app.services.conversation_state import ConversationStateStore
+from app.services.llm_gateway import StubLLMGateway
+
+INSIGHTS = json.dumps({"summary": "Warm and curious", "suggestions": ["Ask about the hike"]})
+
+MESSAGES = [
+    {"sender": "user", "content": "Hey, how was your weekend?"},
+    {"sender": "match", "content": "Great, I went hiking up the ridge!"},
+    {"sender": "user", "content": "Nice, which trail?"}
+]
+
+
+def make_analyzer(responder=lambda messages: INSIGHTS):
+    gateway = StubLLMGateway(responder)
+    return ConversationAnalyzer(gateway=gateway, state_store=ConversationStateStore(max_entries=10)), gateway
+
+
+async def collect(analyzer, messages, **kwargs):
+    return [event async for event in analyzer.stream_analysis(messages, **kwargs)]
+
+
+def test_local_mode_streams_only_the_result(run):
+    analyzer, gateway = make_analyzer()
+    events = run(collect(analyzer, MESSAGES, mode="local"))
+    assert [kind for kind, _ in events] == ["result"]
+    assert events[0][1]["mode"] == "local"
+    assert gateway.calls == 0
+
+
+def test_incremental_stream_sends_only_new_messages(run):
+    prompts = []
+
+    def responder(messages):
+        prompts.append(messages)
+        return INSIGHTS
+
+    analyzer, _ = make_analyzer(responder)
+    first = run(collect(analyzer, MESSAGES[:2], conversation_id="c1", incremental=True))
+    assert first[0][0] == "token"
+    assert first[-1][1]["incremental"]["new_messages"] == 2
+
+    second = run(collect(analyzer, MESSAGES, conversation_id="c1", incremental=True))
+    result = second[-1][1]
+    assert result["mode"] == "llm"
+    assert result["incremental"]["new_messages"] == 1
+    assert analyzer.state_store.get("c1").last_index == 3
+    assert "Nice, which trail?" in json.dumps(prompts[-1])
+
+
+def test_failed_stream_keeps_the_previous_state(run):
+    analyzer, _ = make_analyzer(lambda messages: "not json")
+    events = run(collect(analyzer, MESSAGES, conversation_id="c1", incremental=True))
+    assert events[-1][1]["mode"] == "local"
+    assert analyzer.state_store.get("c1") is None
+    assert analyzer.state_store.stats()["locks"] == 0
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.models import database
+from app.models.history import AnalysisRecord, ProfileOptimizationRecord
+from app.services.history_writer import HistoryWriter
+
+
+@pytest.fixture
+def sqlite_history(monkeypatch, tmp_path, run):
+    monkeypatch.setattr(settings, "database_url", f"sqlite:///{tmp_path / 'history.db'}")
+
+    async def create_tables():
+        await database.close_db()
+        await database.init_db()
+        # Engines are bound to the loop that created them; each test starts a new one
+        await database.close_db()
+
+    run(create_tables())
+    yield
+
+
+async def count(model) -> int:
+    async with database.get_session_factory()() as session:
+        return await session.scalar(select(func.count()).select_from(model))
+
+
+def test_one_bad_row_does_not_drop_the_batch(run, sqlite_history):
+    async def scenario():
+        writer = HistoryWriter()
+        await writer._write([
+            AnalysisRecord(conversation_id="c1", analysis={"score": 1}),
+            ProfileOptimizationRecord(user_id="u1", region=None, optimization={}),
+            AnalysisRecord(conversation_id="c2", analysis={"score": 2})
+        ])
+        assert writer.stats()["written"] == 2
+        assert writer.stats()["failed"] == 1
+        assert await count(AnalysisRecord) == 2
+        await database.close_db()
+
+    run(scenario())
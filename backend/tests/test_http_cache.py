@@ -0,0 +1,78 @@
+from starlette.requests import Request
+
+from app.services.http_cache import CachedPayload, PayloadCache, cache_window, etag_matches
+
+CACHE_CONTROL = "public, max-age=60"
+
+
+def make_request(if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/trends", "headers": headers})
+
+
+def test_response_carries_a_strong_etag():
+    payload = CachedPayload({"region": "austin", "topics": ["hiking"]})
+    response = payload.response(make_request(), CACHE_CONTROL)
+    assert response.status_code == 200
+    assert response.body == payload.body
+    assert response.headers["etag"] == payload.etag
+    assert payload.etag.startswith('"') and payload.etag.endswith('"')
+    assert response.headers["cache-control"] == CACHE_CONTROL
+
+
+def test_matching_validator_gets_an_empty_304():
+    payload = CachedPayload({"region": "austin"})
+    response = payload.response(make_request(payload.etag), CACHE_CONTROL)
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == payload.etag
+
+
+def test_stale_validator_gets_the_body():
+    payload = CachedPayload({"region": "austin"})
+    old = CachedPayload({"region": "boston"})
+    response = payload.response(make_request(old.etag), CACHE_CONTROL)
+    assert response.status_code == 200
+    assert response.body == payload.body
+
+
+def test_etag_comparison_is_weak():
+    etag = '"abc"'
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"xyz", "abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"xyz"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_same_content_same_etag():
+    assert CachedPayload({"a": 1}).etag == CachedPayload({"a": 1}).etag
+    assert CachedPayload({"a": 1}).etag != CachedPayload({"a": 2}).etag
+
+
+def test_payload_cache_builds_once_per_key():
+    cache = PayloadCache(max_entries=2)
+    builds = []
+
+    def build(version):
+        builds.append(version)
+        return {"version": version}
+
+    first = cache.get(("trends", 1), lambda: build(1))
+    assert cache.get(("trends", 1), lambda: build(1)) is first
+    cache.get(("trends", 2), lambda: build(2))
+    assert builds == [1, 2]
+    assert cache.stats()["hits"] == 1
+
+
+def test_payload_cache_ttl_rebuilds():
+    cache = PayloadCache(ttl=-1)
+    first = cache.get("health", lambda: {"ok": True})
+    assert cache.get("health", lambda: {"ok": True}) is not first
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_window_is_stable_within_a_window():
+    index, start = cache_window(300, now=1_000_000)
+    assert cache_window(300, now=1_000_000 + 99) == (index, start)
+    assert cache_window(300, now=(index + 1) * 300)[0] == index + 1
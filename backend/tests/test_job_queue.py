@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from app.services.job_queue import JobQueue, JobQueueFull
+from app.services.response_cache import FileSharedBackend
+
+
+def make_queue(handler=None, **kwargs) -> JobQueue:
+    async def echo(payload):
+        await asyncio.sleep(0.01)
+        return {"echo": payload}
+
+    queue = JobQueue(ttl=60, callback_hosts=set(), **kwargs)
+    queue.register("optimize", handler or echo)
+    queue.start()
+    return queue
+
+
+async def wait_finished(queue: JobQueue, job_id: str):
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_pending_job_is_returned_to_the_same_user(run):
+    async def scenario():
+        queue = make_queue()
+        try:
+            first, deduplicated = await queue.submit("optimize", {"bio": "a"}, user_id="u1")
+            assert not deduplicated
+            # Even with a changed request, the user's pending job is returned
+            again, deduplicated = await queue.submit("optimize", {"bio": "b"}, user_id="u1")
+            assert deduplicated and again["job_id"] == first["job_id"]
+            other, deduplicated = await queue.submit("optimize", {"bio": "a"}, user_id="u2")
+            assert not deduplicated and other["job_id"] != first["job_id"]
+        finally:
+            await queue.stop()
+        assert queue.counts["deduplicated"] == 1
+
+    run(scenario())
+
+
+def test_finished_job_is_reused_only_for_the_same_request(run):
+    async def scenario():
+        queue = make_queue()
+        try:
+            first, _ = await queue.submit("optimize", {"bio": "a"}, user_id="u1")
+            finished = await wait_finished(queue, first["job_id"])
+            assert finished["result"] == {"echo": {"bio": "a"}}
+
+            same, deduplicated = await queue.submit("optimize", {"bio": "a"}, user_id="u1")
+            assert deduplicated and same["job_id"] == first["job_id"]
+            changed, deduplicated = await queue.submit("optimize", {"bio": "b"}, user_id="u1")
+            assert not deduplicated and changed["job_id"] != first["job_id"]
+        finally:
+            await queue.stop()
+
+    run(scenario())
+
+
+def test_anonymous_jobs_are_not_deduplicated(run):
+    async def scenario():
+        queue = make_queue()
+        try:
+            first, _ = await queue.submit("optimize", {"bio": "a"})
+            second, deduplicated = await queue.submit("optimize", {"bio": "a"})
+            assert not deduplicated and second["job_id"] != first["job_id"]
+        finally:
+            await queue.stop()
+
+    run(scenario())
+
+
+def test_deduplication_spans_workers_sharing_a_store(run, tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        first_worker = make_queue(backend=FileSharedBackend(path))
+        second_worker = make_queue(backend=FileSharedBackend(path))
+        try:
+            first, _ = await first_worker.submit("optimize", {"bio": "a"}, user_id="u1")
+            again, deduplicated = await second_worker.submit("optimize", {"bio": "a"}, user_id="u1")
+            assert deduplicated and again["job_id"] == first["job_id"]
+        finally:
+            await first_worker.stop()
+            await second_worker.stop()
+
+    run(scenario())
+
+
+def test_full_queue_rejects_new_jobs(run):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def blocked(payload):
+            await release.wait()
+            return {}
+
+        queue = make_queue(handler=blocked, workers=1, queue_size=1)
+        try:
+            await queue.submit("optimize", {"n": 1})
+            await asyncio.sleep(0.01)
+            await queue.submit("optimize", {"n": 2})
+            with pytest.raises(JobQueueFull):
+                await queue.submit("optimize", {"n": 3})
+        finally:
+            release.set()
+            await queue.stop()
+        assert queue.counts["rejected"] == 1
+
+    run(scenario())
+
+
+def test_callbacks_need_an_allowlisted_host(run):
+    async def scenario():
+        queue = make_queue()
+        try:
+            with pytest.raises(ValueError):
+                await queue.submit("optimize", {"bio": "a"}, callback_url="https://example.com/done")
+        finally:
+            await queue.stop()
+
+    run(scenario())
+
+
+def test_jobs_of_a_stopped_worker_are_failed_and_released(run, tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def scenario():
+        stalled = asyncio.Event()
+
+        async def never(payload):
+            await stalled.wait()
+            return {}
+
+        dead = make_queue(handler=never, backend=FileSharedBackend(path), workers=1)
+        first, _ = await dead.submit("optimize", {"bio": "a"}, user_id="u1")
+        stuck, _ = await dead.submit("optimize", {"bio": "b"}, user_id="u2")
+        # The worker dies: its tasks stop and its heartbeat expires
+        for task in [*dead._tasks, dead._heartbeat]:
+            task.cancel()
+        await dead.backend.set(dead._owner_key(dead.owner), "", -1)
+
+        survivor = make_queue(backend=FileSharedBackend(path))
+        try:
+            assert await survivor.recover_orphans() == 2
+            assert await survivor.recover_orphans() == 0
+            failed = await survivor.get(stuck["job_id"])
+            assert failed["status"] == "failed" and "submit it again" in failed["error"]
+            # The failed job no longer blocks the user's resubmission
+            again, deduplicated = await survivor.submit("optimize", {"bio": "a"}, user_id="u1")
+            assert not deduplicated and again["job_id"] != first["job_id"]
+            assert (await survivor.get(first["job_id"]))["status"] == "failed"
+            assert (await wait_finished(survivor, again["job_id"]))["status"] == "succeeded"
+        finally:
+            await survivor.stop()
+
+    run(scenario())
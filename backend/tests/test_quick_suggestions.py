@@ -0,0 +1,14 @@
+import json
+import random
+
+from app.services.quick_suggestions import QuickSuggestionIndex
+
+
+def test_generic_lines_are_serialized_draws_of_the_empty_context():
+    index = QuickSuggestionIndex(rng=random.Random(7), shared_dir="")
+    possible = {line for _ in range(50) for line in index.suggest("opener", {}, count=10)}
+    draws = [tuple(json.loads(line) for line in index.generic_lines("opener", count=3)) for _ in range(20)]
+
+    assert all(len(set(draw)) == 3 and set(draw) <= possible for draw in draws)
+    assert len(set(draws)) > 1
+    assert index.generic_lines("no-such-type", count=2)
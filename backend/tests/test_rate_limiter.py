@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from app.config import settings
+from app.services.rate_limiter import RateLimiter, SharedBucketMap, TokenBucket, build_buckets, parse_duration
+
+
+def test_bucket_admits_up_to_capacity():
+    bucket = TokenBucket(rate=0.0, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=100.0, capacity=2)
+    assert bucket.try_acquire(2)
+    assert not bucket.try_acquire()
+    time.sleep(0.03)
+    assert bucket.try_acquire()
+    assert bucket.available() <= 2
+
+
+def test_bucket_can_go_into_debt():
+    bucket = TokenBucket(rate=0.0, capacity=10)
+    bucket.consume(25)
+    assert bucket.available() == -15
+    assert not bucket.try_acquire()
+
+
+def test_shared_buckets_are_drawn_by_every_worker(tmp_path):
+    path = str(tmp_path / "rate_limits.sqlite3")
+    first = SharedBucketMap(path, "user_requests", rate=0.0, capacity=3)
+    second = SharedBucketMap(path, "user_requests", rate=0.0, capacity=3)
+    assert first.get("u1").try_acquire()
+    assert second.get("u1").try_acquire(2)
+    assert not first.get("u1").try_acquire()
+    assert second.get("u2").try_acquire()
+    second.get("u2").consume(5)
+    assert first.get("u2").available() == -3
+    assert len(first) == 2
+
+
+def test_local_buckets_split_limits_across_workers(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_store_path", "")
+    monkeypatch.setattr(settings, "web_workers", 4)
+    buckets = build_buckets("user_requests", rate=2.0, capacity=20)
+    assert (buckets.rate, buckets.capacity) == (0.5, 5)
+
+
+@pytest.mark.parametrize("value, seconds", [("1s", 1.0), ("6m0s", 360.0), ("250ms", 0.25), ("1h2m", 3720.0), ("", 0.0)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_enabled", True)
+    monkeypatch.setattr(settings, "user_requests_per_minute", 0.0)
+    monkeypatch.setattr(settings, "user_request_burst", 2)
+    monkeypatch.setattr(settings, "endpoint_requests_per_second", 0.0)
+    monkeypatch.setattr(settings, "endpoint_request_burst", 100)
+    monkeypatch.setattr(settings, "user_tokens_per_minute", 1000)
+    return RateLimiter()
+
+
+def test_admission_sheds_past_the_user_burst(limiter):
+    assert limiter.admit("get-suggestions", "alice")
+    assert not limiter.should_shed()
+    assert limiter.admit("get-suggestions", "alice")
+    assert not limiter.admit("get-suggestions", "alice")
+    assert limiter.should_shed()
+    # Buckets are per user and endpoint
+    assert limiter.admit("get-suggestions", "bob")
+    assert limiter.admit("analyze-trends", "alice")
+    assert limiter.stats()["shed"] == 1
+
+
+def test_spent_token_budget_sheds(limiter):
+    assert limiter.admit("get-suggestions", "alice")
+    limiter.record_usage(1500)
+    assert not limiter.admit_budget("alice")
+    assert limiter.should_shed()
+    assert not limiter.admit("analyze-trends", "alice")
+    assert limiter.admit("analyze-trends", "bob")
+
+
+def test_upstream_headers_pause_admission(limiter):
+    limiter.upstream.update({
+        "x-ratelimit-limit-tokens": "10000",
+        "x-ratelimit-remaining-tokens": "100",
+        "x-ratelimit-reset-tokens": "30s"
+    })
+    assert limiter.upstream.exhausted()
+    assert not limiter.admit("get-suggestions", "alice")
+
+
+def test_disabled_limiter_admits_everything(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_enabled", False)
+    limiter = RateLimiter()
+    assert all(limiter.admit("get-suggestions", "alice") for _ in range(100))
+    assert not limiter.should_shed()
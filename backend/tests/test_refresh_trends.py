@@ -0,0 +1,52 @@
+import json
+import os
+
+from app.jobs.refresh_trends import TrendRefreshJob, stub_responder
+from app.services.llm_gateway import StubLLMGateway
+from app.services.trend_store import TrendStore, load_trend_file
+
+
+def make_job(tmp_path, gateway, regions=("austin",), buckets=("all", "25-34"), output="trends.json") -> TrendRefreshJob:
+    return TrendRefreshJob(
+        gateway=gateway,
+        output_path=str(tmp_path / output),
+        checkpoint_path=str(tmp_path / "trends.checkpoint"),
+        regions=list(regions),
+        buckets=list(buckets),
+        concurrency=2
+    )
+
+
+def test_refresh_publishes_every_pair(run, tmp_path):
+    gateway = StubLLMGateway(stub_responder)
+    job = make_job(tmp_path, gateway, regions=("austin", "New York"))
+    report = run(job.run())
+
+    assert report["completed"] == 4 and not report["failed"]
+    assert gateway.calls == 4
+    data = load_trend_file(str(tmp_path / "trends.json"))
+    assert data["version"] == 1
+    assert set(data["regions"]) == {"austin", "new york"}
+    assert set(data["regions"]["austin"]) == {"all", "25-34"}
+    assert not os.path.exists(tmp_path / "trends.checkpoint")
+    assert TrendStore(str(tmp_path / "trends.json")).stats()["entries"] >= 4
+
+
+def test_failed_pairs_are_retried_on_the_next_run(run, tmp_path):
+    def flaky(messages):
+        if "25" in messages[-1]["content"]:
+            raise ConnectionError("upstream down")
+        return stub_responder(messages)
+
+    report = run(make_job(tmp_path, StubLLMGateway(flaky)).run())
+    assert len(report["failed"]) == 1
+    assert not os.path.exists(tmp_path / "trends.json")
+    with open(tmp_path / "trends.checkpoint") as f:
+        assert len(json.load(f)["completed"]) == 1
+
+    # Resuming only generates the pair that failed
+    gateway = StubLLMGateway(stub_responder)
+    report = run(make_job(tmp_path, gateway).run())
+    assert gateway.calls == 1
+    assert report["completed"] == 2 and not report["failed"]
+    assert load_trend_file(str(tmp_path / "trends.json"))["version"] == 1
@@ -0,0 +1,118 @@
+import sqlite3
+
+from app.services.response_cache import (
+    FileSharedBackend,
+    LocalSharedBackend,
+    MemoryBackend,
+    ResponseCache,
+    make_cache_key
+)
+
+MESSAGES = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Hi  there\n"}]
+
+
+def test_cache_key_ignores_whitespace_and_float_noise():
+    key = make_cache_key("gpt-4o-mini", MESSAGES, 0.7, 200)
+    same = make_cache_key("gpt-4o-mini", [{"role": "system", "content": " Be brief. "}, {"role": "user", "content": "Hi there"}], 0.70000001, 200)
+    assert key == same
+
+
+def test_cache_key_covers_model_sampling_and_extras():
+    key = make_cache_key("gpt-4o-mini", MESSAGES, 0.7, 200)
+    assert key != make_cache_key("gpt-4o", MESSAGES, 0.7, 200)
+    assert key != make_cache_key("gpt-4o-mini", MESSAGES, 0.2, 200)
+    assert key != make_cache_key("gpt-4o-mini", MESSAGES, 0.7, 300)
+    assert key != make_cache_key("gpt-4o-mini", MESSAGES, 0.7, 200, response_format={"type": "json_object"})
+    assert key != make_cache_key("gpt-4o-mini", MESSAGES[1:], 0.7, 200)
+
+
+def test_memory_tier_expires_entries():
+    backend = MemoryBackend()
+    backend.set("fresh", {"text": "a"}, ttl=60)
+    backend.set("stale", {"text": "b"}, ttl=-1)
+    assert backend.get("fresh") == {"text": "a"}
+    assert backend.get("stale") is None
+    assert backend.stats.expirations == 1
+    assert len(backend) == 1
+
+
+def test_memory_tier_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", {}, ttl=60)
+    backend.set("b", {}, ttl=60)
+    backend.get("a")
+    backend.set("c", {}, ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+    assert backend.stats.evictions == 1
+
+
+def test_shared_tier_serves_other_workers(run):
+    async def scenario():
+        shared = LocalSharedBackend()
+        first = ResponseCache(ttl=60, shared_backend=shared)
+        second = ResponseCache(ttl=60, shared_backend=shared)
+        await first.set("k", {"text": "hello", "usage": {"total_tokens": 12}})
+
+        assert await second.get("k") == {"text": "hello", "usage": {"total_tokens": 12}}
+        assert second.stats.shared_hits == 1
+        # Promoted into the local tier: the next lookup does not touch the shared tier
+        await shared.aclose()
+        assert await second.get("k") is not None
+        assert second.stats.shared_hits == 1
+        assert second.stats.tokens_saved == 24
+
+    run(scenario())
+
+
+def test_shared_tier_errors_count_as_misses(run):
+    class BrokenBackend(LocalSharedBackend):
+        async def get(self, key):
+            raise ConnectionError("down")
+
+        async def set(self, key, value, ttl):
+            raise ConnectionError("down")
+
+    async def scenario():
+        cache = ResponseCache(ttl=60, shared_backend=BrokenBackend())
+        await cache.set("k", {"text": "x"})
+        assert await cache.get("missing") is None
+        assert cache.stats.shared_errors == 2
+        assert cache.stats.misses == 1
+
+    run(scenario())
+
+
+def test_local_shared_backend_add_and_expiry(run):
+    async def scenario():
+        backend = LocalSharedBackend()
+        assert await backend.add("k", "first", ttl=60)
+        assert not await backend.add("k", "second", ttl=60)
+        assert await backend.get("k") == "first"
+        await backend.set("old", "x", ttl=-1)
+        assert await backend.get("old") is None
+        assert await backend.add("old", "y", ttl=60)
+
+    run(scenario())
+
+
+def test_file_backend_is_shared_between_connections(run, tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def scenario():
+        writer = FileSharedBackend(path)
+        reader = FileSharedBackend(path)
+        try:
+            await writer.set("k", "value", ttl=60)
+            assert await reader.get("k") == "value"
+            assert not await reader.add("k", "other", ttl=60)
+            await writer.set("old", "x", ttl=-1)
+            assert await reader.get("old") is None
+            assert await reader.add("old", "y", ttl=60)
+            assert await writer.get("old") == "y"
+        finally:
+            await writer.aclose()
+            await reader.aclose()
+
+    run(scenario())
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
@@ -0,0 +1,45 @@
+import pytest
+from pydantic import ValidationError
+
+from app.config import settings
+from app.models.schemas import BatchConversationAnalysisRequest, BioScoreRequest, ConversationAnalysisRequest
+from app.services.heuristic_analyzer import HeuristicAnalyzer
+
+
+@pytest.mark.parametrize("value", [0, -1, settings.batch_max_concurrency + 1])
+def test_batch_concurrency_is_bounded(value):
+    with pytest.raises(ValidationError):
+        BatchConversationAnalysisRequest(items=[], max_concurrency=value)
+
+
+def test_batch_concurrency_defaults_to_the_server_limit():
+    assert BatchConversationAnalysisRequest(items=[]).max_concurrency is None
+    assert BatchConversationAnalysisRequest(items=[], max_concurrency=1).max_concurrency == 1
+
+
+def test_batch_size_is_bounded():
+    item = {"conversation_id": "c1", "messages": []}
+    assert len(BatchConversationAnalysisRequest(items=[item] * settings.batch_max_items).items) == settings.batch_max_items
+    with pytest.raises(ValidationError):
+        BatchConversationAnalysisRequest(items=[item] * (settings.batch_max_items + 1))
+
+
+def test_bio_count_and_length_are_bounded():
+    assert len(BioScoreRequest(bios=["Hiker"] * settings.bio_score_max_bios).bios) == settings.bio_score_max_bios
+    with pytest.raises(ValidationError):
+        BioScoreRequest(bios=["Hiker"] * (settings.bio_score_max_bios + 1))
+    with pytest.raises(ValidationError):
+        BioScoreRequest(bios=["x" * (settings.bio_max_chars + 1)])
+
+
+def test_analysis_mode_is_llm_or_local():
+    assert ConversationAnalysisRequest(conversation_id="c1", messages=[], mode="local").mode == "local"
+    with pytest.raises(ValidationError):
+        ConversationAnalysisRequest(conversation_id="c1", messages=[], mode="fast")
+
+
+@pytest.mark.parametrize("interests", [7, 2.5, True, {"hiking": 1}, None])
+def test_malformed_interests_are_ignored(interests):
+    messages = [{"role": "user", "content": "I love hiking"}, {"role": "partner", "content": "Me too!"}]
+    analysis = HeuristicAnalyzer().analyze(messages, {"interests": interests}, {"interests": ["hiking"]})
+    assert analysis["metrics"]["shared_interests"] == []
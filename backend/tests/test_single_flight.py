@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from app.services.rate_limiter import get_rate_limiter
+from app.services.single_flight import SingleFlight, coalesced
+
+
+class Counter:
+    def __init__(self, delay: float = 0.02, tokens: int = 0):
+        self.delay = delay
+        self.tokens = tokens
+        self.calls = 0
+
+    @coalesced
+    async def compute(self, value: int):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.tokens:
+            get_rate_limiter().record_usage(self.tokens)
+        return {"value": value, "items": [value]}
+
+
+def test_identical_calls_share_one_execution(run):
+    async def scenario():
+        counter = Counter()
+        results = await asyncio.gather(*(counter.compute(1) for _ in range(5)))
+        assert counter.calls == 1
+        assert all(result == {"value": 1, "items": [1]} for result in results)
+        # Followers get copies, so mutating one result leaves the others alone
+        results[1]["items"].append(2)
+        assert results[0]["items"] == [1]
+
+    run(scenario())
+
+
+def test_different_arguments_run_separately(run):
+    async def scenario():
+        counter = Counter()
+        results = await asyncio.gather(counter.compute(1), counter.compute(2))
+        assert counter.calls == 2
+        assert [result["value"] for result in results] == [1, 2]
+
+    run(scenario())
+
+
+def test_nothing_is_kept_after_the_flight(run):
+    async def scenario():
+        counter = Counter()
+        await counter.compute(1)
+        await counter.compute(1)
+        assert counter.calls == 2
+
+    run(scenario())
+
+
+def test_cancelled_leader_does_not_cancel_followers(run):
+    async def scenario():
+        group = SingleFlight()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.ensure_future(group.do("k", slow))
+        await started.wait()
+        follower = asyncio.ensure_future(group.do("k", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert group.stats() == {"executed": 1, "coalesced": 1, "in_flight": 0}
+
+    run(scenario())
+
+
+def test_errors_reach_every_caller(run):
+    async def scenario():
+        group = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(group.do("k", fail), group.do("k", fail), return_exceptions=True)
+        assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+        assert group.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_each_caller_is_billed_for_a_shared_call(run):
+    limiter = get_rate_limiter()
+    if not limiter.enabled:
+        pytest.skip("rate limiting disabled")
+
+    async def call(counter: Counter, user: str):
+        limiter.admit("single-flight-test", user)
+        return await counter.compute(1)
+
+    async def scenario():
+        counter = Counter(tokens=100)
+        before = {user: limiter.token_budgets.get(user).available() for user in ("sf-a", "sf-b")}
+        await asyncio.gather(call(counter, "sf-a"), call(counter, "sf-b"))
+        assert counter.calls == 1
+        for user, available in before.items():
+            assert limiter.token_budgets.get(user).available() <= available - 99
+
+    run(scenario())
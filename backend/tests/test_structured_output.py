@@ -0,0 +1,81 @@
+import json
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from app.services.llm_gateway import StubLLMGateway
+from app.services.structured_output import StructuredOutputError, complete_structured, parse_json, parse_structured
+
+
+class Tips(BaseModel):
+    tips: List[str]
+
+
+MESSAGES = [{"role": "user", "content": "Give me tips"}]
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ('{"tips": ["a"]}', {"tips": ["a"]}),
+    ('```json\n{"tips": ["a"]}\n```', {"tips": ["a"]}),
+    ('Sure! Here you go: {"tips": ["a"]} Hope that helps.', {"tips": ["a"]}),
+    ('{"tips": ["a", "b",]}', {"tips": ["a", "b"]}),
+    ('{"tips": ["a", "b", "unfinish', {"tips": ["a", "b", "unfinish"]}),
+    ('{"tips": ["a"], "extra": ', {"tips": ["a"]}),
+])
+def test_parse_json_repairs_common_damage(reply, expected):
+    assert parse_json(reply) == expected
+
+
+def test_parse_json_rejects_replies_without_json():
+    with pytest.raises(ValueError):
+        parse_json("I cannot help with that.")
+
+
+def test_bare_array_fills_single_list_field():
+    assert parse_structured('["a", "b"]', Tips).tips == ["a", "b"]
+
+
+def test_schema_mismatch_raises_with_the_reply():
+    with pytest.raises(StructuredOutputError) as error:
+        parse_structured('{"advice": "none"}', Tips)
+    assert error.value.text == '{"advice": "none"}'
+
+
+def replies(*texts):
+    queue = list(texts)
+    seen = []
+
+    def responder(messages):
+        seen.append(messages)
+        return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    return responder, seen
+
+
+def test_invalid_reply_is_sent_back_for_correction(run):
+    responder, seen = replies('{"advice": "none"}', json.dumps({"tips": ["fixed"]}))
+    gateway = StubLLMGateway(responder)
+
+    parsed, _ = run(complete_structured(gateway, Tips, MESSAGES, max_retries=2))
+    assert parsed.tips == ["fixed"]
+    assert gateway.calls == 2
+    correction = seen[1]
+    assert correction[:1] == MESSAGES
+    assert correction[1] == {"role": "assistant", "content": '{"advice": "none"}'}
+    assert "not valid JSON" in correction[2]["content"]
+
+
+@pytest.mark.parametrize("max_retries", [0, 1, 3])
+def test_retries_are_capped(run, max_retries):
+    gateway = StubLLMGateway(lambda messages: "no json here")
+    with pytest.raises(StructuredOutputError):
+        run(complete_structured(gateway, Tips, MESSAGES, max_retries=max_retries))
+    assert gateway.calls == max_retries + 1
+
+
+def test_repairable_reply_needs_no_retry(run):
+    gateway = StubLLMGateway(lambda messages: '```json\n{"tips": ["a", "b",]}\n```')
+    parsed, _ = run(complete_structured(gateway, Tips, MESSAGES, max_retries=2))
+    assert parsed.tips == ["a", "b"]
+    assert gateway.calls == 1
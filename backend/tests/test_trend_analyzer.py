@@ -0,0 +1,23 @@
+from app.jobs.refresh_trends import stub_responder
+from app.services.llm_gateway import StubLLMGateway
+from app.services.trend_analyzer import TrendAnalyzer, describe_style
+from app.services.trend_store import TrendStore
+
+
+def test_style_dict_becomes_one_sentence():
+    style = {"tone": "Direct and witty", "emoji_usage": "Low", "formality": "Casual"}
+    assert describe_style(style) == "Direct and witty (emoji usage: Low, formality: Casual)"
+    assert describe_style("Friendly and engaging") == "Friendly and engaging"
+
+
+def test_every_path_returns_the_same_shape(run, tmp_path):
+    analyzer = TrendAnalyzer(gateway=StubLLMGateway(stub_responder), store=TrendStore(str(tmp_path / "missing.json")))
+    from_model = run(analyzer.analyze_trends("austin"))
+    local = run(analyzer.analyze_trends("austin", use_model=False))
+    stored = TrendAnalyzer(gateway=StubLLMGateway(stub_responder))
+    from_store = run(stored.analyze_trends("new york"))
+
+    assert (from_model["source"], from_store["source"]) == ("model", "trend_store")
+    for trends in (from_model, from_store, local):
+        assert isinstance(trends["communication_style"], str) and trends["communication_style"]
+        assert isinstance(trends["profile_preferences"], dict)
@@ -0,0 +1,57 @@
+import asyncio
+import socket
+
+import pytest
+
+from app.services import url_safety
+from app.services.url_safety import UnsafeURLError, check_url, pinned_client
+
+
+def resolving_to(answers):
+    """Fake resolver that returns the next address in ``answers`` on every lookup"""
+    answers = iter(answers)
+
+    async def getaddrinfo(self, host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (next(answers), port))]
+
+    return getaddrinfo
+
+
+def test_rebinding_after_the_check_is_refused(run, monkeypatch):
+    # Public while checked, loopback when the client resolves again to connect
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", resolving_to(["93.184.216.34", "127.0.0.1"]))
+
+    async def scenario():
+        await check_url("http://photos.example/a.jpg", set())
+        async with pinned_client() as client:
+            with pytest.raises(UnsafeURLError):
+                await client.get("http://photos.example/a.jpg")
+
+    run(scenario())
+
+
+def test_pinned_client_connects_to_the_checked_address(run, monkeypatch):
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", resolving_to(["127.0.0.1"] * 2))
+    monkeypatch.setattr(url_safety, "is_public_address", lambda address: True)
+    hosts = []
+
+    async def handle(reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        hosts.extend(line.lower() for line in head.decode().split("\r\n") if line.lower().startswith("host:"))
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok")
+        await writer.drain()
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            async with pinned_client() as client:
+                response = await client.get(f"http://photos.example:{port}/a.jpg")
+        finally:
+            server.close()
+            await server.wait_closed()
+        assert response.text == "ok"
+        assert hosts == [f"host: photos.example:{port}"]
+
+    run(scenario())